@@ -7,19 +7,43 @@
 # Description: Turn user description into Suno-style prompt components using ML
 # for better intent understanding and matching.
 
-from dataclasses import dataclass, field
-from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import FrozenSet, Iterator, List, Dict, Tuple, Optional
+import argparse
+import bisect
+import importlib.util
+import itertools
+import json
+import os
 import random
+import sys
 import textwrap
+import threading
+import warnings
 import numpy as np
 
-# Optional ML imports - will use if available
-try:
-    from sentence_transformers import SentenceTransformer
-    ML_AVAILABLE = True
-except ImportError:
-    ML_AVAILABLE = False
-    print("Warning: sentence-transformers not installed. Using keyword matching only.")
+from bm25 import BM25Index, emotion_fields, style_fields
+from chords import in_key, key_label, key_name, parse_key
+from coalesce import SingleFlight, coalesce_key
+from deadline import Deadline, DeadlineExceeded, deadline_for, ml_executor, record_outcome
+from facets import FACET_BOOST, FACET_MODE, FACETS, TEXTURE_PATTERNS, FacetIndex, instrument_textures
+import near_cache
+from ml_runtime import RuntimeConfig, load_runtime_config
+from model_manager import ModelManager, idle_timeout_from_env
+from profiling import run_profiled
+from multivector import SegmentedMatrix, emotion_texts, style_texts
+from records import INSTRUMENTS, LayeredPool, artist_of, freeze_references, freeze_styles
+from retrieval import candidate_count, top_k_indices
+from style_compat import COMPAT_FILENAME, CompatIndex, StyleFeatures, compatibility_matrix, styles_fingerprint
+from tracing import incr, span, traced, request_trace
+
+# Optional ML support - only check that sentence-transformers is installed.
+# It pulls in torch/transformers, so the actual import waits for the first
+# ML request (see get_ml_model) and keyword-only runs never pay for it.
+ML_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
 
 # -----------------------------
 # Load Data from External Files
@@ -31,13 +55,20 @@ try:
         EMOTION_KEYWORDS,
         STYLE_DB,
         REFERENCE_DB,
-        EMOTION_TO_STYLES
+        EMOTION_TO_STYLES,
+        CASCADE_CONFIG,
+        DATA_DIR,
+        BASE_KB,
+        KnowledgeBase,
+        get_knowledge_base as load_knowledge_base
     )
     DATA_FROM_FILES = True
 except ImportError:
     # Fallback to hardcoded data
-    print("Warning: Could not load data_loader. Using hardcoded data.")
+    warnings.warn("Could not load data_loader. Using hardcoded data.")
     DATA_FROM_FILES = False
+    CASCADE_CONFIG = {"min_margin": 1.5, "min_emotions": 1}
+    DATA_DIR = None
     
     EMOTION_KEYWORDS = {
         "warm": ["warm", "cozy", "gentle", "soft", "tender", "温暖", "温柔"],
@@ -59,7 +90,7 @@ except ImportError:
             "instruments": ["Rhodes", "Electric piano", "Warm bass", "Soft kick & snare", "Silky synth pad", "Vocal layers"],
             "chords": [
                 {"roman": "Imaj7 – vi7 – ii7 – V7", "C": "Cmaj7 – Am7 – Dm7 – G7"},
-                {"roman": "ivmaj7 – V7 – iii7 – vi7", "C": "Fmaj7 – G7 – Em7 – Am7"},
+                {"roman": "IVmaj7 – V7 – iii7 – vi7", "C": "Fmaj7 – G7 – Em7 – Am7"},
                 {"roman": "Imaj7 – iii7 – vi7 – ii7", "C": "Cmaj7 – Em7 – Am7 – Dm7"},
             ],
         },
@@ -87,7 +118,7 @@ except ImportError:
             "instruments": ["Electric guitar (clean)", "Slap/round bass", "Bright keys", "Disco hats", "Synth brass"],
             "chords": [
                 {"roman": "Imaj7 – VI7 – ii7 – V7", "C": "Cmaj7 – A7 – Dm7 – G7"},
-                {"roman": "Imaj7 – V/vi – vi – ii7 – V7", "C": "Cmaj7 – E7 – Am – Dm7 – G7"},
+                {"roman": "Imaj7 – V7/vi – vi – ii7 – V7", "C": "Cmaj7 – E7 – Am – Dm7 – G7"},
             ],
         },
         "Trip-hop": {
@@ -200,6 +231,21 @@ except ImportError:
         "urban": {"R&B": 0.4, "Trip-hop": 0.3, "Lo-fi hiphop": 0.2},
         "tropical": {"Reggae": 0.6, "City pop": 0.2},
     }
+
+    STYLE_DB = freeze_styles(STYLE_DB)
+    REFERENCE_DB = freeze_references(REFERENCE_DB)
+
+    # No tenant overlays without data_loader
+    from types import SimpleNamespace as KnowledgeBase
+    BASE_KB = KnowledgeBase(name="base", emotion_keywords=EMOTION_KEYWORDS, style_db=STYLE_DB,
+                            reference_db=REFERENCE_DB, emotion_to_styles=EMOTION_TO_STYLES, emotion_descriptions={},
+                            own_styles=frozenset(STYLE_DB), own_emotions=frozenset(EMOTION_KEYWORDS),
+                            base=None, cache={}, layers=lambda: [BASE_KB])
+
+    def load_knowledge_base(tenant: Optional[str] = None):
+        if tenant:
+            raise ValueError(f"Unknown tenant: {tenant}")
+        return BASE_KB
 else:
     # Data loaded from JSON files (handled by data_loader module)
     pass
@@ -208,75 +254,216 @@ else:
 # ML Module for Semantic Understanding
 # -----------------------------
 
-# Global model instance
-_ml_model = None
+# Thread counts, inference mode and encode batching (ml_runtime.py),
+# re-read whenever the model is (re)loaded
+_runtime = RuntimeConfig()
+
+def _load_sentence_transformer():
+    """Import sentence-transformers and load the embedding model"""
+    global ML_AVAILABLE, _runtime
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        # Installed but not importable (e.g. broken torch): stay keyword-only
+        warnings.warn(f"sentence-transformers could not be imported ({e}). Using keyword matching only.")
+        ML_AVAILABLE = False
+        return None
+    _runtime = load_runtime_config(DATA_DIR)
+    return _runtime.configure(SentenceTransformer('all-MiniLM-L6-v2'))
+
+# Loaded on the first ML request; with SONICPALETTE_MODEL_IDLE_TIMEOUT set it
+# is released after that many idle seconds and reloaded on demand
+_model_manager = ModelManager(_load_sentence_transformer, idle_timeout=idle_timeout_from_env())
 
 def get_ml_model():
-    """Lazy load the ML model"""
-    global _ml_model
-    if _ml_model is None and ML_AVAILABLE:
-        _ml_model = SentenceTransformer('all-MiniLM-L6-v2')
-    return _ml_model
+    """Lazy load the ML model (and sentence-transformers itself)"""
+    if not ML_AVAILABLE:
+        return None
+    return _model_manager.get()
+
+@traced("embedding")
+def encode_normalized(texts: List[str]) -> Optional[np.ndarray]:
+    """Unit-length embeddings of `texts` (None when the model is unavailable)"""
+    if not ML_AVAILABLE:
+        return None
+    with _model_manager.use() as model:
+        if model is None:
+            return None
+        embeddings = np.asarray(_runtime.encode(model, texts), dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+# Embeddings of recent descriptions, per model manager: the emotion and
+# style stages and instrument ranking share one model call per description
+QUERY_CACHE_SIZE = 256
+_query_cache: "OrderedDict[Tuple[int, str], np.ndarray]" = OrderedDict()
+_query_lock = threading.Lock()
+
+def query_embedding(text: str, encode: bool = True) -> Optional[np.ndarray]:
+    """Unit embedding of one description, from the cache when it was embedded
+    recently; with encode=False never calls the model (None on a miss)"""
+    key = (id(_model_manager), text)
+    with _query_lock:
+        found = _query_cache.get(key)
+        if found is not None:
+            _query_cache.move_to_end(key)
+            return found
+    if not encode:
+        return None
+    vectors = encode_normalized([text])
+    if vectors is None:
+        return None
+    remember_query_embedding(text, vectors[0])
+    return vectors[0]
+
+def remember_query_embedding(text: str, vector: np.ndarray):
+    """Cache `vector` as the embedding of `text` (e.g. a near-duplicate's)"""
+    with _query_lock:
+        _query_cache[(id(_model_manager), text)] = vector
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
 
 def compute_semantic_scores(user_desc: str, candidate_texts: List[str]) -> np.ndarray:
     """Use sentence embeddings to compute semantic similarity scores"""
-    model = get_ml_model()
-    if model is None:
+    embeddings = encode_normalized([user_desc] + candidate_texts)
+    if embeddings is None:
         return np.array([0.0] * len(candidate_texts))
-    
-    # Create embeddings
-    embeddings = model.encode([user_desc] + candidate_texts)
-    user_emb = embeddings[0]
-    candidate_embs = embeddings[1:]
-    
-    # Compute cosine similarity
-    scores = np.dot(candidate_embs, user_emb) / (
-        np.linalg.norm(user_emb) * np.linalg.norm(candidate_embs, axis=1)
-    )
+    # Cosine similarity of unit vectors
+    return embeddings[1:] @ embeddings[0]
+
+def _candidate_embeddings(kb: KnowledgeBase, kind: str) -> Optional[SegmentedMatrix]:
+    """Multi-vector embeddings (multivector.py) of the styles/emotions defined
+    in this layer of `kb`, computed once. Tenants share the base layer's."""
+    cached = kb.cache.get(("embeddings", kind))
+    if cached is None:
+        if kind == "styles":
+            segments = {name: style_texts(name, meta) for name, meta in kb.style_db.items()
+                        if name in kb.own_styles}
+        else:
+            segments = {name: emotion_texts(name, kws, kb.emotion_descriptions.get(name))
+                        for name, kws in kb.emotion_keywords.items() if name in kb.own_emotions}
+        cached = SegmentedMatrix.build(segments, encode_normalized)
+        if cached is None:
+            return None  # model unavailable: don't cache
+        cached = kb.cache.setdefault(("embeddings", kind), cached)
+    return cached
+
+def layered_semantic_scores(kb: KnowledgeBase, kind: str, user_desc: str,
+                            only: Optional[List[str]] = None) -> Dict[str, float]:
+    """Max-sim of the description to every style/emotion of `kb` (or to the
+    names in `only`); entries redefined by an overlay use the overlay's vectors"""
+    query = query_embedding(user_desc)
+    if only is None:
+        only_set = None
+        names = kb.style_db if kind == "styles" else kb.emotion_keywords
+    else:
+        only_set = set(only)
+        names = only
+    scores = dict.fromkeys(names, 0.0)
+    if query is None:
+        return scores
+    for layer in kb.layers():
+        candidates = _candidate_embeddings(layer, kind)
+        if candidates is None or not len(candidates):
+            continue
+        if only_set is None:
+            scores.update(zip(candidates.names, candidates.scores(query).tolist()))
+            continue
+        subset = np.array([candidates.index[name] for name in only if name in candidates.index], dtype=np.int64)
+        if len(subset):
+            layer_scores = candidates.scores(query, subset=subset)
+            scores.update(zip((candidates.names[i] for i in subset), layer_scores.tolist()))
     return scores
 
-def ml_enhanced_emotion_detection(user_desc: str) -> List[str]:
+def _lexical_index(kb: KnowledgeBase, kind: str) -> BM25Index:
+    """BM25 index (bm25.py) of the styles/emotions defined in this layer of `kb`, built once"""
+    cached = kb.cache.get(("bm25", kind))
+    if cached is None:
+        if kind == "styles":
+            documents = {name: style_fields(name, meta, kb.reference_db.get(name, ()))
+                         for name, meta in kb.style_db.items() if name in kb.own_styles}
+        else:
+            documents = {name: emotion_fields(name, kws, kb.emotion_descriptions.get(name))
+                         for name, kws in kb.emotion_keywords.items() if name in kb.own_emotions}
+        cached = kb.cache.setdefault(("bm25", kind), BM25Index.build(documents, tokenize))
+    return cached
+
+def lexical_scores(kb: KnowledgeBase, kind: str, tokens: List[str]) -> Dict[str, float]:
+    """BM25 scores of the styles/emotions sharing a term with the tokens, as
+    a fraction of the query's self-score (1.0 = every word matched strongly)"""
+    raw = {}
+    for layer in kb.layers():
+        if layer.base is not None:
+            # Entries redefined by an overlay are scored by the overlay's index
+            for name in (layer.own_styles if kind == "styles" else layer.own_emotions):
+                raw.pop(name, None)
+        raw.update(_lexical_index(layer, kind).relative_matches(tokens))
+    return raw
+
+def prepare_indexes(kb: KnowledgeBase) -> KnowledgeBase:
+    """Build the lexical and facet indexes of every layer of `kb` now rather
+    than on the first request (about a second for a 2000-style catalog)"""
+    for layer in kb.layers():
+        _lexical_index(layer, "styles")
+        _lexical_index(layer, "emotions")
+        facet_index(layer)
+    return kb
+
+def get_knowledge_base(tenant: Optional[str] = None) -> KnowledgeBase:
+    """The tenant's knowledge base (the base one for None), indexes built"""
+    return prepare_indexes(load_knowledge_base(tenant))
+
+@traced("ml_emotion_detection")
+def ml_enhanced_emotion_detection(user_desc: str, kb: Optional[KnowledgeBase] = None) -> List[str]:
     """Use ML to detect emotions from description"""
-    # Create emotion descriptions
-    emotion_descriptions = {
-        emo: f"{emo} music: {', '.join(kws[:3])}" 
-        for emo, kws in EMOTION_KEYWORDS.items()
-    }
-    
-    # Compute semantic similarity
-    scores = compute_semantic_scores(user_desc, list(emotion_descriptions.values()))
+    kb = kb or BASE_KB
+    # Compute semantic similarity against the (cached) emotion descriptions
+    scores = layered_semantic_scores(kb, "emotions", user_desc)
     
     # Get top emotions
-    top_indices = scores.argsort()[-3:][::-1]
-    emotions = [list(EMOTION_KEYWORDS.keys())[i] for i in top_indices if scores[i] > 0.3]
+    top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:3]
+    emotions = [emo for emo, score in top if score > 0.3]
     
     return emotions if emotions else ["chill"]
 
-def ml_enhanced_style_detection(user_desc: str) -> Dict[str, float]:
-    """Use ML + keywords for style detection"""
-    # Create style descriptions
-    style_descriptions = [
-        f"{style} music: {', '.join(meta['keywords'][:4])}" 
-        for style, meta in STYLE_DB.items()
-    ]
-    
-    # Compute semantic similarity
-    scores = compute_semantic_scores(user_desc, style_descriptions)
-    
-    # Convert to dict
-    ml_scores = {style: float(score) for style, score in zip(STYLE_DB.keys(), scores)}
-    
-    # Also run keyword matching for hybrid approach
+@traced("ml_style_detection")
+def ml_enhanced_style_detection(user_desc: str, kb: Optional[KnowledgeBase] = None,
+                                n_candidates: Optional[int] = None) -> Dict[str, float]:
+    """Use ML + keywords for style detection.
+
+    Large catalogs are scored in two stages (retrieval.py): keyword and
+    emotion scores pick `n_candidates` styles (default from
+    SONICPALETTE_STYLE_CANDIDATES, 0 = all) and only those are scored
+    semantically and returned.
+    """
+    kb = kb or BASE_KB
+    # Stage 1: keyword matching (with ML-detected emotions) over every style
     tokens = tokenize(user_desc)
-    keyword_scores = compute_style_scores(tokens, ml_enhanced_emotion_detection(user_desc))
+    keyword_scores = compute_style_scores(tokens, ml_enhanced_emotion_detection(user_desc, kb), kb)
+    candidates = style_candidates(kb, keyword_scores, n_candidates)
+    
+    # Stage 2: semantic similarity against the (cached) style embeddings
+    ml_scores = layered_semantic_scores(kb, "styles", user_desc, only=candidates)
     
     # Combine ML and keyword scores (70% ML, 30% keywords)
     combined = {}
-    for style in STYLE_DB.keys():
+    for style in (kb.style_db.keys() if candidates is None else candidates):
         combined[style] = 0.7 * ml_scores[style] + 0.3 * keyword_scores[style]
     
     return combined
 
+@traced("style_candidates")
+def style_candidates(kb: KnowledgeBase, keyword_scores: Dict[str, float],
+                     n_candidates: Optional[int] = None) -> Optional[List[str]]:
+    """The best `n_candidates` styles by keyword score in catalog order,
+    or None when every style should be scored"""
+    n = candidate_count() if n_candidates is None else (n_candidates or None)
+    if n is None or n >= len(kb.style_db):
+        return None
+    names = list(kb.style_db)
+    lexical = np.fromiter((keyword_scores.get(name, 0.0) for name in names), dtype=np.float64, count=len(names))
+    return [names[i] for i in np.sort(top_k_indices(lexical, n))]
+
 # -----------------------------
 # Core logic
 # -----------------------------
@@ -299,17 +486,33 @@ def tokenize(s: str) -> List[str]:
         tokens.append(buf)
     return tokens
 
-def match_emotions(tokens: List[str]) -> List[str]:
+# BM25 contribution of a style matching every word of the description,
+# relative to one exact keyword hit (1.0)
+LEXICAL_WEIGHT = 0.5
+# Emotions within this fraction of the best BM25 match are kept when no keyword matched
+LEXICAL_EMOTION_MIN = 0.5
+
+@traced("emotion_matching")
+def match_emotions(tokens: List[str], kb: Optional[KnowledgeBase] = None) -> List[str]:
     hits = []
-    for emo, kws in EMOTION_KEYWORDS.items():
+    for emo, kws in (kb or BASE_KB).emotion_keywords.items():
         if any(kw.lower() in tokens for kw in [k for k in kws if k.isascii()]) or any(k in tokens for k in [k for k in kws if not k.isascii()]):
             hits.append(emo)
+    if not hits:
+        # No exact keyword: the closest emotions by BM25 over names and descriptions
+        lexical = lexical_scores(kb or BASE_KB, "emotions", tokens)
+        best = max(lexical.values(), default=0.0)
+        hits = [emo for emo, s in sorted(lexical.items(), key=lambda x: x[1], reverse=True)[:2]
+                if s >= LEXICAL_EMOTION_MIN * best]
     return hits or ["chill"]  # default
 
-def compute_style_scores(tokens: List[str], emotions: List[str]) -> Dict[str, float]:
-    scores = {style: 0.0 for style in STYLE_DB.keys()}
+@traced("keyword_scoring")
+def compute_style_scores(tokens: List[str], emotions: List[str],
+                         kb: Optional[KnowledgeBase] = None) -> Dict[str, float]:
+    kb = kb or BASE_KB
+    scores = {style: 0.0 for style in kb.style_db.keys()}
     # keyword matches
-    for style, meta in STYLE_DB.items():
+    for style, meta in kb.style_db.items():
         for kw in meta["keywords"]:
             if kw.isascii():
                 if kw.lower() in tokens:
@@ -317,9 +520,12 @@ def compute_style_scores(tokens: List[str], emotions: List[str]) -> Dict[str, fl
             else:
                 if kw in tokens:
                     scores[style] += 1.0
+    # partial credit for words shared with names, descriptions and reference notes
+    for style, s in lexical_scores(kb, "styles", tokens).items():
+        scores[style] += LEXICAL_WEIGHT * s
     # emotion nudges
     for emo in emotions:
-        for style, w in EMOTION_TO_STYLES.get(emo, {}).items():
+        for style, w in kb.emotion_to_styles.get(emo, {}).items():
             scores[style] += w
     # small bonus for explicit words like "slow/fast/retro/modern"
     if "retro" in tokens or "复古" in tokens:
@@ -330,70 +536,301 @@ def compute_style_scores(tokens: List[str], emotions: List[str]) -> Dict[str, fl
         scores["Indie"] = scores.get("Indie", 0) + 0.2  # harmless extra key
     return scores
 
+@traced("style_selection")
 def pick_top_styles(scores: Dict[str, float], k: int = 2) -> List[str]:
-    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    top = [name for name, sc in ranked if sc > 0]
+    names = list(scores)
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(names))
+    top = [names[i] for i in top_k_indices(values, k) if values[i] > 0]
     if not top:
         # default blend
         return ["R&B", "Dream pop"]
-    return top[:k]
+    return top
+
+# The partner of the top style is the best of the next candidates by
+# relative score + COMPAT_WEIGHT x compatibility (style_compat.py)
+COMPAT_CANDIDATES = 5
+COMPAT_WEIGHT = 0.5
+# Above this many base styles the S x S matrix is not kept in memory
+COMPAT_MAX_STYLES = 5000
+
+def _style_vectors(kb: KnowledgeBase, names: List[str]) -> Optional[np.ndarray]:
+    """Embedding centroids of `names`, from the embeddings already computed for
+    the layers defining them (None if any is missing: never loads the model)"""
+    layers = kb.layers()
+    groups = {}
+    for i, name in enumerate(names):
+        layer = next((layer for layer in reversed(layers) if name in layer.own_styles), None)
+        groups.setdefault(id(layer), (layer, []))[1].append(i)
+    vectors = None
+    for layer, positions in groups.values():
+        embeddings = layer.cache.get(("embeddings", "styles")) if layer is not None else None
+        if embeddings is None or any(names[i] not in embeddings.index for i in positions):
+            return None
+        block = embeddings.centroids([embeddings.index[names[i]] for i in positions])
+        if vectors is None:
+            vectors = np.zeros((len(names), block.shape[1]), dtype=np.float32)
+        vectors[positions] = block
+    return vectors
+
+def _stale_compat(kb: KnowledgeBase, index: CompatIndex) -> bool:
+    return index.mode == "keywords" and kb.cache.get(("embeddings", "styles")) is not None
+
+def compat_index(kb: KnowledgeBase, use_saved: bool = True) -> CompatIndex:
+    """Compatibility matrix of the styles defined in this layer of `kb`: the
+    saved one (style_compat.py) while the styles are unchanged, otherwise
+    computed once, from the style embeddings if they exist, else keywords"""
+    cached = kb.cache.get(("compat", "styles"))
+    if cached is not None and not _stale_compat(kb, cached):
+        return cached
+    names = [name for name in kb.style_db if name in kb.own_styles]
+    index = None
+    if use_saved and cached is None and kb.base is None and DATA_DIR is not None:
+        path = Path(DATA_DIR) / COMPAT_FILENAME
+        if path.exists():
+            try:
+                saved = CompatIndex.load(path)
+            except ValueError as e:
+                # e.g. an older snapshot with pickled names: never unpickled, rebuilt instead
+                warnings.warn(f"Ignoring {path}: {e}")
+                saved = None
+            if saved is not None and saved.names == names \
+                    and saved.fingerprint == styles_fingerprint(kb.style_db, names):
+                index = saved
+    if index is None:
+        index = CompatIndex.build(kb.style_db, names, _style_vectors(kb, names))
+    kb.cache[("compat", "styles")] = index
+    return index
+
+def _use_compat_index(kb: KnowledgeBase, names: List[str]) -> bool:
+    layers = kb.layers()
+    return (len(layers[0].own_styles) <= COMPAT_MAX_STYLES
+            and not any(name in layer.own_styles for layer in layers[1:] for name in names))
 
-def blend_bpm(styles: List[str]) -> Tuple[int, int]:
+def style_compatibility(names: List[str], kb: Optional[KnowledgeBase] = None) -> np.ndarray:
+    """(N, N) compatibility of the given styles: a lookup in the base matrix,
+    computed on the fly when a tenant defines or redefines one of them"""
+    kb = kb or BASE_KB
+    if _use_compat_index(kb, names):
+        return compat_index(kb.layers()[0]).lookup(names)
+    return compatibility_matrix(StyleFeatures(names, kb.style_db, _style_vectors(kb, names)))
+
+def similar_styles(style: str, k: int = 5, kb: Optional[KnowledgeBase] = None) -> List[Tuple[str, float]]:
+    """The k styles that blend best with `style`, with their compatibility"""
+    kb = kb or BASE_KB
+    if style not in kb.style_db:
+        raise ValueError(f"Unknown style: {style}")
+    if len(kb.layers()) == 1 and _use_compat_index(kb, [style]):
+        index = compat_index(kb)
+        names, row = index.names, index.matrix[index.index[style]].copy()
+    else:
+        names = list(kb.style_db)
+        features = StyleFeatures(names, kb.style_db, _style_vectors(kb, names))
+        row = compatibility_matrix(features, rows=np.array([names.index(style)]))[0]
+    row[names.index(style)] = -np.inf
+    return [(names[i], float(row[i])) for i in top_k_indices(row, k) if names[i] != style]
+
+@traced("style_selection")
+def pick_style_blend(scores: Dict[str, float], kb: Optional[KnowledgeBase] = None, k: int = 2,
+                     n_candidates: int = COMPAT_CANDIDATES) -> List[str]:
+    """Top style plus the k-1 partners among the next candidates that best
+    combine score and compatibility with the styles already chosen"""
+    kb = kb or BASE_KB
+    names = [name for name in scores if name in kb.style_db]
+    values = np.fromiter((scores[name] for name in names), dtype=np.float64, count=len(names))
+    top = [i for i in top_k_indices(values, n_candidates) if values[i] > 0]
+    if len(top) <= k:
+        return pick_top_styles(scores, k)
+    candidates = [names[i] for i in top]
+    compat = style_compatibility(candidates, kb)
+    gain = values[top] / values[top[0]]
+    chosen = [0]
+    while len(chosen) < k:
+        total = gain + COMPAT_WEIGHT * compat[chosen].mean(axis=0)
+        total[chosen] = -np.inf
+        chosen.append(int(np.argmax(total)))
+    return [candidates[i] for i in chosen]
+
+@traced("bpm_blend")
+def blend_bpm(styles: List[str], kb: Optional[KnowledgeBase] = None) -> Tuple[int, int]:
+    style_db = (kb or BASE_KB).style_db
     lows, highs = [], []
     for st in styles:
-        b = STYLE_DB[st]["bpm"]
+        b = style_db[st]["bpm"]
         lows.append(b[0]); highs.append(b[1])
     # take midpoint of mins and maxs to get an overlapping suggestion
     low = int(sum(lows)/len(lows))
     high = int(sum(highs)/len(highs))
     if low >= high:
-        low, high = min(lows), max(highs)
+        # no common range: keep the leading style's
+        low, high = lows[0], highs[0]
     return (low, high)
 
-def collect_instruments(styles: List[str]) -> List[str]:
-    bank = []
-    for st in styles:
-        bank.extend(STYLE_DB[st]["instruments"])
-    # de-duplicate while keeping order
-    seen = set()
+MAX_INSTRUMENTS = 8
+
+@traced("instruments")
+def collect_instruments(styles: List[str], kb: Optional[KnowledgeBase] = None,
+                        limit: Optional[int] = MAX_INSTRUMENTS) -> List[str]:
+    style_db = (kb or BASE_KB).style_db
+    # de-duplicate while keeping order: one bit per instrument id
+    seen = 0
     result = []
-    for it in bank:
-        if it not in seen:
-            seen.add(it)
-            result.append(it)
+    for st in styles:
+        for it in style_db[st].instrument_ids:
+            if not seen >> it & 1:
+                seen |= 1 << it
+                result.append(it)
     # cap to ~8
-    return result[:8]
+    return INSTRUMENTS.names(result[:limit])
+
+# Instruments are ranked by similarity to the description ("with a sad
+# cello"): "boost" ranks the selected styles' instruments (+ STYLE_BOOST)
+# together with any instrument the description clearly names, "restrict"
+# only reorders the styles' instruments, "off" keeps style order
+INSTRUMENT_RANKING = os.environ.get("SONICPALETTE_INSTRUMENT_RANKING", "boost")
+INSTRUMENT_STYLE_BOOST = 0.25
+INSTRUMENT_MIN_SIMILARITY = 0.5
+# Added for instruments of the requested texture (facets.instrument_textures)
+INSTRUMENT_TEXTURE_BOOST = 0.15
+
+def _instrument_embeddings(kb: KnowledgeBase) -> Optional[SegmentedMatrix]:
+    """One embedding per distinct instrument of the styles defined in this
+    layer of `kb`, computed once"""
+    cached = kb.cache.get(("embeddings", "instruments"))
+    if cached is None:
+        instruments = dict.fromkeys(it for name, meta in kb.style_db.items() if name in kb.own_styles
+                                    for it in meta["instruments"])
+        cached = SegmentedMatrix.build({it: [it] for it in instruments}, encode_normalized)
+        if cached is None:
+            return None  # model unavailable: don't cache
+        cached = kb.cache.setdefault(("embeddings", "instruments"), cached)
+    return cached
+
+@traced("instrument_ranking")
+def rank_instruments(styles: List[str], description: str, kb: Optional[KnowledgeBase] = None,
+                     n: int = MAX_INSTRUMENTS, texture: str = "auto") -> List[str]:
+    """Instruments for the prompt, most similar to the description first.
+    Uses the description's embedding from the analysis; without it (no ML,
+    keyword-only answer) the styles' instruments are kept in style order.
+    Instruments of the preferred texture ("electronic"/"acoustic") get
+    INSTRUMENT_TEXTURE_BOOST, or without an embedding move ahead of the rest."""
+    kb = kb or BASE_KB
+    in_styles = collect_instruments(styles, kb, limit=None)
+
+    prefer = texture if texture in TEXTURE_PATTERNS else None
+
+    def texture_boost(it: str) -> float:
+        return INSTRUMENT_TEXTURE_BOOST if prefer in instrument_textures(it) else 0.0
 
-def pick_chords(styles: List[str], n: int = 2) -> List[Dict[str, str]]:
+    query = query_embedding(description, encode=False) if INSTRUMENT_RANKING != "off" else None
+    if query is None:
+        if prefer is None:
+            return in_styles[:n]
+        # Stable: each group keeps style order
+        return sorted(in_styles, key=texture_boost, reverse=True)[:n]
+    scores = {}
+    for layer in kb.layers():
+        table = _instrument_embeddings(layer)
+        if table is None:
+            return in_styles[:n]
+        if not len(table):
+            continue
+        # One row per instrument: a single matrix-vector product per layer
+        sims = table.matrix @ query
+        for it in in_styles:
+            row = table.index.get(it)
+            if row is not None:
+                scores[it] = float(sims[row]) + INSTRUMENT_STYLE_BOOST
+        if INSTRUMENT_RANKING == "boost":
+            for row in np.flatnonzero(sims >= INSTRUMENT_MIN_SIMILARITY):
+                scores.setdefault(table.names[row], float(sims[row]))
+    for it in in_styles:
+        scores.setdefault(it, INSTRUMENT_STYLE_BOOST)
+    if prefer is not None:
+        for it in scores:
+            scores[it] += texture_boost(it)
+    return sorted(scores, key=scores.get, reverse=True)[:n]
+
+@traced("chords")
+def pick_chords(styles: List[str], n: int = 2, rng: Optional[random.Random] = None,
+                kb: Optional[KnowledgeBase] = None, key: Optional[str] = None) -> List[Dict[str, str]]:
+    """Up to n distinct progressions of the styles. With a target key ("Eb",
+    "F#m"), each also carries "chords", its rendering from the table
+    precomputed at load time, and "key", the key that rendering is in: the
+    target, or its relative major/minor for a progression of the other mode
+    ("F major (relative of D minor)"). Progressions whose roman numerals
+    couldn't be compiled keep only their C rendering."""
+    style_db = (kb or BASE_KB).style_db
+    index = parse_key(key) if key else None
     pool = []
     for st in styles:
-        pool.extend(STYLE_DB[st]["chords"])
-    random.shuffle(pool)
+        pool.extend(style_db[st]["chords"])
+    (rng or random).shuffle(pool)
     # de-duplicate by roman
     seen = set()
     out = []
     for ch in pool:
         if ch["roman"] not in seen:
-            out.append(ch)
+            picked = dict(ch)
+            if index is not None and ch.transposed is not None:
+                picked["key"] = ch.transposed.label(index)
+                picked["chords"] = ch.transposed.renderings[index]
+            out.append(picked)
             seen.add(ch["roman"])
         if len(out) >= n:
             break
     return out
 
-def suggest_references(styles: List[str], emotions: List[str], n: int = 5) -> List[Tuple[str, str]]:
-    pool = []
-    for st in styles:
-        pool.extend(REFERENCE_DB.get(st, []))
+# Reference pools with at most this many artist groups are shuffled whole
+REFERENCE_SHUFFLE_BELOW = 64
+
+def _distinct_indices(total: int, rng) -> Iterator[int]:
+    """Distinct random indices below `total`, lazily: redrawing repeats
+    costs O(1) per index while few are taken, small ranges are shuffled"""
+    if total <= REFERENCE_SHUFFLE_BELOW:
+        order = list(range(total))
+        rng.shuffle(order)
+        yield from order
+        return
+    drawn = set()
+    while len(drawn) < total // 2:
+        index = rng.randrange(total)
+        if index not in drawn:
+            drawn.add(index)
+            yield index
+    rest = [index for index in range(total) if index not in drawn]
+    rng.shuffle(rest)
+    yield from rest
+
+@traced("references")
+def suggest_references(styles: List[str], emotions: List[str], n: int = 5,
+                       rng: Optional[random.Random] = None,
+                       kb: Optional[KnowledgeBase] = None) -> List[Tuple[str, str]]:
+    """Up to n references from the styles plus "Indie refs", at most one per
+    artist. Pools are grouped by artist when loaded (records.ReferencePool),
+    so this draws random artist groups across the pools and one reference
+    from each: O(n) however large the pools are"""
+    reference_db = (kb or BASE_KB).reference_db
+    rng = rng or random
     # add indie references occasionally
-    pool.extend(REFERENCE_DB.get("Indie refs", []))
-    random.shuffle(pool)
+    pools = []
+    for st in [*styles, "Indie refs"]:
+        pool = reference_db.get(st)
+        if pool is not None:
+            # A tenant's additions to a base style are a separate pool
+            pools.extend(pool.layers if isinstance(pool, LayeredPool) else (pool,))
+    ends = list(itertools.accumulate(pool.groups for pool in pools))
     # ensure diversity
     out = []
     seen = set()
-    for item in pool:
-        if item[0] not in seen:
+    for index in _distinct_indices(ends[-1] if ends else 0, rng):
+        p = bisect.bisect_right(ends, index)
+        pool, group = pools[p], index - (ends[p - 1] if p else 0)
+        start, stop = pool.offsets[group], pool.offsets[group + 1]
+        item = pool.references[start if stop - start == 1 else rng.randrange(start, stop)]
+        artist = artist_of(item.title)
+        if artist not in seen:
             out.append(item)
-            seen.add(item[0])
+            seen.add(artist)
         if len(out) >= n:
             break
     return out
@@ -402,7 +839,7 @@ def suggest_references(styles: List[str], emotions: List[str], n: int = 5) -> Li
 def word_count(s: str) -> int:
     return len(s.split())
 
-def build_prompt_sections(styles, emotions, bpm_range, instruments, chords=None, references=None):
+def build_prompt_sections(styles, emotions, bpm_range, instruments, chords=None, references=None, key=None):
     style_str = " + ".join(styles)
     emo_words = ", ".join(emotions)
     bpm_str = f"{bpm_range[0]}–{bpm_range[1]} BPM"
@@ -437,14 +874,30 @@ def build_prompt_sections(styles, emotions, bpm_range, instruments, chords=None,
     chords_inline = None
     chords_inline_short = None
     if chords:
-        # Example: "chords: I–vi–ii–V (Cmaj7–Am7–Dm7–G7)"
-        chord_strs = []
-        for ch in chords[:2]:  # Max 2 progressions
-            chord_strs.append(f"{ch['roman']} ({ch['C']})")
-        chords_inline = f"chords: {', '.join(chord_strs)}"
+        # Example: "chords: I–vi–ii–V (Cmaj7–Am7–Dm7–G7)", or with a key
+        # "key: Eb major, chords: I–vi–ii–V (Ebmaj7–Cm7–Fm7–Bb7)"
+        def rendered(ch):
+            if "chords" in ch:
+                return ch["chords"], ch.get("key")
+            transposed = in_key(ch["roman"], key)
+            if transposed is None:
+                return ch["C"], None
+            return transposed, key_label(ch["roman"], key)
+
+        shown = [(ch["roman"],) + rendered(ch) for ch in chords[:2]]  # Max 2 progressions
+        labels = {label for _, _, label in shown}
+        if len(labels) == 1 and None not in labels:
+            # One key for all: name it once
+            prefix = f"key: {labels.pop()}, chords"
+            chord_strs = [f"{roman} ({text})" for roman, text, _ in shown]
+        else:
+            prefix = "chords"
+            chord_strs = [f"{roman} ({text})" + (f" in {label}" if label else "") for roman, text, label in shown]
+        chords_inline = f"{prefix}: {', '.join(chord_strs)}"
         # Shorter version
-        if len(chords) > 0:
-            chords_inline_short = f"chords: {chords[0]['roman']} ({chords[0]['C']})"
+        roman, text, label = shown[0]
+        short_prefix = f"key: {label}, chords" if label else "chords"
+        chords_inline_short = f"{short_prefix}: {roman} ({text})"
 
     # references：添加到主prompt
     refs_inline = None
@@ -558,9 +1011,10 @@ def compress_sections(sections, max_words=200, delimiter="; "):
         text = " ".join(" ".join(t) for t in tokens_by_part)
     return text
 
-def format_suno_prompt(styles, emotions, bpm_range, instruments, chords=None, references=None) -> str:
-    sections = build_prompt_sections(styles, emotions, bpm_range, instruments, chords, references)
-    prompt = compress_sections(sections, max_words=200)
+def format_suno_prompt(styles, emotions, bpm_range, instruments, chords=None, references=None, key=None) -> str:
+    sections = build_prompt_sections(styles, emotions, bpm_range, instruments, chords, references, key)
+    with span("prompt_compression"):
+        prompt = compress_sections(sections, max_words=200)
     return prompt
 
 
@@ -570,6 +1024,62 @@ class UserIntent:
     tempo_pref: str = "auto"
     texture_pref: str = "auto"
     era_pref: str = "auto"
+    seed: Optional[int] = None  # chords/references sampling; None = global random
+    tenant: Optional[str] = None  # knowledge-base overlay (data_loader.TENANTS_DIR); None = base
+    key: Optional[str] = None  # chord key, e.g. "Eb" or "F#m" (chords.parse_key); None = the written C
+
+def facet_index(kb: KnowledgeBase) -> FacetIndex:
+    """Tempo/era/texture index (facets.py) of the styles defined in this layer of `kb`, built once"""
+    cached = kb.cache.get(("facets", "styles"))
+    if cached is None:
+        names = [name for name in kb.style_db if name in kb.own_styles]
+        cached = kb.cache.setdefault(("facets", "styles"), FacetIndex.build(kb.style_db, names))
+    return cached
+
+def preferred_styles(kb: KnowledgeBase, facet: str, value: str) -> Optional[FrozenSet[str]]:
+    """Styles of `kb` matching one preference (None when it doesn't filter)"""
+    layers = kb.layers()
+    if len(layers) == 1:
+        return facet_index(kb).matching(facet, value)
+    cached = kb.cache.get(("preferred", facet, value), False)
+    if cached is False:
+        matching = set()
+        for layer in layers:
+            layer_matching = facet_index(layer).matching(facet, value)
+            if layer_matching is None:
+                matching = None
+                break
+            # Styles redefined by an overlay are matched on the overlay's fields
+            matching = (matching - layer.own_styles) | layer_matching
+        cached = kb.cache.setdefault(("preferred", facet, value),
+                                     None if matching is None else frozenset(matching))
+    return cached
+
+@traced("facets")
+def apply_facets(scores: Dict[str, float], intent: UserIntent,
+                 kb: Optional[KnowledgeBase] = None) -> Dict[str, float]:
+    """Boost the styles matching the request's tempo/era/texture preferences
+    by FACET_BOOST per preference; in filter mode drop the others instead,
+    as long as some matching style has a positive score.
+
+    Only styles that one boost would lift to the best score are boosted:
+    preferences choose among close description matches, they don't promote
+    a style the description barely matched over a clear winner."""
+    kb = kb or BASE_KB
+    prefs = {"tempo": intent.tempo_pref, "era": intent.era_pref, "texture": intent.texture_pref}
+    wanted = [preferred_styles(kb, facet, prefs[facet]) for facet in FACETS]
+    wanted = [matching for matching in wanted if matching is not None]
+    if not wanted:
+        return scores
+    if FACET_MODE == "filter":
+        kept = {name: score for name, score in scores.items() if all(name in m for m in wanted)}
+        return kept if any(score > 0 for score in kept.values()) else scores
+    boosted = dict(scores)
+    floor = max(scores.values(), default=0.0) / (1 + FACET_BOOST)
+    for name, score in scores.items():
+        if score > 0 and score >= floor:
+            boosted[name] = score * (1 + FACET_BOOST) ** sum(name in m for m in wanted)
+    return boosted
 
 def apply_prefs(bpm_range: Tuple[int, int], instruments: List[str], intent: UserIntent) -> Tuple[Tuple[int,int], List[str]]:
     low, high = bpm_range
@@ -577,21 +1087,216 @@ def apply_prefs(bpm_range: Tuple[int, int], instruments: List[str], intent: User
         low, high = max(50, low-10), max(55, low+5)
     elif intent.tempo_pref == "fast":
         low, high = min(high+5, 140), min(high+15, 150)
-    # texture preference: push instruments set lightly
-    if intent.texture_pref == "electronic":
-        bonus = ["Analog polysynth", "Arp synth", "Silky synth pad", "Sub-bass"]
-        instruments = list(dict.fromkeys(instruments + bonus))[:8]
-    elif intent.texture_pref == "acoustic":
-        bonus = ["Electric guitar (clean)", "Piano", "Strings", "Bass", "Drums"]
-        instruments = list(dict.fromkeys(bonus + instruments))[:8]
+    # texture preference is applied when ranking instruments (rank_instruments)
     return (low, high), instruments
 
+@dataclass
+class PromptResult:
+    styles: List[str]
+    emotions: List[str]
+    bpm_range: Tuple[int, int]
+    instruments: List[str]
+    chords: List[Dict[str, str]]
+    references: List[Tuple[str, str]]
+    prompt: str
+    timings: List[Tuple[str, float]] = field(default_factory=list)
+    degraded: Optional[str] = None  # why ML was skipped under the latency budget
+
+def analyze_description(description: str, kb: Optional[KnowledgeBase] = None) -> Tuple[List[str], Dict[str, float]]:
+    """Detect emotions and score styles, with ML when available"""
+    if ML_AVAILABLE:
+        # Use semantic similarity for better matching
+        emotions = ml_enhanced_emotion_detection(description, kb)
+        scores = ml_enhanced_style_detection(description, kb)
+        return emotions, scores
+    return keyword_analysis(description, kb)
+
+def keyword_analysis(description: str, kb: Optional[KnowledgeBase] = None) -> Tuple[List[str], Dict[str, float]]:
+    """Keyword-only emotions and style scores (no model needed)"""
+    tokens = tokenize(description)
+    emotions = match_emotions(tokens, kb)
+    scores = compute_style_scores(tokens, emotions, kb)
+    return emotions, scores
+
+def keyword_evidence(description: str, emotions: List[str], scores: Dict[str, float],
+                     kb: Optional[KnowledgeBase] = None) -> Tuple[float, int]:
+    """(lead of the best style over the runner-up, emotions backed by a keyword)
+
+    The lead leaves out the BM25 partial credit, so it counts exact keyword
+    hits and emotion weights only, on the scale min_margin was calibrated on.
+    That credit is at most LEXICAL_WEIGHT per style, so with min_margin
+    above it the leader is also the best style of the returned scores."""
+    kb = kb or BASE_KB
+    tokens = tokenize(description)
+    lexical = lexical_scores(kb, "styles", tokens)
+    ranked = sorted((score - LEXICAL_WEIGHT * lexical.get(style, 0.0) for style, score in scores.items()),
+                    reverse=True) + [0.0, 0.0]
+    matched = len(emotions)
+    if emotions == ["chill"]:
+        # match_emotions falls back to "chill" when nothing matched
+        if not any(kw.lower() in tokens for kw in kb.emotion_keywords.get("chill", [])):
+            matched = 0
+    return ranked[0] - ranked[1], matched
+
+def is_decisive(margin: float, matched_emotions: int, config: Optional[Dict[str, float]] = None) -> bool:
+    """Whether keyword scoring alone is confident enough to skip the model"""
+    config = config or CASCADE_CONFIG
+    return margin >= config["min_margin"] and matched_emotions >= config["min_emotions"]
+
+def _cascade_enabled() -> bool:
+    return os.environ.get("SONICPALETTE_CASCADE", "on").lower() not in ("0", "off", "false")
+
+def analyze_within_budget(description: str, deadline: Optional[Deadline] = None,
+                          endpoint: str = "default",
+                          kb: Optional[KnowledgeBase] = None) -> Tuple[List[str], Dict[str, float], Optional[str]]:
+    """analyze_description behind a keyword-first cascade, falling back to
+    keywords when the ML stage would miss the deadline.
+    Returns (emotions, scores, degraded_reason)."""
+    kb = kb or BASE_KB
+    if ML_AVAILABLE and _cascade_enabled():
+        # Cheap keyword pass first: skip the encoder when it is decisive
+        emotions, scores = keyword_analysis(description, kb)
+        incr("cascade_requests_total", endpoint=endpoint)
+        if is_decisive(*keyword_evidence(description, emotions, scores, kb)):
+            incr("cascade_early_exits_total", endpoint=endpoint)
+            return emotions, scores, None
+    if deadline is None or not ML_AVAILABLE:
+        emotions, scores = analyze_description(description, kb)
+        return emotions, scores, None
+    try:
+        # Cold start or unloaded while idle: load in the background and
+        # wait for it as long as the budget allows
+        if not _model_manager.is_loaded() and not _model_manager.wait_loaded(deadline.remaining()):
+            raise DeadlineExceeded("model_not_loaded")
+        emotions, scores = ml_executor().run(run_profiled, analyze_description, description, kb,
+                                             deadline=deadline)
+        record_outcome(endpoint)
+        return emotions, scores, None
+    except DeadlineExceeded as e:
+        record_outcome(endpoint, e.reason)
+        emotions, scores = keyword_analysis(description, kb)
+        return emotions, scores, e.reason
+
+def _near_cache(kb: KnowledgeBase) -> near_cache.NearDuplicateCache:
+    """Analyses of recent descriptions of `kb`, per model (near_cache.py)"""
+    key = ("near_cache", id(_model_manager) if ML_AVAILABLE else None)
+    cached = kb.cache.get(key)
+    if cached is None:
+        cached = kb.cache.setdefault(key, near_cache.NearDuplicateCache())
+    return cached
+
+def analyze_cached(description: str, deadline: Optional[Deadline] = None, endpoint: str = "default",
+                   kb: Optional[KnowledgeBase] = None) -> Tuple[List[str], Dict[str, float], Optional[str]]:
+    """analyze_within_budget, reusing the analysis of an earlier description
+    with nearly the same words. A sample of near hits is analyzed afresh
+    and compared; the fresh result is returned for those.
+
+    The earlier description's embedding is cached with its analysis and
+    stands in for this one's, so instruments are still ranked by similarity
+    (rank_instruments never encodes on its own)."""
+    kb = kb or BASE_KB
+    if not near_cache.enabled():
+        return analyze_within_budget(description, deadline, endpoint, kb)
+    cache = _near_cache(kb)
+    with span("near_cache"):
+        result, cached = cache.get(description)
+    incr("near_cache_lookups_total", result=result or "miss")
+    if result == "near" and cache.should_audit():
+        analysis = analyze_within_budget(description, deadline, endpoint, kb)
+        if analysis[2] is None:
+            emotions, scores, _ = cached
+            agree = analysis[0] == emotions and \
+                max(analysis[1], key=analysis[1].get) == max(scores, key=scores.get)
+            incr("near_cache_audits_total", result="agree" if agree else "disagree")
+        return analysis
+    if result is not None:
+        emotions, scores, embedding = cached
+        if embedding is not None:
+            remember_query_embedding(description, embedding)
+        return emotions, scores, None
+    analysis = analyze_within_budget(description, deadline, endpoint, kb)
+    if analysis[2] is None:
+        # Degraded (keyword-only) answers aren't reused
+        cache.put(description, (*analysis[:2], query_embedding(description, encode=False)))
+    return analysis
+
+# Identical descriptions in flight at the same time are analyzed once
+_analysis_flight = SingleFlight("analysis")
+
+def generate_prompt(intent: UserIntent, trace: bool = False, endpoint: str = "default") -> PromptResult:
+    """Run the full generation pipeline for one request.
+
+    With trace=True the per-stage timings of this request are returned in
+    PromptResult.timings, whether or not global tracing is enabled.
+    `endpoint` selects the latency budget of the ML stage (deadline.py).
+    An unknown intent.tenant or intent.key raises ValueError.
+    """
+    deadline = deadline_for(endpoint)
+    if not trace:
+        return _generate_prompt(intent, deadline, endpoint)
+    with request_trace() as stages:
+        with span("total"):
+            result = _generate_prompt(intent, deadline, endpoint)
+    result.timings = list(stages)
+    return result
+
+async def generate_prompt_async(intent: UserIntent, trace: bool = False,
+                                endpoint: str = "default") -> PromptResult:
+    """generate_prompt for asyncio servers; analysis runs in the default executor
+    (and is not part of the returned timings)"""
+    deadline = deadline_for(endpoint)
+    kb = get_knowledge_base(intent.tenant)
+    analysis = await _analysis_flight.do_async(
+        (coalesce_key(intent.description), endpoint, kb.name), analyze_cached,
+        intent.description, deadline, endpoint, kb)
+    if not trace:
+        return _finish_prompt(intent, kb, *analysis)
+    with request_trace() as stages:
+        with span("total"):
+            result = _finish_prompt(intent, kb, *analysis)
+    result.timings = list(stages)
+    return result
+
+def _generate_prompt(intent: UserIntent, deadline: Optional[Deadline] = None,
+                     endpoint: str = "default") -> PromptResult:
+    kb = get_knowledge_base(intent.tenant)
+    # Keyed per endpoint and tenant: requests with different budgets don't
+    # share a degraded result, tenants don't share each other's styles
+    analysis = _analysis_flight.do(
+        (coalesce_key(intent.description), endpoint, kb.name), analyze_cached,
+        intent.description, deadline, endpoint, kb)
+    return _finish_prompt(intent, kb, *analysis)
+
+def _finish_prompt(intent: UserIntent, kb: KnowledgeBase, emotions: List[str], scores: Dict[str, float],
+                   degraded: Optional[str] = None) -> PromptResult:
+    # The analysis may be shared with coalesced requests: copy before use
+    emotions, scores = list(emotions), dict(scores)
+    rng = random.Random(intent.seed) if intent.seed is not None else None
+    top_styles = pick_style_blend(apply_facets(scores, intent, kb), kb, k=2)
+    bpm_range = blend_bpm(top_styles, kb)
+    instruments = rank_instruments(top_styles, intent.description, kb, texture=intent.texture_pref)
+    chords = pick_chords(top_styles, n=2, rng=rng, kb=kb, key=intent.key)
+    bpm_range, instruments = apply_prefs(bpm_range, instruments, intent)
+    refs = suggest_references(top_styles, emotions, n=5, rng=rng, kb=kb)
+
+    # Pass chords and references to include in prompt
+    prompt = format_suno_prompt(top_styles, emotions, bpm_range, instruments, chords, refs, key=intent.key)
+    return PromptResult(top_styles, emotions, bpm_range, instruments, chords, refs, prompt, degraded=degraded)
+
+# Indexes of the base knowledge base are built at load time (tenants' when first requested)
+prepare_indexes(BASE_KB)
+
 # -----------------------------
 # CLI flow
 # -----------------------------
 
-def main():
+def _profiled(profiler):
+    return profiler.request() if profiler is not None else nullcontext()
+
+def interactive_session(profiler=None, tenant: Optional[str] = None, key: Optional[str] = None):
     print("=== SonicPalette: Suno Prompt Builder (Terminal MVP) ===")
+    if not ML_AVAILABLE:
+        print("Warning: sentence-transformers not installed. Using keyword matching only.")
     desc = input("1) Describe the vibe/scene/emotion (自由描述，可中英混合):\n> ").strip()
     if not desc:
         print("No description provided. Exiting.")
@@ -612,50 +1317,91 @@ def main():
     if era not in ["auto","retro","modern"]:
         era = "auto"
 
-    intent = UserIntent(description=desc, tempo_pref=tempo, texture_pref=texture, era_pref=era)
+    if key is None:
+        print("\n5) Key for the chords? [e.g. C, Eb, F#m] (回车默认 C)")
+        key = input("> ").strip() or None
+        try:
+            key and parse_key(key)
+        except ValueError:
+            key = None
 
-    # Use ML-enhanced detection for better intent understanding
-    if ML_AVAILABLE:
-        # Use semantic similarity for better matching
-        emotions = ml_enhanced_emotion_detection(intent.description)
-        scores = ml_enhanced_style_detection(intent.description)
-    else:
-        # Fallback to keyword matching
-        tokens = tokenize(intent.description)
-        emotions = match_emotions(tokens)
-        scores = compute_style_scores(tokens, emotions)
-    
-    top_styles = pick_top_styles(scores, k=2)
-    bpm_range = blend_bpm(top_styles)
-    instruments = collect_instruments(top_styles)
-    chords = pick_chords(top_styles, n=2)
-    bpm_range, instruments = apply_prefs(bpm_range, instruments, intent)
-    refs = suggest_references(top_styles, emotions, n=5)
-    
-    # Pass chords and references to include in prompt
-    prompt = format_suno_prompt(top_styles, emotions, bpm_range, instruments, chords, refs)
+    intent = UserIntent(description=desc, tempo_pref=tempo, texture_pref=texture, era_pref=era, tenant=tenant,
+                        key=key)
+
+    with _profiled(profiler):
+        result = generate_prompt(intent, endpoint="cli")
 
     print("\n--- RESULT ---")
-    print(f"Styles: {', '.join(top_styles)}")
-    print(f"Emotions: {', '.join(emotions)}")
-    print(f"BPM suggestion: {bpm_range[0]}–{bpm_range[1]}")
+    print(f"Styles: {', '.join(result.styles)}")
+    print(f"Emotions: {', '.join(result.emotions)}")
+    print(f"BPM suggestion: {result.bpm_range[0]}–{result.bpm_range[1]}")
     print("\nSuno-style prompt:")
-    print(textwrap.fill(prompt, width=100))
+    print(textwrap.fill(result.prompt, width=100))
 
-    print("\nChord progressions (Roman / C example):")
-    for ch in chords:
-        print(f"- {ch['roman']}  |  e.g., {ch['C']}")
+    if key:
+        print(f"\nChord progressions (Roman / in {key_name(parse_key(key))}):")
+    else:
+        print("\nChord progressions (Roman / C example):")
+    for ch in result.chords:
+        in_key_note = f"  ({ch['key']})" if "key" in ch else ""
+        print(f"- {ch['roman']}  |  e.g., {ch.get('chords', ch['C'])}{in_key_note}")
 
     print("\nInstrumentation suggestions:")
-    for it in instruments:
+    for it in result.instruments:
         print(f"- {it}")
 
     print("\nReference tracks:")
-    for a, note in refs:
+    for a, note in result.references:
         print(f"- {a}  — {note}")
 
     print("\nCopy the prompt above into Suno. You can rerun and tweak preferences to iterate quickly.")
     print("=========================================================")
 
+def run_batch(path: str, tempo: str = "auto", texture: str = "auto", era: str = "auto", profiler=None,
+              tenant: Optional[str] = None, key: Optional[str] = None):
+    """Generate one prompt per non-empty line of `path`, printed as JSON lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        descriptions = [line.strip() for line in f if line.strip()]
+    for desc in descriptions:
+        intent = UserIntent(description=desc, tempo_pref=tempo, texture_pref=texture, era_pref=era, tenant=tenant,
+                            key=key)
+        with _profiled(profiler):
+            result = generate_prompt(intent, endpoint="batch")
+        record = asdict(result)
+        record["description"] = desc
+        print(json.dumps(record, ensure_ascii=False))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SonicPalette: Suno prompt builder")
+    parser.add_argument("--batch", metavar="FILE", help="Generate prompts for each line of FILE (JSON lines output)")
+    parser.add_argument("--tempo", default="auto", choices=["auto", "slow", "medium", "fast"])
+    parser.add_argument("--texture", default="auto", choices=["auto", "electronic", "acoustic"])
+    parser.add_argument("--era", default="auto", choices=["auto", "retro", "modern"])
+    parser.add_argument("--tenant", help="Use this tenant's knowledge-base overlay (data/tenants/<name>)")
+    parser.add_argument("--key", help="Write the chords in this key, e.g. Eb, F#m, \"D minor\" (default: C)")
+    parser.add_argument("--profile", metavar="DIR", help="Write cProfile/tracemalloc reports to DIR")
+    parser.add_argument("--profile-requests", type=int, default=None, metavar="N",
+                        help="Profile only the first N requests (default: all)")
+    args = parser.parse_args(argv)
+    try:
+        get_knowledge_base(args.tenant)
+        if args.key:
+            parse_key(args.key)
+    except ValueError as e:
+        parser.error(str(e))
+
+    profiler = None
+    if args.profile:
+        from profiling import RequestProfiler
+        profiler = RequestProfiler(args.profile, args.profile_requests)
+    try:
+        if args.batch:
+            run_batch(args.batch, args.tempo, args.texture, args.era, profiler, args.tenant, args.key)
+        else:
+            interactive_session(profiler, args.tenant, args.key)
+    finally:
+        if profiler is not None:
+            profiler.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Merge Benchmark for SonicPalette
+Merges a batch of references into an existing catalog with the set-based
+merge engine (in memory and through the knowledge store), and compares it
+with the old per-reference list scan on a smaller catalog.
+
+The incoming batch overlaps the catalog: a share of it is the same tracks
+with different spelling (case, dash style), some with a changed note.
+
+Usage:
+    python bench_merge.py
+    python bench_merge.py --catalog 200000 --incoming 100000 --styles 100
+"""
+
+import argparse
+import copy
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from kb_store import KnowledgeStore
+from merge_engine import merge_references, merge_references_into_store
+
+
+def make_catalog(n_refs: int, n_styles: int, seed: int = 0) -> Dict[str, List[List[str]]]:
+    rng = random.Random(seed)
+    catalog: Dict[str, List[List[str]]] = {}
+    for i in range(n_refs):
+        style = f"Style {i % n_styles}"
+        catalog.setdefault(style, []).append([f"Artist {rng.randrange(n_refs // 4 + 1)} - Track {i}", "catalog"])
+    return catalog
+
+
+def make_incoming(catalog: Dict[str, List[List[str]]], n_refs: int, overlap: float = 0.3,
+                  seed: int = 1) -> Dict[str, List[List[str]]]:
+    """n_refs references, `overlap` of them respelled copies of catalog entries"""
+    rng = random.Random(seed)
+    existing = [(style, ref) for style, refs in catalog.items() for ref in refs]
+    incoming: Dict[str, List[List[str]]] = {}
+    for i in range(n_refs):
+        if existing and rng.random() < overlap:
+            style, (title, note) = rng.choice(existing)
+            artist, track = title.split(" - ", 1)
+            title = f"{artist.upper()} – {track.lower()}"
+            note = note if rng.random() < 0.5 else "re-imported"
+        else:
+            style = f"Style {rng.randrange(len(catalog) or 1)}"
+            title, note = f"New Artist {i} - New Track {i}", "imported"
+        incoming.setdefault(style, []).append([title, note])
+    return incoming
+
+
+def list_scan_merge(data: Dict[str, list], incoming: Dict[str, list]) -> int:
+    """The previous approach: `if ref not in data[style]` for every reference"""
+    added = 0
+    for style, refs in incoming.items():
+        if style not in data:
+            data[style] = list(refs)
+            added += len(refs)
+            continue
+        for ref in refs:
+            if ref not in data[style]:
+                data[style].append(ref)
+                added += 1
+    return added
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reference merging")
+    parser.add_argument("--catalog", type=int, default=100_000, help="References already in the catalog")
+    parser.add_argument("--incoming", type=int, default=100_000, help="References in the merged batch")
+    parser.add_argument("--styles", type=int, default=50)
+    parser.add_argument("--scan-size", type=int, default=5_000,
+                        help="Catalog/batch size for the list-scan comparison (it is quadratic)")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.catalog, args.styles)
+    incoming = make_incoming(catalog, args.incoming)
+    print(f"Catalog: {args.catalog} references in {args.styles} styles; batch: {args.incoming} references\n")
+
+    result, elapsed = timed(merge_references, copy.deepcopy(catalog), incoming, update_notes=True)
+    print(f"Hash-indexed merge (in memory): {elapsed:7.3f}s  {result}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("bench"):
+                for style, refs in catalog.items():
+                    store.add_references(style, refs)
+            store.flush()
+
+            def merge_and_export():
+                merged = merge_references_into_store(store, incoming, update_notes=True, source="bench")
+                store.flush()
+                return merged
+
+            result, elapsed = timed(merge_and_export)
+    print(f"Hash-indexed merge (store):     {elapsed:7.3f}s  {result}  (one transaction + JSON export)")
+
+    # One large style, where the list scan hurts most
+    small_catalog = make_catalog(args.scan_size, 1)
+    small_incoming = make_incoming(small_catalog, args.scan_size)
+    result, fast = timed(merge_references, copy.deepcopy(small_catalog), small_incoming)
+    added, slow = timed(list_scan_merge, copy.deepcopy(small_catalog), small_incoming)
+    print(f"\nAt {args.scan_size} references in one style: "
+          f"list scan {slow:.3f}s ({added} added, respellings not caught) "
+          f"vs hash index {fast:.3f}s ({result.added} added)")
+
+
+if __name__ == "__main__":
+    main()
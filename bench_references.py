@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Reference Sampling Benchmark for SonicPalette
+Times app.suggest_references, which draws artist groups from pools grouped
+at load time (records.ReferencePool), against the previous approach of
+copying every candidate reference into a list, shuffling it and scanning
+for distinct titles - for a small and a very large reference pool.
+
+Usage:
+    python bench_references.py
+    python bench_references.py --sizes 10 1000 100000 --requests 2000
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List, Tuple
+
+import app
+from data_loader import KnowledgeBase
+from records import freeze_references
+
+
+def make_references(size: int, seed: int = 0) -> Dict[str, List[List[str]]]:
+    """One style with `size` references (about 3 per artist) plus "Indie refs" """
+    rng = random.Random(seed)
+    refs = [[f"Artist {rng.randrange(size // 3 + 1)} - Track {i}", "bench"] for i in range(size)]
+    return {"Bench": refs, "Indie refs": [["Indie Artist - Indie Track", "indie"]]}
+
+
+def shuffle_sample(reference_db, styles: List[str], n: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """The previous approach: O(pool size) per request"""
+    pool = []
+    for st in styles:
+        pool.extend(reference_db.get(st, []))
+    pool.extend(reference_db.get("Indie refs", []))
+    rng.shuffle(pool)
+    out, seen = [], set()
+    for item in pool:
+        if item[0] not in seen:
+            out.append(item)
+            seen.add(item[0])
+        if len(out) >= n:
+            break
+    return out
+
+
+def per_request_us(fn, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        fn(random.Random(i))
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reference sampling")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100_000], help="References in the pool")
+    parser.add_argument("--requests", type=int, default=1_000)
+    parser.add_argument("-n", type=int, default=5, help="References per request")
+    args = parser.parse_args()
+
+    print(f"{'pool':>8}  {'grouped (us/request)':>21}  {'shuffle (us/request)':>21}  speedup")
+    for size in args.sizes:
+        reference_db = freeze_references(make_references(size))
+        kb = KnowledgeBase(name=f"bench-{size}", emotion_keywords={}, style_db={},
+                           reference_db=reference_db, emotion_to_styles={})
+        grouped = per_request_us(
+            lambda rng: app.suggest_references(["Bench"], [], n=args.n, rng=rng, kb=kb), args.requests)
+        shuffled = per_request_us(
+            lambda rng: shuffle_sample(reference_db, ["Bench"], args.n, rng), args.requests)
+        print(f"{size:>8}  {grouped:>21.1f}  {shuffled:>21.1f}  {shuffled / grouped:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
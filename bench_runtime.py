@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ML runtime settings on this host
+For every (torch threads, workers) combination, starts `workers` app
+processes with SONICPALETTE_TORCH_THREADS set, waits until all of them
+have loaded and warmed up the model, then lets them analyze descriptions
+at the same time - like several Gradio workers sharing the machine.
+Reports aggregate throughput and request latency per combination.
+
+Usage:
+    python bench_runtime.py
+    python bench_runtime.py --threads 1 2 4 --workers 1 2 4 --requests 50 --batch-size 16
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from typing import Dict, List
+
+from scaling_report import SAMPLE_DESCRIPTIONS, _percentile
+
+
+def run_worker(n_requests: int):
+    """Child process: warm up, report ready, wait for "go", then measure"""
+    import app
+    app.analyze_description(SAMPLE_DESCRIPTIONS[0])  # loads and warms up the model
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    start = time.time()
+    for i in range(n_requests):
+        t0 = time.perf_counter()
+        app.analyze_description(SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)])
+        latencies.append(time.perf_counter() - t0)
+    print(json.dumps({"start": start, "end": time.time(), "latencies": latencies}), flush=True)
+
+
+def measure(threads: int, workers: int, n_requests: int, extra_env: Dict[str, str]) -> Dict:
+    """Run one combination and aggregate the workers' results"""
+    env = dict(os.environ, SONICPALETTE_TORCH_THREADS=str(threads), **extra_env)
+    # Keep BLAS pools in line with torch's
+    env.setdefault("OMP_NUM_THREADS", str(threads))
+    cmd = [sys.executable, __file__, "--worker", "--requests", str(n_requests)]
+    procs = [subprocess.Popen(cmd, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        for proc in procs:
+            if proc.stdout.readline().strip() != "ready":
+                raise RuntimeError("benchmark worker failed to start")
+        for proc in procs:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        results = [json.loads(proc.stdout.readline()) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+
+    latencies = [lat for r in results for lat in r["latencies"]]
+    wall = max(r["end"] for r in results) - min(r["start"] for r in results)
+    return {
+        "threads": threads,
+        "workers": workers,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+    }
+
+
+def format_table(results: List[Dict]) -> str:
+    headers = ["threads", "workers", "requests", "req/s", "p50 ms", "p95 ms"]
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    for r in results:
+        lines.append(f"| {r['threads']} | {r['workers']} | {r['requests']} | {r['throughput_rps']:.1f} "
+                     f"| {r['p50_ms']:.1f} | {r['p95_ms']:.1f} |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/latency per torch thread and worker count")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="Torch intra-op threads")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Concurrent app processes")
+    parser.add_argument("--requests", type=int, default=30, help="Requests per worker")
+    parser.add_argument("--batch-size", type=int, help="SONICPALETTE_ENCODE_BATCH_SIZE for all runs")
+    parser.add_argument("--no-inference-mode", action="store_true", help="Encode without torch.inference_mode")
+    parser.add_argument("--json", help="Also write raw results as JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests)
+        return
+
+    import app
+    if not app.ML_AVAILABLE:
+        warnings.warn("sentence-transformers is not installed: only the keyword path is measured, "
+                      "so thread settings make no difference. Benchmark where the model is available.")
+
+    extra_env = {"SONICPALETTE_CASCADE": "off"}
+    if args.batch_size:
+        extra_env["SONICPALETTE_ENCODE_BATCH_SIZE"] = str(args.batch_size)
+    if args.no_inference_mode:
+        extra_env["SONICPALETTE_INFERENCE_MODE"] = "off"
+
+    print(f"{os.cpu_count()} CPUs")
+    results = []
+    for threads in args.threads:
+        for workers in args.workers:
+            results.append(measure(threads, workers, args.requests, extra_env))
+            print(f"✓ Measured {threads} threads x {workers} workers", flush=True)
+
+    print("\n=== Runtime Benchmark ===\n")
+    print(format_table(results))
+    best = max(results, key=lambda r: r["throughput_rps"])
+    print(f"\nHighest throughput: {best['threads']} threads x {best['workers']} workers")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"✓ Saved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+BM25 lexical scoring over the knowledge base
+Exact keyword matching gives nothing for a description that only shares a
+few words with a style ("smooth vocals", "rainy evening"). BM25Index scores
+every style or emotion document - name, description, keywords and, for
+styles, reference notes - with per-field weights, so partial matches count.
+
+The index is a term-major sparse matrix held in NumPy arrays (CSR: indptr,
+doc ids, precomputed BM25 weights). Scoring gathers the postings of the
+query terms and sums them per document with np.bincount; a batch of
+queries is scored in one call the same way.
+
+Raw BM25 scores have no fixed scale. relative_matches() divides them by
+the query's self-score - what a document containing every query term with
+saturated frequency would get - so a document matching one incidental word
+of a longer query stays well below 1.0 however the other documents score.
+"""
+
+from collections import Counter
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from multivector import ranges_to_indices
+
+K1 = 1.2
+B = 0.75
+
+# Field weights: how much one occurrence counts towards term frequency
+# Reference notes are free text ("a modern mellow twist"): they only break ties
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "description": 1.0, "notes": 0.1}
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or so that the this to
+with without very just really some more most music song songs sound sounds style feel feeling
+feels vibe vibes like kind type track tracks mood atmosphere
+""".split())
+
+
+def normalize_terms(tokens: Sequence[str]) -> List[str]:
+    """Drop stopwords and stray letters ("808s" -> "s") and fold simple
+    plurals ("pads" -> "pad")"""
+    terms = []
+    for token in tokens:
+        if token in STOPWORDS or (len(token) == 1 and token.isascii()):
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def style_fields(style: str, meta: Mapping, references: Sequence[Tuple[str, str]] = ()) -> List[Tuple[str, str]]:
+    """(field, text) pairs of a style document"""
+    fields = [("name", style), ("description", meta.get("description", ""))]
+    fields.extend(("keywords", kw) for kw in meta.get("keywords", []))
+    fields.extend(("notes", note) for _, note in references if note)
+    return fields
+
+
+def emotion_fields(emotion: str, keywords: Sequence[str], description: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(field, text) pairs of an emotion document"""
+    return [("name", emotion), ("description", description or "")] + [("keywords", kw) for kw in keywords]
+
+
+class BM25Index:
+    """BM25 over a fixed set of named documents"""
+
+    def __init__(self, names: List[str], vocab: Dict[str, int], indptr: np.ndarray,
+                 doc_ids: np.ndarray, weights: np.ndarray, idf: np.ndarray, k1: float = K1):
+        self.names = names
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.k1 = k1
+        # Terms the index hasn't seen count as the rarest possible term
+        self.unseen_idf = float(np.log1p((len(names) - 0.5) / 1.5)) if names else 0.0
+
+    @classmethod
+    def build(cls, documents: Dict[str, List[Tuple[str, str]]],
+              tokenize: Callable[[str], List[str]], k1: float = K1, b: float = B) -> "BM25Index":
+        """Index {name: [(field, text), ...]}; `tokenize` must match the queries'"""
+        names = list(documents)
+        doc_tfs: List[Counter] = []
+        for name in names:
+            tf: Counter = Counter()
+            for field, text in documents[name]:
+                weight = FIELD_WEIGHTS[field]
+                for term in normalize_terms(tokenize(text)):
+                    tf[term] += weight
+            doc_tfs.append(tf)
+
+        vocab: Dict[str, int] = {}
+        terms, docs, tfs = [], [], []
+        for doc, tf in enumerate(doc_tfs):
+            for term, count in tf.items():
+                terms.append(vocab.setdefault(term, len(vocab)))
+                docs.append(doc)
+                tfs.append(count)
+        terms = np.array(terms, dtype=np.int64)
+        docs = np.array(docs, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+
+        n_docs = max(len(names), 1)
+        lengths = np.array([sum(tf.values()) for tf in doc_tfs] or [0.0], dtype=np.float32)
+        avg_length = max(float(lengths.mean()), 1e-9)
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        weights = idf[terms] * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths[docs] / avg_length))
+
+        # Term-major order: the postings of term t are indptr[t]:indptr[t+1]
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+        return cls(names, vocab, indptr, docs[order], weights[order].astype(np.float32),
+                   idf.astype(np.float32), k1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _term_ids(self, tokens: Sequence[str]) -> Counter:
+        return Counter(self.vocab[t] for t in normalize_terms(tokens) if t in self.vocab)
+
+    def scores(self, tokens: Sequence[str]) -> np.ndarray:
+        """BM25 score of every document for one tokenized query"""
+        return self.batch_scores([tokens])[0]
+
+    def batch_scores(self, queries: Sequence[Sequence[str]]) -> np.ndarray:
+        """(len(queries), len(self)) scores for a batch of tokenized queries"""
+        query_ids, term_ids, counts = [], [], []
+        for q, tokens in enumerate(queries):
+            for term, count in self._term_ids(tokens).items():
+                query_ids.append(q)
+                term_ids.append(term)
+                counts.append(count)
+        n = len(self.names)
+        if not term_ids:
+            return np.zeros((len(queries), n), dtype=np.float32)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+        postings = ranges_to_indices(starts, lengths)
+        query_of = np.repeat(np.array(query_ids, dtype=np.int64), lengths)
+        weights = self.weights[postings] * np.repeat(np.array(counts, dtype=np.float32), lengths)
+        flat = np.bincount(query_of * n + self.doc_ids[postings], weights=weights, minlength=len(queries) * n)
+        return flat.reshape(len(queries), n).astype(np.float32)
+
+    def self_score(self, tokens: Sequence[str]) -> float:
+        """Upper bound of any document's score for the query"""
+        total = 0.0
+        for term, count in Counter(normalize_terms(tokens)).items():
+            idf = float(self.idf[self.vocab[term]]) if term in self.vocab else self.unseen_idf
+            total += count * idf * (self.k1 + 1)
+        return total
+
+    def relative_matches(self, tokens: Sequence[str]) -> Dict[str, float]:
+        """matches() as a fraction of the query's self-score, in [0, 1]"""
+        found = self.matches(tokens)
+        if not found:
+            return found
+        bound = self.self_score(tokens)
+        return {name: min(score / bound, 1.0) for name, score in found.items()}
+
+    def matches(self, tokens: Sequence[str]) -> Dict[str, float]:
+        """{name: score} of the documents sharing at least one term with the query"""
+        scores = self.scores(tokens)
+        hits = np.flatnonzero(scores > 0)
+        return {self.names[i]: float(scores[i]) for i in hits}
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Calibrate the keyword-first cascade
+For a set of descriptions, compares the cheap keyword pass with the full
+pipeline (analyze_description, ML when installed) and sweeps the early-exit
+thresholds: for each (min_emotions, min_margin) it reports the share of
+requests that would be answered without encoding and how often that answer
+agrees with the full pipeline. The loosest thresholds that keep agreement
+at or above the target are recommended, and --write stores them in
+data/cascade.json (read by data_loader.CASCADE_CONFIG).
+
+Agreement means the same primary style; agreement on both selected styles
+is reported alongside.
+
+Usage:
+    python calibrate_cascade.py
+    python calibrate_cascade.py --descriptions my_queries.txt --target 0.9 --write
+"""
+
+import argparse
+import warnings
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import app
+from data_loader import DATA_DIR
+from kb_store import atomic_write_json
+
+DEFAULT_DESCRIPTIONS = Path(__file__).parent / "fixtures" / "calibration_descriptions.txt"
+
+
+def collect(descriptions: Sequence[str], full_analyze: Optional[Callable] = None) -> List[Dict]:
+    """Keyword-pass evidence and full-pipeline answer for each description"""
+    full_analyze = full_analyze or app.analyze_description
+    rows = []
+    for description in descriptions:
+        emotions, scores = app.keyword_analysis(description)
+        margin, matched = app.keyword_evidence(description, emotions, scores)
+        _, full_scores = full_analyze(description)
+        keyword_top = app.pick_top_styles(scores, k=2)
+        full_top = app.pick_top_styles(full_scores, k=2)
+        rows.append({
+            "description": description,
+            "margin": margin,
+            "matched_emotions": matched,
+            "primary_agrees": keyword_top[0] == full_top[0],
+            "styles_agree": set(keyword_top) == set(full_top),
+        })
+    return rows
+
+
+def sweep(rows: List[Dict], min_emotions_options: Sequence[int] = (0, 1, 2)) -> List[Dict]:
+    """Early-exit share and agreement for every candidate threshold pair"""
+    margins = sorted({round(r["margin"], 3) for r in rows if r["margin"] > 0})
+    results = []
+    for min_emotions in min_emotions_options:
+        for min_margin in margins:
+            config = {"min_margin": min_margin, "min_emotions": min_emotions}
+            early = [r for r in rows if app.is_decisive(r["margin"], r["matched_emotions"], config)]
+            if not early:
+                continue
+            results.append({
+                **config,
+                "early_share": len(early) / len(rows),
+                "agreement": sum(r["primary_agrees"] for r in early) / len(early),
+                "styles_agreement": sum(r["styles_agree"] for r in early) / len(early),
+            })
+    return results
+
+
+def recommend(results: List[Dict], target: float) -> Optional[Dict]:
+    """Largest early-exit share whose agreement meets the target"""
+    ok = [r for r in results if r["agreement"] >= target]
+    if not ok:
+        return None
+    return max(ok, key=lambda r: (r["early_share"], r["min_margin"], r["min_emotions"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the keyword-first cascade thresholds")
+    parser.add_argument("--descriptions", type=Path, default=DEFAULT_DESCRIPTIONS,
+                        help="One description per line")
+    parser.add_argument("--target", type=float, default=0.95,
+                        help="Minimum agreement with the full pipeline among early exits")
+    parser.add_argument("--write", action="store_true", help="Save the recommendation to <data dir>/cascade.json")
+    args = parser.parse_args()
+
+    if not app.ML_AVAILABLE:
+        warnings.warn("sentence-transformers is not installed: the full pipeline is keyword-only, "
+                      "so agreement is trivially 100%. Calibrate where the model is available.")
+
+    with open(args.descriptions, 'r', encoding='utf-8') as f:
+        descriptions = [line.strip() for line in f if line.strip()]
+    rows = collect(descriptions)
+    results = sweep(rows)
+
+    print(f"{len(rows)} descriptions, current config: {app.CASCADE_CONFIG}\n")
+    print(f"{'min_emotions':>12} {'min_margin':>10} {'early exit':>10} {'agreement':>10} {'both styles':>11}")
+    previous = None
+    for r in results:
+        # Only rows where the early-exit share changes
+        if (r["min_emotions"], r["early_share"]) == previous:
+            continue
+        previous = (r["min_emotions"], r["early_share"])
+        print(f"{r['min_emotions']:>12} {r['min_margin']:>10.2f} {r['early_share']:>10.0%} "
+              f"{r['agreement']:>10.0%} {r['styles_agreement']:>11.0%}")
+
+    best = recommend(results, args.target)
+    if best is None:
+        print(f"\nNo threshold reaches {args.target:.0%} agreement; keep the cascade conservative.")
+        return
+    config = {"min_margin": best["min_margin"], "min_emotions": best["min_emotions"]}
+    print(f"\nRecommended: {config} -> {best['early_share']:.0%} answered early, "
+          f"{best['agreement']:.0%} agreement")
+    if args.write:
+        path = DATA_DIR / "cascade.json"
+        atomic_write_json(path, config, indent=4)
+        print(f"✓ Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
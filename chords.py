@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Chord progression compiler
+Style chords are stored as roman numerals ("ii7 – V7 – Imaj7") plus a
+hand-written rendering in C. Each distinct progression is parsed once, when
+the knowledge base is loaded (records.Chord), into (root offset, quality)
+pairs and rendered in all 24 keys; a request for a key is a tuple lookup.
+
+Keys keep the key signature of the progression: a minor progression
+("i – VI – III – VII") asked for in C major is rendered in A minor, as the
+hand-written C renderings do, and a major one asked for in A minor is
+rendered in C major. Transpositions.label names the key actually used
+("C major (relative of A minor)").
+
+Usage:
+    python chords.py "ii7 – V7 – Imaj7" --key "Eb"
+    python chords.py --check    # compare with the hand-written C renderings
+"""
+
+import argparse
+import functools
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+NOTES_SHARP = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+NOTES_FLAT = ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B")
+MAJOR, MINOR = 0, 1
+MODES = ("major", "minor")
+# Pitch classes of the keys spelled with flats
+FLAT_MAJOR_KEYS = frozenset({5, 10, 3, 8, 1})   # F Bb Eb Ab Db
+FLAT_MINOR_KEYS = frozenset({2, 7, 0, 5, 10, 3})   # Dm Gm Cm Fm Bbm Ebm
+
+SCALES = {MAJOR: (0, 2, 4, 5, 7, 9, 11), MINOR: (0, 2, 3, 5, 7, 8, 10)}
+NUMERALS = {"i": 1, "ii": 2, "iii": 3, "iv": 4, "v": 5, "vi": 6, "vii": 7}
+
+_CHORD = re.compile(r"^(?P<acc>[b#♭♯]?)(?P<num>vii|iii|vi|iv|ii|v|i)(?P<suffix>[^/]*?)"
+                    r"(?:/(?P<of_acc>[b#♭♯]?)(?P<of>vii|iii|vi|iv|ii|v|i))?$", re.IGNORECASE)
+_SEPARATORS = re.compile(r"\s*[–—-]\s*")
+_KEY = re.compile(r"^\s*(?P<tonic>[A-Ga-g])(?P<acc>[b#♭♯]?)\s*(?P<mode>m|min|minor|maj|major)?\s*$")
+
+# (semitones above the progression's tonic, quality suffix)
+Compiled = Tuple[Tuple[int, str], ...]
+
+
+def key_index(tonic: int, mode: int) -> int:
+    return tonic * 2 + mode
+
+
+@functools.lru_cache(maxsize=256)
+def parse_key(name: str) -> int:
+    """Index (0-23) of a key name: "C", "Am", "F# minor", "Eb major"..."""
+    match = _KEY.match(name)
+    if not match:
+        raise ValueError(f"Unknown key: {name!r}")
+    tonic = NOTES_SHARP.index(match["tonic"].upper())
+    tonic = (tonic + _accidental(match["acc"])) % 12
+    mode = MINOR if match["mode"] in ("m", "min", "minor") else MAJOR
+    return key_index(tonic, mode)
+
+
+def key_name(index: int) -> str:
+    tonic, mode = divmod(index, 2)
+    return f"{_spell(tonic, index)} {MODES[mode]}"
+
+
+def _spell(pitch: int, index: int) -> str:
+    tonic, mode = divmod(index, 2)
+    flats = tonic in (FLAT_MINOR_KEYS if mode == MINOR else FLAT_MAJOR_KEYS)
+    return (NOTES_FLAT if flats else NOTES_SHARP)[pitch % 12]
+
+
+KEY_NAMES = tuple(key_name(i) for i in range(24))
+
+
+def _accidental(acc: str) -> int:
+    return {"b": -1, "♭": -1, "#": 1, "♯": 1}.get(acc, 0)
+
+
+def _quality(minor: bool, suffix: str) -> str:
+    if suffix in ("°", "o", "dim", "°7", "dim7", "ø", "ø7", "m7b5"):
+        return {"°": "dim", "o": "dim", "°7": "dim7", "ø": "m7b5", "ø7": "m7b5"}.get(suffix, suffix)
+    if suffix in ("+", "aug"):
+        return "aug"
+    if suffix.startswith("sus"):
+        return suffix
+    if minor and suffix.startswith("maj"):
+        return "m(" + suffix + ")"
+    return ("m" if minor else "") + suffix
+
+
+def compile_progression(roman: str) -> Tuple[int, Compiled]:
+    """(mode, chords) of a roman progression; annotations in parentheses are
+    ignored. The mode is minor when the tonic chord is written lowercase."""
+    body = re.sub(r"\([^)]*\)", "", roman).strip()
+    tokens = [token for token in _SEPARATORS.split(body) if token]
+    if not tokens:
+        raise ValueError(f"Empty chord progression: {roman!r}")
+    parsed = []
+    for token in tokens:
+        match = _CHORD.match(token)
+        if not match:
+            raise ValueError(f"Can't parse chord {token!r} in {roman!r}")
+        parsed.append(match)
+    minor = any(m["num"] == "i" and not m["of"] for m in parsed)
+    scale = SCALES[MINOR if minor else MAJOR]
+    chords = []
+    for m in parsed:
+        offset = scale[NUMERALS[m["num"].lower()] - 1] + _accidental(m["acc"])
+        if m["of"]:
+            # Secondary chord: V/vi is the V of the vi chord
+            target = scale[NUMERALS[m["of"].lower()] - 1] + _accidental(m["of_acc"])
+            offset = target + SCALES[MAJOR][NUMERALS[m["num"].lower()] - 1] + _accidental(m["acc"])
+        chords.append((offset % 12, _quality(m["num"].islower(), m["suffix"])))
+    return (MINOR if minor else MAJOR), tuple(chords)
+
+
+def rendered_key(mode: int, index: int) -> int:
+    """Key a progression of `mode` is rendered in when key `index` is asked
+    for: the key itself, or its relative major/minor"""
+    tonic, key_mode = divmod(index, 2)
+    if mode == key_mode:
+        return index
+    return key_index((tonic + (9 if mode == MINOR else 3)) % 12, mode)
+
+
+def render(mode: int, chords: Compiled, index: int, separator: str = " – ") -> str:
+    """Chord names of a compiled progression in key `index`, moved to the
+    relative major/minor when the progression's mode differs"""
+    actual = rendered_key(mode, index)
+    return separator.join(_spell(actual // 2 + offset, actual) + quality for offset, quality in chords)
+
+
+class Transpositions(NamedTuple):
+    """A progression's mode and its renderings in all 24 keys (KEY_NAMES order)"""
+    mode: int
+    renderings: Tuple[str, ...]
+
+    def label(self, index: int) -> str:
+        """Name of the key the rendering for key `index` is in"""
+        actual = rendered_key(self.mode, index)
+        if actual == index:
+            return KEY_NAMES[index]
+        return f"{KEY_NAMES[actual]} (relative of {KEY_NAMES[index]})"
+
+
+def transpositions(roman: str) -> Transpositions:
+    mode, chords = compile_progression(roman)
+    return Transpositions(mode, tuple(render(mode, chords, index) for index in range(24)))
+
+
+_table: Dict[str, Optional[Transpositions]] = {}
+
+
+def table_for(roman: str) -> Optional[Transpositions]:
+    """All 24 renderings of a progression, compiled on first use (None if it
+    can't be parsed)"""
+    found = _table.get(roman, False)
+    if found is False:
+        try:
+            found = transpositions(roman)
+        except ValueError:
+            found = None
+        found = _table.setdefault(roman, found)
+    return found
+
+
+def in_key(roman: str, key: Optional[str]) -> Optional[str]:
+    """Rendering of a progression in a named key (None if either is unknown)"""
+    if not key:
+        return None
+    table = table_for(roman)
+    return None if table is None else table.renderings[parse_key(key)]
+
+
+def key_label(roman: str, key: str) -> Optional[str]:
+    """Name of the key in_key(roman, key) is actually written in"""
+    table = table_for(roman)
+    return None if table is None else table.label(parse_key(key))
+
+
+def main():
+    import app
+
+    parser = argparse.ArgumentParser(description="Transpose roman-numeral chord progressions")
+    parser.add_argument("progression", nargs="?", help='e.g. "ii7 – V7 – Imaj7"')
+    parser.add_argument("--key", default="C", help="Target key, e.g. Eb, F#m, D minor")
+    parser.add_argument("--check", action="store_true", help="Compare with the catalog's C renderings")
+    args = parser.parse_args()
+
+    if args.check:
+        seen: Dict[str, str] = {}
+        for meta in app.BASE_KB.style_db.values():
+            for chord in meta.get("chords", []):
+                seen.setdefault(chord["roman"], chord["C"])
+        differing: List[str] = []
+        for roman, written in seen.items():
+            computed = in_key(roman, "C")
+            if computed is None:
+                differing.append(f"{roman}: can't parse")
+            elif computed.replace(" ", "") != written.replace(" ", ""):
+                differing.append(f"{roman}: catalog {written} / computed {computed}")
+        print("\n".join(differing))
+        print(f"✓ {len(seen)} progressions checked, {len(differing)} differ from the catalog")
+        return
+    if not args.progression:
+        parser.error("give a progression or --check")
+    print(f"{key_label(args.progression, args.key)}: {in_key(args.progression, args.key)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical in-flight requests
+When many users submit the same description at once, only the first
+request (the leader) runs the computation; concurrent requests with the
+same key wait for it and share its result.
+
+Works from threads (Gradio runs handlers in a thread pool) and from
+asyncio: async callers await one future per key, and the leader's work runs
+in the default executor through the same thread-level flight, so thread
+and async callers of one key share a single computation.
+
+Coalesced callers are counted in the `coalesced_requests_total` metric.
+"""
+
+import asyncio
+import functools
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Hashable
+
+from tracing import incr, span
+
+_SPACES = re.compile(r"\s+")
+
+
+def coalesce_key(description: str) -> str:
+    """Requests whose descriptions differ only in case or spacing share a key"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", description).casefold()).strip()
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """At most one running computation per key; concurrent callers share it"""
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+
+    def _count(self):
+        with self._lock:
+            self.coalesced += 1
+        incr("coalesced_requests_total", flight=self.name)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return fn(*args, **kwargs), or the result of the identical call in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count()
+            with span("coalesced_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Async version of do(); a blocking `fn` runs in the default executor.
+
+        The shared result belongs to the executor job, not to the caller that
+        started it: a cancelled caller (e.g. a client that disconnected) stops
+        waiting, the job and the other callers carry on."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = loop.run_in_executor(
+                    None, functools.partial(self.do, key, fn, *args, **kwargs))
+                future.add_done_callback(functools.partial(self._finished, key))
+        if not leader:
+            self._count()
+        return await asyncio.shield(future)
+
+    def _finished(self, key: Hashable, future: asyncio.Future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if not future.cancelled():
+            future.exception()  # retrieved here if every caller was cancelled
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -4,19 +4,46 @@ Data Importer for SonicPalette
 Fetches and imports data from external sources to expand the knowledge base
 """
 
+import argparse
 import json
-import requests
 from pathlib import Path
 from typing import Dict, List
-import time
+
+from http_client import HttpClient, default_client
+from kb_store import KnowledgeStore
+from merge_engine import merge_references_into_store, merge_styles_into_store
 
 DATA_DIR = Path("data")
+# Response cache + checkpoint of resumable imports
+IMPORT_STATE_DIR = Path(".import_state")
+
+LASTFM_URL = "http://ws.audioscrobbler.com/2.0/"
+MUSICBRAINZ_URL = "https://musicbrainz.org/ws/2/release-group"
 
 # ============================================================================
 # Last.fm API Integration
 # ============================================================================
 
-def fetch_artist_top_tracks(artist_name: str, api_key: str = None) -> List[tuple]:
+def lastfm_top_tracks_params(artist_name: str, api_key: str) -> dict:
+    return {
+        "method": "artist.gettoptracks",
+        "artist": artist_name,
+        "api_key": api_key,
+        "format": "json",
+        "limit": 5
+    }
+
+def parse_lastfm_top_tracks(artist_name: str, data: dict) -> List[tuple]:
+    """Turn an artist.gettoptracks response into (artist - title, description) tuples"""
+    tracks = []
+    if "toptracks" in data and "track" in data["toptracks"]:
+        for track in data["toptracks"]["track"][:3]:
+            title = track.get("name", "Unknown")
+            tracks.append((f"{artist_name} - {title}", f"from {artist_name}'s top tracks"))
+    return tracks
+
+def fetch_artist_top_tracks(artist_name: str, api_key: str = None, client: HttpClient = None,
+                            url: str = LASTFM_URL) -> List[tuple]:
     """
     Fetch top tracks from Last.fm for an artist
     Returns: List of (artist - title, description) tuples
@@ -25,24 +52,10 @@ def fetch_artist_top_tracks(artist_name: str, api_key: str = None) -> List[tuple
         print("Warning: Last.fm API key not provided")
         return []
     
+    client = client or default_client()
     try:
-        url = "http://ws.audioscrobbler.com/2.0/"
-        params = {
-            "method": "artist.gettoptracks",
-            "artist": artist_name,
-            "api_key": api_key,
-            "format": "json",
-            "limit": 5
-        }
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
-        
-        if "toptracks" in data and "track" in data["toptracks"]:
-            tracks = []
-            for track in data["toptracks"]["track"][:3]:
-                title = track.get("name", "Unknown")
-                tracks.append((f"{artist_name} - {title}", f"from {artist_name}'s top tracks"))
-            return tracks
+        data = client.get_json(url, params=lastfm_top_tracks_params(artist_name, api_key))
+        return parse_lastfm_top_tracks(artist_name, data)
     except Exception as e:
         print(f"Error fetching from Last.fm: {e}")
     
@@ -52,26 +65,30 @@ def fetch_artist_top_tracks(artist_name: str, api_key: str = None) -> List[tuple
 # Open Music Database APIs
 # ============================================================================
 
-def fetch_musicbrainz_releases(artist: str, style: str) -> List[str]:
-    """Fetch release info from MusicBrainz"""
+def musicbrainz_release_params(artist: str) -> dict:
+    return {
+        "artist": artist,
+        "type": "album",
+        "limit": 5,
+        "fmt": "json"
+    }
+
+def parse_musicbrainz_releases(artist: str, data: dict) -> List[str]:
+    """Turn a release-group response into "artist - album" strings"""
+    albums = []
+    if "release-groups" in data:
+        for release in data["release-groups"][:3]:
+            title = release.get("title", "Unknown")
+            albums.append(f"{artist} - {title}")
+    return albums
+
+def fetch_musicbrainz_releases(artist: str, style: str, client: HttpClient = None,
+                               url: str = MUSICBRAINZ_URL) -> List[str]:
+    """Fetch release info from MusicBrainz (rate limited to 1 request/second)"""
+    client = client or default_client()
     try:
-        url = "https://musicbrainz.org/ws/2/release-group"
-        headers = {"User-Agent": "SonicPalette/1.0"}
-        params = {
-            "artist": artist,
-            "type": "album",
-            "limit": 5,
-            "fmt": "json"
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=5)
-        data = response.json()
-        
-        albums = []
-        if "release-groups" in data:
-            for release in data["release-groups"][:3]:
-                title = release.get("title", "Unknown")
-                albums.append(f"{artist} - {title}")
-        return albums
+        data = client.get_json(url, params=musicbrainz_release_params(artist))
+        return parse_musicbrainz_releases(artist, data)
     except Exception as e:
         print(f"MusicBrainz fetch error: {e}")
     return []
@@ -135,7 +152,7 @@ def expand_styles_from_seed_data():
             "bpm_max": 160,
             "instruments": ["Off-beat guitar", "Brass section", "Walking bass", "Drums", "Organ"],
             "chords": [
-                {"roman": "I – iv – V", "C": "C – F – G"}
+                {"roman": "I – IV – V", "C": "C – F – G"}
             ],
             "description": "Upbeat ska with brass section"
         },
@@ -151,12 +168,9 @@ def expand_styles_from_seed_data():
         }
     }
     
-    data = load_json("styles.json")
-    for style, info in seed_styles.items():
-        if style not in data:
-            data[style] = info
-    save_json("styles.json", data)
-    print(f"✓ Added {len(seed_styles)} new styles")
+    with KnowledgeStore(DATA_DIR) as store:
+        result = merge_styles_into_store(store, seed_styles, source="data_importer")
+    print(f"✓ Added {result.added} new styles")
 
 def expand_emotions_from_seed_data():
     """Add more emotions from seed data"""
@@ -184,11 +198,14 @@ def expand_emotions_from_seed_data():
     }
     
     data = load_json("emotions.json")
+    added = 0
     for emotion, info in seed_emotions.items():
         if emotion not in data:
             data[emotion] = info
-    save_json("emotions.json", data)
-    print(f"✓ Added {len(seed_emotions)} new emotions")
+            added += 1
+    if added:
+        save_json("emotions.json", data)
+    print(f"✓ Added {added} new emotions")
 
 def expand_references_from_predefined_lists():
     """Add reference tracks from curated lists"""
@@ -241,18 +258,9 @@ def expand_references_from_predefined_lists():
         ]
     }
     
-    data = load_json("references.json")
-    for style, refs in seed_references.items():
-        if style not in data:
-            data[style] = refs
-        else:
-            # Add new references if not already present
-            existing_titles = {r[0] for r in data[style]}
-            for ref in refs:
-                if ref[0] not in existing_titles:
-                    data[style].append(ref)
-    save_json("references.json", data)
-    print(f"✓ Expanded references for {len(seed_references)} styles")
+    with KnowledgeStore(DATA_DIR) as store:
+        result = merge_references_into_store(store, seed_references, source="data_importer")
+    print(f"✓ References across {len(seed_references)} styles: {result}")
 
 def expand_emotion_to_styles_mappings():
     """Add emotion-to-style mappings for new emotions and styles"""
@@ -270,12 +278,15 @@ def expand_emotion_to_styles_mappings():
         "serene": {"Ambient": 0.5, "Dream pop": 0.3, "Folk": 0.2}
     }
     
+    added = 0
     for emotion, styles in new_mappings.items():
         if emotion not in data:
             data[emotion] = styles
+            added += 1
     
-    save_json("emotion_to_styles.json", data)
-    print("✓ Updated emotion-to-style mappings")
+    if added:
+        save_json("emotion_to_styles.json", data)
+    print(f"✓ Added {added} emotion-to-style mappings")
 
 # ============================================================================
 # Helper Functions
@@ -294,26 +305,70 @@ def load_json(filename: str) -> dict:
         return {}
 
 def save_json(filename: str, data: dict):
-    """Save JSON file"""
-    filepath = DATA_DIR / filename
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    """Upsert the entries of a JSON document through the knowledge store"""
+    with KnowledgeStore(DATA_DIR) as store, store.transaction("data_importer"):
+        store.import_document(filename, data)
     print(f"✓ Saved {filename}")
 
+def import_artists(artists_file: str, api_key: str = None, workers: int = 8,
+                   state_dir: Path = IMPORT_STATE_DIR, refresh_days: float = 30, fresh: bool = False):
+    """Fetch references for {style: [artists]} concurrently and stream them into references.json.
+
+    Responses are cached under state_dir and completed artists checkpointed,
+    so reruns only fetch new or stale (older than refresh_days) entries and
+    an interrupted import resumes where it stopped.
+    """
+    from http_client import ResponseCache
+    from import_engine import ImportCheckpoint, ImportEngine
+
+    with open(artists_file, 'r', encoding='utf-8') as f:
+        artists_by_style = json.load(f)
+    jobs = [(artist, style) for style, artists in artists_by_style.items() for artist in artists]
+
+    refresh_after = refresh_days * 24 * 3600
+    cache = ResponseCache(state_dir / "responses", max_age=refresh_after)
+    checkpoint_path = state_dir / "checkpoint.json"
+    if fresh and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    checkpoint = ImportCheckpoint(checkpoint_path)
+
+    client = HttpClient(pool_size=workers, cache=cache)
+    engine = ImportEngine(client=client, max_workers=workers, lastfm_api_key=api_key)
+    summary = engine.import_into_knowledge_base(jobs, checkpoint=checkpoint, refresh_after=refresh_after)
+    print(f"✓ Imported {summary['added']} references for {summary['artists']} artists "
+          f"({summary['failed']} failed, {summary['skipped']} already up to date)")
+    print(f"  HTTP: {client.stats['network']} fetched, {client.stats['not_modified']} not modified, "
+          f"{client.stats['cache_fresh']} from cache")
+
 def main():
+    parser = argparse.ArgumentParser(description="SonicPalette data importer")
+    parser.add_argument("--artists", metavar="FILE",
+                        help='JSON file {"Style": ["Artist", ...]} to fetch references for')
+    parser.add_argument("--lastfm-key", help="Last.fm API key (top tracks)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent fetches")
+    parser.add_argument("--state-dir", type=Path, default=IMPORT_STATE_DIR,
+                        help="Response cache and checkpoint directory")
+    parser.add_argument("--refresh-days", type=float, default=30,
+                        help="Refetch artists and responses older than this")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    if args.artists:
+        print("=== SonicPalette Artist Import ===\n")
+        import_artists(args.artists, args.lastfm_key, args.workers,
+                       args.state_dir, args.refresh_days, args.fresh)
+        return
+
     print("=== SonicPalette Data Importer ===\n")
     
     print("1. Expanding styles...")
     expand_styles_from_seed_data()
-    time.sleep(0.5)
     
     print("\n2. Expanding emotions...")
     expand_emotions_from_seed_data()
-    time.sleep(0.5)
     
     print("\n3. Expanding references...")
     expand_references_from_predefined_lists()
-    time.sleep(0.5)
     
     print("\n4. Expanding emotion-to-style mappings...")
     expand_emotion_to_styles_mappings()
@@ -7,12 +7,20 @@ Falls back to hardcoded data if files are not available
 
 import json
 import os
-from typing import Dict, List, Tuple
+import re
+import threading
+from collections import ChainMap
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
 from pathlib import Path
 
+from records import LayeredPool, ReferencePool, Style, freeze_references, freeze_styles
+
 # Get the directory where this file is located
 BASE_DIR = Path(__file__).parent
-DATA_DIR = BASE_DIR / "data"
+# SONICPALETTE_DATA_DIR points the loader at another knowledge base
+# (e.g. a synthetic catalog written by scale_generator.py)
+DATA_DIR = Path(os.environ.get("SONICPALETTE_DATA_DIR", BASE_DIR / "data"))
 
 # ============================================================================
 # Hardcoded fallback data (original data from app.py)
@@ -38,7 +46,7 @@ _FALLBACK_STYLE_DB = {
         "instruments": ["Rhodes", "Electric piano", "Warm bass", "Soft kick & snare", "Silky synth pad", "Vocal layers"],
         "chords": [
             {"roman": "Imaj7 – vi7 – ii7 – V7", "C": "Cmaj7 – Am7 – Dm7 – G7"},
-            {"roman": "ivmaj7 – V7 – iii7 – vi7", "C": "Fmaj7 – G7 – Em7 – Am7"},
+            {"roman": "IVmaj7 – V7 – iii7 – vi7", "C": "Fmaj7 – G7 – Em7 – Am7"},
             {"roman": "Imaj7 – iii7 – vi7 – ii7", "C": "Cmaj7 – Em7 – Am7 – Dm7"},
         ],
     },
@@ -66,7 +74,7 @@ _FALLBACK_STYLE_DB = {
         "instruments": ["Electric guitar (clean)", "Slap/round bass", "Bright keys", "Disco hats", "Synth brass"],
         "chords": [
             {"roman": "Imaj7 – VI7 – ii7 – V7", "C": "Cmaj7 – A7 – Dm7 – G7"},
-            {"roman": "Imaj7 – V/vi – vi – ii7 – V7", "C": "Cmaj7 – E7 – Am – Dm7 – G7"},
+            {"roman": "Imaj7 – V7/vi – vi – ii7 – V7", "C": "Cmaj7 – E7 – Am – Dm7 – G7"},
         ],
     },
     "Trip-hop": {
@@ -184,9 +192,9 @@ _FALLBACK_EMOTION_TO_STYLES = {
 # Loading functions
 # ============================================================================
 
-def load_json_file(filename: str) -> dict:
+def load_json_file(filename: str, data_dir: Optional[Path] = None) -> dict:
     """Load and parse a JSON file from the data directory"""
-    filepath = DATA_DIR / filename
+    filepath = (data_dir or DATA_DIR) / filename
     if not filepath.exists():
         return None
     try:
@@ -201,19 +209,32 @@ def load_emotion_keywords() -> Dict[str, List[str]]:
     data = load_json_file("emotions.json")
     if data is None:
         return _FALLBACK_EMOTION_KEYWORDS
-    
+    return _convert_emotions(data)
+
+def _convert_emotions(data: Dict) -> Dict[str, List[str]]:
     # Convert JSON format to expected format
     result = {}
     for emotion, info in data.items():
         result[emotion] = info.get("keywords", [])
     return result
 
-def load_style_db() -> Dict:
-    """Load style database from JSON or fallback to hardcoded data"""
+def load_emotion_descriptions() -> Dict[str, str]:
+    """Load emotion descriptions (used for the emotions' embeddings)"""
+    data = load_json_file("emotions.json") or {}
+    return _convert_emotion_descriptions(data)
+
+def _convert_emotion_descriptions(data: Dict) -> Dict[str, str]:
+    return {emotion: info["description"] for emotion, info in data.items() if info.get("description")}
+
+def load_style_db() -> Dict[str, Style]:
+    """Load style database from JSON or fallback to hardcoded data, as
+    read-only Style records (records.py)"""
     data = load_json_file("styles.json")
     if data is None:
-        return _FALLBACK_STYLE_DB
-    
+        return freeze_styles(_FALLBACK_STYLE_DB)
+    return freeze_styles(_convert_styles(data))
+
+def _convert_styles(data: Dict) -> Dict:
     # Convert JSON format to expected format (convert bpm_min/max to tuple)
     result = {}
     for style, info in data.items():
@@ -225,12 +246,14 @@ def load_style_db() -> Dict:
         result[style] = style_data
     return result
 
-def load_reference_db() -> Dict[str, List[Tuple[str, str]]]:
+def load_reference_db() -> Dict[str, ReferencePool]:
     """Load reference database from JSON or fallback to hardcoded data"""
     data = load_json_file("references.json")
     if data is None:
-        return _FALLBACK_REFERENCE_DB
-    
+        return freeze_references(_FALLBACK_REFERENCE_DB)
+    return freeze_references(data)
+
+def _convert_references(data: Dict) -> Dict[str, List[Tuple[str, str]]]:
     # Convert JSON format to expected format
     result = {}
     for style, refs in data.items():
@@ -244,14 +267,143 @@ def load_emotion_to_styles() -> Dict[str, Dict[str, float]]:
         return _FALLBACK_EMOTION_TO_STYLES
     return data
 
+# Keyword-first cascade thresholds; data/cascade.json (written by
+# calibrate_cascade.py) overrides them
+_FALLBACK_CASCADE_CONFIG = {"min_margin": 1.5, "min_emotions": 1}
+
+def load_cascade_config() -> Dict[str, float]:
+    """Load the early-exit thresholds of the keyword/ML cascade"""
+    data = load_json_file("cascade.json") or {}
+    return {**_FALLBACK_CASCADE_CONFIG, **data}
+
 # ============================================================================
 # Initialize global data
 # ============================================================================
 
 EMOTION_KEYWORDS = load_emotion_keywords()
+EMOTION_DESCRIPTIONS = load_emotion_descriptions()
 STYLE_DB = load_style_db()
 REFERENCE_DB = load_reference_db()
 EMOTION_TO_STYLES = load_emotion_to_styles()
+CASCADE_CONFIG = load_cascade_config()
+
+# ============================================================================
+# Tenant overlays
+# ============================================================================
+# A tenant directory (TENANTS_DIR/<name>/) holds any of styles.json,
+# emotions.json, references.json and emotion_to_styles.json in the same
+# format as data/. Its knowledge base is the base one with the overlay on
+# top: ChainMaps over the shared base dicts, so a tenant costs memory for
+# its own entries only. Overlay styles replace base fields, keywords and
+# references are appended, emotion-to-style weights are updated.
+
+TENANTS_DIR = Path(os.environ.get("SONICPALETTE_TENANTS_DIR", DATA_DIR / "tenants"))
+_TENANT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+@dataclass
+class KnowledgeBase:
+    name: str
+    emotion_keywords: Mapping[str, List[str]]
+    style_db: Mapping[str, Dict]
+    reference_db: Mapping[str, List[Tuple[str, str]]]
+    emotion_to_styles: Mapping[str, Dict[str, float]]
+    emotion_descriptions: Mapping[str, str] = field(default_factory=dict)
+    # Styles/emotions defined or changed in this layer (everything for the base)
+    own_styles: FrozenSet[str] = frozenset()
+    own_emotions: FrozenSet[str] = frozenset()
+    base: Optional["KnowledgeBase"] = None
+    # Data derived from this layer only (e.g. candidate embeddings)
+    cache: Dict = field(default_factory=dict, repr=False)
+
+    def layers(self) -> List["KnowledgeBase"]:
+        """This knowledge base and the ones below it, base first"""
+        kb, layers = self, []
+        while kb is not None:
+            layers.append(kb)
+            kb = kb.base
+        return layers[::-1]
+
+
+def overlay_knowledge_base(base: KnowledgeBase, overlay_dir: Path, name: str) -> KnowledgeBase:
+    """Layer the JSON files in overlay_dir over `base` without copying it"""
+    def load(filename):
+        return load_json_file(filename, overlay_dir) or {}
+
+    styles = {}
+    for style, info in _convert_styles(load("styles.json")).items():
+        styles[style] = {**base.style_db[style], **info} if style in base.style_db else info
+    styles = freeze_styles(styles)
+
+    emotion_data = load("emotions.json")
+    emotions = {}
+    for emotion, keywords in _convert_emotions(emotion_data).items():
+        existing = base.emotion_keywords.get(emotion, [])
+        known = set(existing)
+        emotions[emotion] = list(existing) + [kw for kw in dict.fromkeys(keywords) if kw not in known]
+
+    # Only the overlay's own references are stored; a base style's pool is
+    # shared through a LayeredPool instead of copied
+    references = {}
+    for style, refs in freeze_references(_convert_references(load("references.json"))).items():
+        existing = base.reference_db.get(style)
+        if not existing:
+            references[style] = refs
+            continue
+        known = set(existing)
+        own = ReferencePool(ref for ref in refs if ref not in known)
+        references[style] = LayeredPool(existing, own) if own else existing
+
+    emotion_to_styles = {}
+    for emotion, weights in load("emotion_to_styles.json").items():
+        emotion_to_styles[emotion] = {**base.emotion_to_styles.get(emotion, {}), **weights}
+
+    return KnowledgeBase(
+        name=name,
+        emotion_keywords=ChainMap(emotions, base.emotion_keywords),
+        style_db=ChainMap(styles, base.style_db),
+        reference_db=ChainMap(references, base.reference_db),
+        emotion_to_styles=ChainMap(emotion_to_styles, base.emotion_to_styles),
+        emotion_descriptions=ChainMap(_convert_emotion_descriptions(emotion_data), base.emotion_descriptions),
+        own_styles=frozenset(styles),
+        own_emotions=frozenset(emotions),
+        base=base,
+    )
+
+
+BASE_KB = KnowledgeBase(
+    name="base",
+    emotion_keywords=EMOTION_KEYWORDS,
+    style_db=STYLE_DB,
+    reference_db=REFERENCE_DB,
+    emotion_to_styles=EMOTION_TO_STYLES,
+    emotion_descriptions=EMOTION_DESCRIPTIONS,
+    own_styles=frozenset(STYLE_DB),
+    own_emotions=frozenset(EMOTION_KEYWORDS),
+)
+
+_tenants: Dict[str, KnowledgeBase] = {}
+_tenants_lock = threading.Lock()
+
+
+def list_tenants() -> List[str]:
+    if not TENANTS_DIR.is_dir():
+        return []
+    return sorted(p.name for p in TENANTS_DIR.iterdir() if p.is_dir() and _TENANT_NAME.match(p.name))
+
+
+def get_knowledge_base(tenant: Optional[str] = None) -> KnowledgeBase:
+    """The tenant's knowledge base (loaded once), or the base one for None"""
+    if not tenant:
+        return BASE_KB
+    with _tenants_lock:
+        kb = _tenants.get(tenant)
+        if kb is None:
+            overlay_dir = TENANTS_DIR / tenant
+            if not _TENANT_NAME.match(tenant) or not overlay_dir.is_dir():
+                raise ValueError(f"Unknown tenant: {tenant}")
+            kb = _tenants[tenant] = overlay_knowledge_base(BASE_KB, overlay_dir, tenant)
+        return kb
 
 if __name__ == "__main__":
     # Test loading
@@ -263,4 +415,7 @@ if __name__ == "__main__":
     
     print("\nExample emotions:", list(EMOTION_KEYWORDS.keys())[:5])
     print("Example styles:", list(STYLE_DB.keys())[:5])
+    for tenant in list_tenants():
+        kb = get_knowledge_base(tenant)
+        print(f"Tenant {tenant}: {len(kb.own_styles)} own styles, {len(kb.style_db)} total")
 
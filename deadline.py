@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Latency budgets for the ML stage of the pipeline
+Each request gets a Deadline from its endpoint's budget. The ML analysis
+runs on a BoundedExecutor; when it cannot start or finish within the
+remaining budget (queue full, model still loading, encode too slow), the
+caller falls back to keyword scoring and marks the response as degraded.
+Jobs run in a copy of the caller's contextvars context, so the request's
+stage timings (tracing.request_trace) and profiler follow them.
+
+Budgets are seconds per endpoint; DEFAULT_BUDGETS can be overridden with
+SONICPALETTE_ML_BUDGET_<ENDPOINT> (e.g. SONICPALETTE_ML_BUDGET_UI=0.8, or
+"off" for no deadline). The executor size and queue limit come from
+SONICPALETTE_ML_WORKERS and SONICPALETTE_ML_MAX_QUEUE.
+
+Metrics: ml_requests_total{endpoint}, ml_fallbacks_total{endpoint,reason}
+and the ml_fallback_ratio{endpoint} gauge.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+from tracing import incr, set_gauge
+
+# None = no deadline (offline use: CLI, batch jobs)
+DEFAULT_BUDGETS: Dict[str, Optional[float]] = {
+    "ui": 2.0,
+    "api": 1.0,
+    "cli": None,
+    "batch": None,
+    "default": None,
+}
+
+
+class DeadlineExceeded(Exception):
+    """The ML stage could not run within the budget; `reason` says why"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Deadline:
+    """Absolute point in time by which a request should be answered"""
+
+    def __init__(self, budget: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def budget_for(endpoint: str) -> Optional[float]:
+    value = os.environ.get(f"SONICPALETTE_ML_BUDGET_{endpoint.upper()}")
+    if value is None:
+        return DEFAULT_BUDGETS.get(endpoint)
+    if value.strip().lower() in ("", "off", "none"):
+        return None
+    return float(value)
+
+
+def deadline_for(endpoint: str) -> Optional[Deadline]:
+    budget = budget_for(endpoint)
+    return Deadline(budget) if budget is not None else None
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work beyond `max_pending` queued/running jobs"""
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 8):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ml")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def run(self, fn: Callable, *args, deadline: Deadline):
+        """fn(*args) if it completes before the deadline, else DeadlineExceeded"""
+        if deadline.expired():
+            raise DeadlineExceeded("expired")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise DeadlineExceeded("queue_full")
+            self._pending += 1
+        future = self._pool.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            # A job that never started is dropped; a running encode can't be
+            # interrupted, it finishes in the background and still counts as pending
+            raise DeadlineExceeded("queue_timeout" if future.cancel() else "timeout") from None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def ml_executor() -> BoundedExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = BoundedExecutor(
+                max_workers=int(os.environ.get("SONICPALETTE_ML_WORKERS", "1")),
+                max_pending=int(os.environ.get("SONICPALETTE_ML_MAX_QUEUE", "8")),
+            )
+        return _executor
+
+
+_outcomes: Dict[str, list] = {}  # endpoint -> [requests, fallbacks]
+_outcomes_lock = threading.Lock()
+
+
+def record_outcome(endpoint: str, fallback_reason: Optional[str] = None):
+    """Count one ML attempt and update the endpoint's fallback ratio"""
+    incr("ml_requests_total", endpoint=endpoint)
+    if fallback_reason is not None:
+        incr("ml_fallbacks_total", endpoint=endpoint, reason=fallback_reason)
+    with _outcomes_lock:
+        counts = _outcomes.setdefault(endpoint, [0, 0])
+        counts[0] += 1
+        counts[1] += fallback_reason is not None
+        ratio = counts[1] / counts[0]
+    set_gauge("ml_fallback_ratio", ratio, endpoint=endpoint)
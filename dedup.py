@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for reference tracks
+Catalog imports contain the same track under different names, e.g.
+"Bob Marley - No Woman, No Cry" and
+"Bob Marley & The Wailers - No Woman No Cry (Live)". This module groups
+them so only one canonical entry per track is kept in references.json and
+the other spellings are recorded in reference_aliases.json.
+
+Pipeline:
+1. canonical_text() strips version tags, "feat." credits and backing-band
+   suffixes, then references are embedded in batches (character n-gram
+   hashing with NumPy by default, or sentence-transformers with --model)
+2. references are blocked by style and the first letters of the title, and
+   each block is compared with one matrix product per chunk of rows, for
+   titles and artists separately
+3. pairs above both thresholds are joined with union-find; the earliest
+   entry of a group (existing catalog first) becomes the canonical one
+
+Usage:
+    python dedup.py                      # dedup data/references.json in place
+    python dedup.py --dry-run --threshold 0.8
+"""
+
+import argparse
+import re
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kb_store import KnowledgeStore
+from merge_engine import MergeResult, merge_references_into_store
+
+DEFAULT_THRESHOLD = 0.8  # title similarity
+ARTIST_THRESHOLD = 0.7
+DEFAULT_DIM = 1024
+BATCH_SIZE = 4096
+CHUNK_ROWS = 1024
+
+_BRACKETS = re.compile(r"[(\[][^)\]]*[)\]]")
+_VERSION_SUFFIX = re.compile(
+    r"\s[-–—]\s.*\b(live|remaster(ed)?|version|edit|mono|stereo|demo|acoustic|single)\b.*$")
+_FEATURING = re.compile(r"\s(feat\.?|ft\.?|featuring|with)\s.*$")
+_BACKING_BAND = re.compile(r"\s(&|and)\s+the\s.*$")
+_DASHES = re.compile(r"\s+[-–—]\s+")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+_ARTICLES = re.compile(r"^(the|a|an)\s")
+_DIGITS = re.compile(r"\d+")
+
+
+def _clean(text: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
+
+
+def canonical_text(title: str) -> Tuple[str, str]:
+    """(artist, title) with version tags and featured/backing credits removed"""
+    text = unicodedata.normalize("NFKC", title).casefold()
+    parts = _DASHES.split(text.strip(), maxsplit=1)
+    artist, song = ("", parts[0]) if len(parts) == 1 else parts
+    song = _VERSION_SUFFIX.sub("", " " + _BRACKETS.sub("", song)).strip()
+    artist = _BACKING_BAND.sub("", _FEATURING.sub("", " " + artist)).strip()
+    return _ARTICLES.sub("", _clean(artist)), _clean(song)
+
+
+def _block_key(style: str, song: str) -> Tuple[str, str]:
+    return style, _ARTICLES.sub("", song)[:2]
+
+
+class HashingEncoder:
+    """Character 3-gram counts hashed into `dim` buckets, L2-normalized"""
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        for i, text in enumerate(texts):
+            padded = f"  {text}  "
+            for j in range(len(padded) - 2):
+                rows.append(i)
+                cols.append(zlib.crc32(padded[j:j + 3].encode("utf-8")) % self.dim)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-9)
+
+
+class ModelEncoder:
+    """sentence-transformers embeddings (normalized), loaded on first use"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=256, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def _block_batches(blocks: Iterable[List[int]], batch_size: int) -> Iterable[List[List[int]]]:
+    batch, size = [], 0
+    for members in blocks:
+        if len(members) < 2:
+            continue
+        batch.append(members)
+        size += len(members)
+        if size >= batch_size:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # The smaller index (earlier entry) stays the root
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def find_duplicate_groups(entries: Sequence[Tuple[str, str]], encoder=None,
+                          threshold: float = DEFAULT_THRESHOLD,
+                          artist_threshold: float = ARTIST_THRESHOLD) -> List[List[int]]:
+    """Groups (of size > 1) of near-duplicate (style, title) entries, as
+    index lists in input order; the first index of a group is canonical.
+
+    Two entries match when both their titles (>= threshold) and their
+    artists (>= artist_threshold) are similar and they contain the same
+    numbers ("Symphony No. 5" is not "Symphony No. 9").
+    """
+    encoder = encoder or HashingEncoder()
+    artists, songs, blocks = [], [], {}
+    numbers = np.empty(len(entries), dtype=np.int64)
+    for i, (style, title) in enumerate(entries):
+        artist, song = canonical_text(title)
+        artists.append(artist)
+        songs.append(song)
+        numbers[i] = hash(tuple(_DIGITS.findall(f"{artist} {song}")))
+        blocks.setdefault(_block_key(style, song), []).append(i)
+
+    uf = _UnionFind(len(entries))
+    for batch in _block_batches(blocks.values(), BATCH_SIZE):
+        # Embed a batch of blocks at once; singleton blocks are never embedded
+        flat = [i for members in batch for i in members]
+        song_vectors = encoder.encode([songs[i] for i in flat])
+        artist_vectors = encoder.encode([artists[i] for i in flat])
+        offset = 0
+        for members in batch:
+            song_block = song_vectors[offset:offset + len(members)]
+            artist_block = artist_vectors[offset:offset + len(members)]
+            block_numbers = numbers[members]
+            offset += len(members)
+            for start in range(0, len(members), CHUNK_ROWS):
+                end = start + CHUNK_ROWS
+                match = song_block[start:end] @ song_block.T >= threshold
+                match &= artist_block[start:end] @ artist_block.T >= artist_threshold
+                match &= block_numbers[start:end, None] == block_numbers[None, :]
+                rows, cols = np.nonzero(match)
+                for r, c in zip(rows.tolist(), cols.tolist()):
+                    if start + r < c:
+                        uf.union(members[start + r], members[c])
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(entries)):
+        groups.setdefault(uf.find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+@dataclass
+class DedupResult:
+    kept: Dict[str, List[List[str]]] = field(default_factory=dict)
+    aliases: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+    @property
+    def duplicates(self) -> int:
+        return sum(len(a) for a in self.aliases.values())
+
+
+def dedup_references(incoming: Dict[str, Iterable[Sequence[str]]],
+                     existing: Optional[Dict[str, Sequence[Sequence[str]]]] = None,
+                     encoder=None, threshold: float = DEFAULT_THRESHOLD) -> DedupResult:
+    """Drop near-duplicates from `incoming`, against `existing` and each other.
+
+    Existing entries are never dropped and win over incoming ones; without
+    `existing`, the incoming catalog is deduplicated against itself.
+    """
+    entries: List[Tuple[str, str, str, bool]] = []  # style, title, note, is_existing
+    for style, refs in (existing or {}).items():
+        entries.extend((style, ref[0], ref[1], True) for ref in refs)
+    for style, refs in incoming.items():
+        entries.extend((style, ref[0], ref[1], False) for ref in refs)
+
+    result = DedupResult()
+    dropped = set()
+    for group in find_duplicate_groups([(e[0], e[1]) for e in entries], encoder, threshold):
+        canonical = entries[group[0]][1]
+        for i in group[1:]:
+            style, title, _, is_existing = entries[i]
+            if is_existing:
+                continue
+            dropped.add(i)
+            if title != canonical:
+                result.aliases.setdefault(style, {})[title] = canonical
+    for i, (style, title, note, is_existing) in enumerate(entries):
+        if not is_existing and i not in dropped:
+            result.kept.setdefault(style, []).append([title, note])
+    return result
+
+
+def dedup_into_store(store: KnowledgeStore, incoming: Dict[str, Iterable[Sequence[str]]],
+                     encoder=None, threshold: float = DEFAULT_THRESHOLD,
+                     source: str = "dedup") -> Tuple[MergeResult, int]:
+    """Merge incoming references, folding near-duplicates into aliases.
+
+    Returns the merge counts and how many incoming references became aliases.
+    One transaction: references and aliases commit together.
+    """
+    with store.transaction(source):
+        existing = store.document("references.json")
+        styles = set(incoming)
+        result = dedup_references(incoming, {s: r for s, r in existing.items() if s in styles},
+                                  encoder, threshold)
+        merged = merge_references_into_store(store, result.kept, source=source)
+        for style, aliases in result.aliases.items():
+            store.set_aliases(style, aliases)
+    return merged, result.duplicates
+
+
+def dedup_catalog(store: KnowledgeStore, encoder=None, threshold: float = DEFAULT_THRESHOLD,
+                  dry_run: bool = False, source: str = "dedup") -> DedupResult:
+    """Deduplicate the whole references catalog in place"""
+    with store.transaction(source):
+        result = dedup_references(store.document("references.json"), encoder=encoder, threshold=threshold)
+        if not dry_run:
+            for style, aliases in result.aliases.items():
+                store.remove_references(style, aliases)
+                store.set_aliases(style, aliases)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold near-duplicate references into aliases")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).parent / "data")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--model", action="store_true", help="Use sentence-transformers embeddings")
+    parser.add_argument("--dry-run", action="store_true", help="Report duplicates without changing data")
+    args = parser.parse_args()
+
+    encoder = ModelEncoder() if args.model else HashingEncoder()
+    start = time.perf_counter()
+    with KnowledgeStore(args.data_dir) as store:
+        result = dedup_catalog(store, encoder, args.threshold, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    for style, aliases in result.aliases.items():
+        for alias, canonical in aliases.items():
+            print(f"  [{style}] {alias}  →  {canonical}")
+    action = "Found" if args.dry_run else "Folded"
+    print(f"✓ {action} {result.duplicates} near-duplicate references in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
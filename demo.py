@@ -10,7 +10,7 @@ from app import (
     ML_AVAILABLE,
     pick_top_styles,
     blend_bpm,
-    collect_instruments,
+    rank_instruments,
     pick_chords,
     suggest_references,
     format_suno_prompt,
@@ -38,7 +38,7 @@ def demo_example(description, tempo_pref="auto", texture_pref="auto", era_pref="
     # Generate components
     top_styles = pick_top_styles(scores, k=2)
     bpm_range = blend_bpm(top_styles)
-    instruments = collect_instruments(top_styles)
+    instruments = rank_instruments(top_styles, description, texture=texture_pref)
     chords = pick_chords(top_styles, n=2)
     refs = suggest_references(top_styles, emotions, n=3)
     
@@ -10,6 +10,9 @@ from pathlib import Path
 from typing import Dict, List
 import time
 
+from kb_store import KnowledgeStore
+from merge_engine import merge_references_into_store, merge_styles_into_store
+
 DATA_DIR = Path("data")
 
 class DataExpander:
@@ -26,10 +29,9 @@ class DataExpander:
             return {}
     
     def save_json(self, filename: str, data: dict):
-        """Save JSON file"""
-        filepath = self.data_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        """Upsert the entries of a JSON document through the knowledge store"""
+        with KnowledgeStore(self.data_dir) as store, store.transaction("expand_data"):
+            store.import_document(filename, data)
         print(f"✓ Saved {filename}")
     
     def add_musical_styles_from_wikipedia_genres(self):
@@ -52,7 +54,7 @@ class DataExpander:
                 "bpm_max": 130,
                 "instruments": ["Slap bass", "Wah guitar", "Horn section", "Organ", "Drum kit"],
                 "chords": [
-                    {"roman": "i7 – v7", "C": "C7 – G7"},
+                    {"roman": "I7 – V7", "C": "C7 – G7"},
                     {"roman": "ii7 – V7 – I7", "C": "Dm7 – G7 – C7"}
                 ],
                 "description": "Groovy funk with syncopated rhythm"
@@ -121,16 +123,11 @@ class DataExpander:
             }
         }
         
-        data = self.load_json("styles.json")
-        added = 0
-        for style, info in genres_data.items():
-            if style not in data:
-                data[style] = info
-                added += 1
+        with KnowledgeStore(self.data_dir) as store:
+            result = merge_styles_into_store(store, genres_data, source="expand_data")
         
-        if added > 0:
-            self.save_json("styles.json", data)
-            print(f"✓ Added {added} new styles")
+        if result.added > 0:
+            print(f"✓ Added {result.added} new styles")
         else:
             print("No new styles to add")
     
@@ -179,18 +176,13 @@ class DataExpander:
             ]
         }
         
-        data = self.load_json("references.json")
-        for style, refs in references_data.items():
-            if style not in data:
-                data[style] = refs
-            else:
-                # Merge new references
-                for ref in refs:
-                    if ref not in data[style]:
-                        data[style].append(ref)
+        with KnowledgeStore(self.data_dir) as store:
+            result = merge_references_into_store(store, references_data, source="expand_data")
         
-        self.save_json("references.json", data)
-        print("✓ Expanded reference tracks")
+        if result.added > 0:
+            print(f"✓ Reference tracks: {result}")
+        else:
+            print("No new reference tracks to add")
     
     def add_advanced_emotions(self):
         """Add more nuanced emotions"""
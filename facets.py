@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Facet index over styles: tempo, era and texture
+Lets the tempo/era/texture preferences of a request steer which styles are
+chosen instead of only adjusting BPM and instruments afterwards.
+
+- tempo: an interval index over the styles' BPM ranges (bpm_min/bpm_max).
+  Both endpoints are kept sorted, so the styles whose range overlaps
+  [low, high] are found with two binary searches; the masks of the named
+  tempo bands are computed once when the index is built.
+- era and texture: one bitmap (boolean array over the styles) per value,
+  derived from a style's optional "tags" plus its keywords, description
+  and instruments ("80s", "vinyl" -> retro; "Analog polysynth" -> electronic).
+
+Looking up a preference is a dict access; app.apply_facets boosts (or with
+SONICPALETTE_FACET_MODE=filter, keeps only) the matching styles before the
+top styles are picked. instrument_textures() classifies instrument names
+the same way, for app.rank_instruments to favour the preferred texture.
+"""
+
+import functools
+import os
+import re
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+FACETS = ("tempo", "era", "texture")
+
+# A style suits a tempo preference when its BPM range overlaps the band
+TEMPO_BANDS = {"slow": (0, 90), "medium": (90, 120), "fast": (120, 1000)}
+
+# Each value is a regex; a style gets the value(s) with the most matches
+ERA_PATTERNS = {
+    "retro": r"retro|vintage|\b[5-9]0s\b|\b19\d0s\b|classic|old.?school|nostalg|analog|vinyl|tape|oldies|"
+             r"throwback|motown|disco|swing|dusty|lo-?fi",
+    "modern": r"modern|contemporary|futur|digital|\b20\d0s\b|hyperpop|trap|drill|\bedm\b|glitch|granular|"
+              r"festival|drop\b|dubstep",
+}
+TEXTURE_PATTERNS = {
+    "electronic": r"synth|\b808\b|drum machine|sub-bass|\barp\b|sampl|electronic|\bedm\b|techno|glitch|vocoder|"
+                  r"\bfm\b|modular|granular|chiptune|bitcrush|four-on-floor|\bplucks?\b",
+    "acoustic": r"acoustic|piano|guitar|strings|violin|cello|upright|double bass|fiddle|banjo|mandolin|brass|"
+                r"horns?\b|sax|trumpet|trombone|orchestra|choir|harmonica|organ\b|ukulele|flute|woodwind|"
+                r"timpani|brush",
+}
+
+FACET_BOOST = float(os.environ.get("SONICPALETTE_FACET_BOOST", "0.25"))
+FACET_MODE = os.environ.get("SONICPALETTE_FACET_MODE", "boost")  # or "filter"
+
+
+def _compile(patterns: Mapping[str, str]) -> Dict[str, "re.Pattern"]:
+    return {value: re.compile(pattern, re.IGNORECASE) for value, pattern in patterns.items()}
+
+
+_ERA = _compile(ERA_PATTERNS)
+_TEXTURE = _compile(TEXTURE_PATTERNS)
+
+
+def classify(texts: Sequence[str], patterns: Mapping[str, "re.Pattern"]) -> List[str]:
+    """Values whose pattern matches the texts most often (ties keep all)"""
+    text = " ".join(texts)
+    counts = {value: len(pattern.findall(text)) for value, pattern in patterns.items()}
+    best = max(counts.values(), default=0)
+    return [value for value, count in counts.items() if best and count == best]
+
+
+@functools.lru_cache(maxsize=4096)
+def instrument_textures(name: str) -> FrozenSet[str]:
+    """Texture values an instrument's name suggests ("Analog polysynth" -> electronic)"""
+    return frozenset(classify([name], _TEXTURE))
+
+
+def style_facets(meta: Mapping) -> Dict[str, List[str]]:
+    """Era and texture values of one style; explicit tags always count"""
+    tags = [str(tag).lower() for tag in meta.get("tags", [])]
+    words = [*tags, *meta.get("keywords", []), meta.get("description", "")]
+    era = set(classify(words, _ERA)) | {tag for tag in tags if tag in ERA_PATTERNS}
+    texture = set(classify([*tags, *meta.get("keywords", []), *meta.get("instruments", [])], _TEXTURE))
+    texture |= {tag for tag in tags if tag in TEXTURE_PATTERNS}
+    return {"era": sorted(era), "texture": sorted(texture)}
+
+
+class BPMIntervalIndex:
+    """Styles whose BPM range overlaps a query range, by binary search over
+    the sorted range starts and ends"""
+
+    def __init__(self, lo: np.ndarray, hi: np.ndarray):
+        self.n = len(lo)
+        self.by_lo = np.argsort(lo, kind="stable")
+        self.by_hi = np.argsort(hi, kind="stable")
+        self.lo_sorted = lo[self.by_lo]
+        self.hi_sorted = hi[self.by_hi]
+
+    def overlapping(self, low: float, high: float) -> np.ndarray:
+        """Boolean mask of the ranges with lo <= high and hi >= low"""
+        starts_before = np.zeros(self.n, dtype=bool)
+        starts_before[self.by_lo[:np.searchsorted(self.lo_sorted, high, side="right")]] = True
+        ends_after = np.zeros(self.n, dtype=bool)
+        ends_after[self.by_hi[np.searchsorted(self.hi_sorted, low, side="left"):]] = True
+        return starts_before & ends_after
+
+
+class FacetIndex:
+    """Tempo, era and texture bitmaps of a fixed list of styles"""
+
+    def __init__(self, names: List[str], bpm: BPMIntervalIndex, bitmaps: Dict[Tuple[str, str], np.ndarray]):
+        self.names = names
+        self.bpm = bpm
+        self.bitmaps = bitmaps
+        self._matching: Dict[Tuple[str, str], FrozenSet[str]] = {}
+
+    @classmethod
+    def build(cls, style_db: Mapping[str, Mapping], names: List[str]) -> "FacetIndex":
+        ranges = np.array([style_db[name].get("bpm", (0, 0)) for name in names], dtype=np.float32).reshape(-1, 2)
+        bpm = BPMIntervalIndex(ranges[:, 0], ranges[:, 1])
+        bitmaps = {("tempo", band): bpm.overlapping(low, high) for band, (low, high) in TEMPO_BANDS.items()}
+        for value in (*ERA_PATTERNS, *TEXTURE_PATTERNS):
+            facet = "era" if value in ERA_PATTERNS else "texture"
+            bitmaps[(facet, value)] = np.zeros(len(names), dtype=bool)
+        for i, name in enumerate(names):
+            for facet, values in style_facets(style_db[name]).items():
+                for value in values:
+                    bitmaps[(facet, value)][i] = True
+        return cls(names, bpm, bitmaps)
+
+    def __len__(self):
+        return len(self.names)
+
+    def mask(self, facet: str, value: str) -> Optional[np.ndarray]:
+        """Bitmap of the styles matching one preference (None for "auto" or unknown values)"""
+        return self.bitmaps.get((facet, value))
+
+    def matching(self, facet: str, value: str) -> Optional[FrozenSet[str]]:
+        """Names of the styles matching one preference, computed once per value"""
+        key = (facet, value)
+        if key not in self._matching:
+            mask = self.mask(facet, value)
+            if mask is None:
+                return None
+            self._matching[key] = frozenset(self.names[i] for i in np.flatnonzero(mask))
+        return self._matching[key]
+
+    def in_bpm_range(self, low: float, high: float) -> List[str]:
+        """Styles whose BPM range overlaps [low, high]"""
+        return [self.names[i] for i in np.flatnonzero(self.bpm.overlapping(low, high))]
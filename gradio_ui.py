@@ -1,43 +1,38 @@
+import os
+from contextlib import nullcontext
+
 import gradio as gr
-from app import (
-    tokenize, match_emotions, compute_style_scores, pick_top_styles,
-    blend_bpm, collect_instruments, pick_chords, suggest_references,
-    format_suno_prompt, apply_prefs, UserIntent
-)
+from app import generate_prompt, UserIntent
+from chords import KEY_NAMES
+from data_loader import list_tenants
+from profiling import profiler_from_env
+import tracing
 
-print("Loaded UserIntent:", UserIntent, type(UserIntent), flush=True)
+# SONICPALETTE_PROFILE=<dir> profiles the first SONICPALETTE_PROFILE_REQUESTS requests
+profiler = profiler_from_env()
 
-def generate(desc, tempo_pref, texture_pref, era_pref):
-    from app import ml_enhanced_emotion_detection, ml_enhanced_style_detection, ML_AVAILABLE
-    
-    intent = UserIntent(description=desc, tempo_pref=tempo_pref, texture_pref=texture_pref, era_pref=era_pref)
+BASE_CATALOG = "(shared catalog)"
+
+def generate(desc, tempo_pref, texture_pref, era_pref, show_timings=False, tenant=BASE_CATALOG, key="auto"):
+    intent = UserIntent(description=desc, tempo_pref=tempo_pref, texture_pref=texture_pref, era_pref=era_pref,
+                        tenant=None if tenant == BASE_CATALOG else tenant, key=None if key == "auto" else key)
     if not desc or not desc.strip():
         return "Please enter a description.", "", "", "", ""
     
-    # Use ML-enhanced detection
-    if ML_AVAILABLE:
-        emotions = ml_enhanced_emotion_detection(desc)
-        scores = ml_enhanced_style_detection(desc)
-    else:
-        tokens = tokenize(desc)
-        emotions = match_emotions(tokens)
-        scores = compute_style_scores(tokens, emotions)
-    
-    top_styles = pick_top_styles(scores, 2)
-    bpm_range = blend_bpm(top_styles)
-    instruments = collect_instruments(top_styles)
-    chord_list = pick_chords(top_styles, 2)
-    bpm_range, instruments = apply_prefs(bpm_range, instruments, intent)
-    refs = suggest_references(top_styles, emotions, 5)
-    
-    # Pass chords and references for inclusion in main prompt
-    prompt = format_suno_prompt(top_styles, emotions, bpm_range, instruments, chord_list, refs)
+    with profiler.request() if profiler is not None else nullcontext():
+        result = generate_prompt(intent, trace=show_timings, endpoint="ui")
+    bpm_range = result.bpm_range
 
-    meta = f"Styles: {', '.join(top_styles)}\nEmotions: {', '.join(emotions)}\nBPM: {bpm_range[0]}–{bpm_range[1]}\nTempo: {tempo_pref}, Texture: {texture_pref}, Era: {era_pref}"
-    chords_txt = "\n".join([f"- {c['roman']} | e.g., {c['C']}" for c in chord_list])
-    instr_txt = "\n".join([f"- {i}" for i in instruments])
-    refs_txt = "\n".join([f"- {a} — {note}" for a, note in refs])
-    return prompt, meta, chords_txt, instr_txt, refs_txt
+    meta = f"Styles: {', '.join(result.styles)}\nEmotions: {', '.join(result.emotions)}\nBPM: {bpm_range[0]}–{bpm_range[1]}\nTempo: {tempo_pref}, Texture: {texture_pref}, Era: {era_pref}"
+    if result.degraded:
+        meta += f"\nDegraded: keyword matching only ({result.degraded.replace('_', ' ')})"
+    if show_timings:
+        meta += "\nStage timings:\n" + tracing.format_timings(result.timings)
+    chords_txt = "\n".join([f"- {c['roman']} | e.g., {c.get('chords', c['C'])}" + (f" ({c['key']})" if "key" in c else "")
+                            for c in result.chords])
+    instr_txt = "\n".join([f"- {i}" for i in result.instruments])
+    refs_txt = "\n".join([f"- {a} — {note}" for a, note in result.references])
+    return result.prompt, meta, chords_txt, instr_txt, refs_txt
 
 with gr.Blocks(theme=gr.themes.Soft(primary_hue="indigo", secondary_hue="blue")) as demo:
     gr.Markdown("## SonicPalette — Suno Prompt Builder")
@@ -48,6 +43,10 @@ with gr.Blocks(theme=gr.themes.Soft(primary_hue="indigo", secondary_hue="blue"))
                 in_tempo = gr.Dropdown(choices=["auto","slow","medium","fast"], value="auto", label="Tempo")
                 in_texture = gr.Dropdown(choices=["auto","electronic","acoustic"], value="auto", label="Texture")
                 in_era = gr.Dropdown(choices=["auto","retro","modern"], value="auto", label="Era")
+                in_key = gr.Dropdown(choices=["auto"] + list(KEY_NAMES), value="auto", label="Key")
+            in_tenant = gr.Dropdown(choices=[BASE_CATALOG] + list_tenants(), value=BASE_CATALOG, label="Catalog",
+                                    visible=bool(list_tenants()))
+            in_timings = gr.Checkbox(value=False, label="Show stage timings")
             run_btn = gr.Button("Generate Prompt", variant="primary")
         with gr.Column(scale=2):
             out_prompt = gr.Textbox(label="Suno-style Prompt", lines=8)
@@ -55,9 +54,13 @@ with gr.Blocks(theme=gr.themes.Soft(primary_hue="indigo", secondary_hue="blue"))
             out_chords = gr.Textbox(label="Chord progressions", lines=6)
             out_instr = gr.Textbox(label="Instrumentation", lines=6)
             out_refs = gr.Textbox(label="Reference tracks", lines=6)
-    run_btn.click(generate, inputs=[in_desc, in_tempo, in_texture, in_era], outputs=[out_prompt, out_meta, out_chords, out_instr, out_refs])
+    run_btn.click(generate, inputs=[in_desc, in_tempo, in_texture, in_era, in_timings, in_tenant, in_key], outputs=[out_prompt, out_meta, out_chords, out_instr, out_refs])
 
 if __name__ == "__main__":
+    metrics_port = os.environ.get("SONICPALETTE_METRICS_PORT")
+    if metrics_port:
+        tracing.start_metrics_server(int(metrics_port))
+        print(f"Metrics: http://127.0.0.1:{metrics_port}/metrics (Prometheus), /metrics.json", flush=True)
     print("Launching Gradio...", flush=True)
     print("Note: Share links expire in 72 hours. Local URL (127.0.0.1:7860) never expires.")
     print("For permanent links, deploy to Hugging Face Spaces (free) or use Gradio paid plan.")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Pooled, rate-limited HTTP client for the SonicPalette importers
+One requests.Session with a sized connection pool (keep-alive), a token
+bucket per host (MusicBrainz allows 1 request/second) and retries with
+exponential backoff on connection errors, 429 and 5xx responses.
+An optional on-disk ResponseCache lets reruns skip or revalidate requests.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from kb_store import atomic_write_json
+
+USER_AGENT = "SonicPalette/1.0"
+
+# Requests per second allowed per host; unknown hosts use DEFAULT_RATE
+HOST_RATES = {
+    "musicbrainz.org": 1.0,
+    "ws.audioscrobbler.com": 5.0,
+}
+DEFAULT_RATE = 5.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Query parameters that must not end up in cache keys or cache files
+SECRET_PARAMS = {"api_key"}
+
+
+class FetchError(Exception):
+    """Raised when a request still fails after all retries"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, blocking until one is available"""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class ResponseCache:
+    """On-disk JSON response cache keyed by URL + params.
+
+    Entries younger than `max_age` seconds are served without a request;
+    older ones are revalidated with If-None-Match / If-Modified-Since when
+    the API sent an ETag or Last-Modified header.
+    """
+
+    def __init__(self, cache_dir, max_age: Optional[float] = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+
+    @staticmethod
+    def key(url: str, params: Optional[dict]) -> str:
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+        return hashlib.sha256(json.dumps([url, items]).encode("utf-8")).hexdigest()
+
+    def _path(self, url: str, params: Optional[dict]) -> Path:
+        return self.cache_dir / f"{self.key(url, params)}.json"
+
+    def get(self, url: str, params: Optional[dict]) -> Optional[dict]:
+        try:
+            with open(self._path(url, params), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return self.max_age is not None and time.time() - entry["fetched_at"] < self.max_age
+
+    def put(self, url: str, params: Optional[dict], body, headers: Dict[str, str]) -> dict:
+        entry = {
+            "url": url,
+            "params": {k: str(v) for k, v in (params or {}).items() if k not in SECRET_PARAMS},
+            "validators": {k: v for k, v in headers.items() if k in ("ETag", "Last-Modified")},
+            "fetched_at": time.time(),
+            "body": body,
+        }
+        atomic_write_json(self._path(url, params), entry)
+        return entry
+
+    def touch(self, url: str, params: Optional[dict], entry: dict):
+        """Mark a revalidated (304) entry as fresh again"""
+        entry["fetched_at"] = time.time()
+        atomic_write_json(self._path(url, params), entry)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = DEFAULT_RATE):
+        self.rates = dict(HOST_RATES if rates is None else rates)
+        self.default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rates.get(host, self.default_rate))
+            return self._buckets[host]
+
+    def acquire(self, url: str):
+        self.bucket(urlsplit(url).netloc).acquire()
+
+
+class HttpClient:
+    """Shared session + per-host rate limiting + retry with backoff"""
+
+    def __init__(self, pool_size: int = 16, rates: Optional[Dict[str, float]] = None,
+                 max_retries: int = 4, backoff: float = 0.5, timeout: float = 10.0,
+                 recorder=None, cache: Optional[ResponseCache] = None):
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = HostRateLimiter(rates)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Optional stub_server.ResponseRecorder capturing responses for offline replay
+        self.recorder = recorder
+        self.cache = cache
+        self.stats = {"network": 0, "cache_fresh": 0, "not_modified": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self.stats[outcome] += 1
+
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        # Exponential backoff with jitter
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def get(self, url: str, params: Optional[dict] = None,
+            headers: Optional[dict] = None) -> requests.Response:
+        """GET with rate limiting and retries; raises FetchError when exhausted"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(url)
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                # Only the exception type: requests' messages embed the full query string
+                last_error = type(e).__name__
+                time.sleep(self._retry_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES:
+                last_error = FetchError(f"HTTP {response.status_code} from {url}")
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            if self.recorder is not None:
+                self.recorder.record(url, params, response)
+            return response
+        raise FetchError(f"Giving up on {url} after {self.max_retries + 1} attempts: {last_error}")
+
+    def get_json(self, url: str, params: Optional[dict] = None,
+                 headers: Optional[dict] = None) -> dict:
+        entry = self.cache.get(url, params) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            self._count("cache_fresh")
+            return entry["body"]
+
+        headers = dict(headers or {})
+        if entry is not None:
+            validators = entry.get("validators", {})
+            if "ETag" in validators:
+                headers["If-None-Match"] = validators["ETag"]
+            if "Last-Modified" in validators:
+                headers["If-Modified-Since"] = validators["Last-Modified"]
+
+        response = self.get(url, params=params, headers=headers or None)
+        if response.status_code == 304 and entry is not None:
+            self._count("not_modified")
+            self.cache.touch(url, params, entry)
+            return entry["body"]
+        if response.status_code >= 400:
+            # Not raise_for_status(): its message would include api keys from the query string
+            raise FetchError(f"HTTP {response.status_code} from {url}")
+        self._count("network")
+        body = response.json()
+        if self.cache is not None:
+            self.cache.put(url, params, body, response.headers)
+        return body
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> HttpClient:
+    """Process-wide client so separate fetch calls share one connection pool"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Concurrent Import Engine for SonicPalette
+Fetches references for many artists at once through one pooled, rate-limited
+HttpClient and streams the results into the knowledge store in batches, so an
+import of thousands of artists is bounded by the API rate limits rather
+than by sequential round trips.
+
+Imports are resumable: an ImportCheckpoint records which artists were
+written to the knowledge base, so a rerun skips them (unless they are older
+than `refresh_after`) and an interrupted job picks up where it stopped.
+"""
+
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import data_importer
+from http_client import FetchError, HttpClient
+from kb_store import KnowledgeStore, atomic_write_json
+from dedup import dedup_into_store
+
+Job = Tuple[str, str]  # (artist, style)
+
+
+@dataclass
+class ImportResult:
+    artist: str
+    style: str
+    references: List[Tuple[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class ImportCheckpoint:
+    """JSON file of completed jobs: {"artist\tstyle": completed_at}"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.completed: Dict[str, float] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.completed = json.load(f).get("completed", {})
+
+    @staticmethod
+    def key(artist: str, style: str) -> str:
+        return f"{artist}\t{style}"
+
+    def is_done(self, artist: str, style: str, refresh_after: Optional[float] = None) -> bool:
+        done_at = self.completed.get(self.key(artist, style))
+        if done_at is None:
+            return False
+        return refresh_after is None or time.time() - done_at < refresh_after
+
+    def mark_done(self, jobs: Iterable[Job]):
+        now = time.time()
+        for artist, style in jobs:
+            self.completed[self.key(artist, style)] = now
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.path, {"completed": self.completed})
+
+
+class ImportEngine:
+    """Bounded-concurrency fetcher for (artist, style) jobs"""
+
+    def __init__(self, client: HttpClient = None, max_workers: int = 8,
+                 lastfm_api_key: str = None,
+                 lastfm_url: str = data_importer.LASTFM_URL,
+                 musicbrainz_url: str = data_importer.MUSICBRAINZ_URL):
+        self.client = client or HttpClient(pool_size=max_workers)
+        self.max_workers = max_workers
+        self.lastfm_api_key = lastfm_api_key
+        self.lastfm_url = lastfm_url
+        self.musicbrainz_url = musicbrainz_url
+
+    def fetch_artist(self, artist: str, style: str) -> ImportResult:
+        """All references for one artist; errors are reported, not raised"""
+        result = ImportResult(artist, style)
+        try:
+            if self.lastfm_api_key:
+                data = self.client.get_json(
+                    self.lastfm_url, params=data_importer.lastfm_top_tracks_params(artist, self.lastfm_api_key))
+                result.references.extend(data_importer.parse_lastfm_top_tracks(artist, data))
+            data = self.client.get_json(
+                self.musicbrainz_url, params=data_importer.musicbrainz_release_params(artist))
+            for album in data_importer.parse_musicbrainz_releases(artist, data):
+                result.references.append((album, f"{style} album (MusicBrainz)"))
+        except (FetchError, ValueError) as e:
+            # ValueError covers undecodable JSON bodies
+            result.error = str(e)
+        return result
+
+    def run(self, jobs: Iterable[Job]) -> Iterator[ImportResult]:
+        """Yield results as they complete, keeping at most 2 * max_workers jobs in flight"""
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = set()
+
+            def submit_next() -> bool:
+                for artist, style in jobs:
+                    pending.add(pool.submit(self.fetch_artist, artist, style))
+                    return True
+                return False
+
+            for _ in range(self.max_workers * 2):
+                if not submit_next():
+                    break
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    yield future.result()
+                    submit_next()
+
+    def import_into_knowledge_base(self, jobs: Iterable[Job], batch_size: int = 50,
+                                   checkpoint: Optional[ImportCheckpoint] = None,
+                                   refresh_after: Optional[float] = None) -> Dict[str, int]:
+        """Stream results into the knowledge base, one store transaction per batch.
+        The JSON files are re-exported once, when the import ends.
+
+        With a checkpoint, jobs completed less than `refresh_after` seconds
+        ago (or ever, if None) are skipped, and each written batch is
+        recorded so an interrupted run resumes after the last batch.
+        """
+        summary = {"artists": 0, "added": 0, "failed": 0, "skipped": 0}
+        if checkpoint is not None:
+            pending_jobs = []
+            for artist, style in jobs:
+                if checkpoint.is_done(artist, style, refresh_after):
+                    summary["skipped"] += 1
+                else:
+                    pending_jobs.append((artist, style))
+            jobs = pending_jobs
+
+        batch: List[ImportResult] = []
+        store = KnowledgeStore(data_importer.DATA_DIR)
+
+        def flush():
+            summary["added"] += write_batch(batch, store)
+            if checkpoint is not None:
+                # Only after the write: a crash before it leaves the jobs pending
+                checkpoint.mark_done((r.artist, r.style) for r in batch)
+                checkpoint.save()
+            batch.clear()
+
+        with store:
+            for result in self.run(jobs):
+                summary["artists"] += 1
+                if result.error:
+                    summary["failed"] += 1
+                    print(f"Warning: {result.artist}: {result.error}")
+                    continue
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+        return summary
+
+
+def write_batch(results: List[ImportResult], store: Optional[KnowledgeStore] = None) -> int:
+    """Dedup and merge a batch of results in one transaction; returns how many were added.
+    Without a store, one is opened for the batch (and exports the JSON files when closed)."""
+    if store is None:
+        with KnowledgeStore(data_importer.DATA_DIR) as store:
+            return write_batch(results, store)
+    by_style: Dict[str, List[Tuple[str, str]]] = {}
+    for result in results:
+        by_style.setdefault(result.style, []).extend(result.references)
+    # Near-duplicates of known tracks become aliases instead of new entries
+    merged, _ = dedup_into_store(store, by_style, source="import_engine")
+    return merged.added
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Transactional storage for the SonicPalette knowledge base
+All data tools write through a SQLite database (WAL mode) next to the JSON
+files instead of loading and rewriting whole files for every addition:
+
+- writes happen in BEGIN IMMEDIATE transactions, so concurrent tools are
+  serialised by SQLite instead of losing each other's updates
+- every change is appended to the `changelog` table
+- a write only marks the JSON files it touched as dirty (in the database,
+  so other processes see it); flush() re-exports the dirty files atomically
+  (temp file + rename) so data_loader.py keeps reading the usual layout.
+  Closing a store flushes, so a tool rewrites each file once at the end
+  instead of once per addition
+- JSON files edited by hand are detected (size/mtime fingerprint) and
+  re-imported before the next write, so direct edits are never clobbered
+
+The database is rebuilt from the JSON files when missing, and the JSON
+files stay the source of truth in git; it only holds writes that are not
+exported yet.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+DB_FILENAME = "knowledge.sqlite3"
+KB_FILES = ("styles.json", "emotions.json", "references.json", "emotion_to_styles.json",
+            "reference_aliases.json")
+_TABLES = {"styles.json": "styles", "emotions.json": "emotions", "references.json": "refs",
+           "emotion_to_styles.json": "emotion_styles", "reference_aliases.json": "aliases"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS styles (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emotions (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emotion_styles (
+    emotion TEXT NOT NULL,
+    style TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (emotion, style)
+);
+CREATE TABLE IF NOT EXISTS refs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    style TEXT NOT NULL,
+    title TEXT NOT NULL,
+    note TEXT NOT NULL,
+    UNIQUE (style, title)
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    style TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    PRIMARY KEY (style, alias)
+);
+CREATE TABLE IF NOT EXISTS changelog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    op TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def atomic_write_json(path, data, indent=None):
+    """Write JSON to a temp file and rename it over `path` (no torn files)"""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _fingerprint(path: Path) -> str:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return "missing"
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+class KnowledgeStore:
+    """SQLite-backed knowledge base that mirrors itself to the JSON layout"""
+
+    def __init__(self, data_dir, db_path=None):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path) if db_path else self.data_dir / DB_FILENAME
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._source = "unknown"
+        self._touched = set()
+        self._in_transaction = False
+
+    def close(self):
+        """Export the dirty JSON files and close the database"""
+        try:
+            if self.dirty():
+                self.flush()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # -----------------------------
+    # Transactions
+    # -----------------------------
+
+    @contextmanager
+    def transaction(self, source: str = "unknown"):
+        """One atomic write: changes, change log and dirty marks commit together"""
+        with self._lock:
+            if self._in_transaction:
+                # Nested use joins the outer transaction
+                yield self
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+            self._source = source
+            self._touched = set()
+            try:
+                self._sync_from_json()
+                yield self
+                self.conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, '1')",
+                                      [(f"dirty:{filename}",) for filename in self._touched])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._in_transaction = False
+
+    def _log(self, op: str, kind: str, key: str, payload=None):
+        self.conn.execute(
+            "INSERT INTO changelog (ts, source, op, kind, key, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (time.time(), self._source, op, kind, key,
+             None if payload is None else json.dumps(payload, ensure_ascii=False)),
+        )
+
+    def _require_transaction(self):
+        if not self._in_transaction:
+            raise RuntimeError("KnowledgeStore writes must happen inside store.transaction()")
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+
+    def _upsert_named(self, table: str, kind: str, filename: str, name: str, info: dict) -> bool:
+        before = self.conn.total_changes
+        self.conn.execute(
+            f"INSERT INTO {table} (name, data) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET data = excluded.data WHERE data != excluded.data",
+            (name, json.dumps(info, ensure_ascii=False)),
+        )
+        if self.conn.total_changes == before:
+            return False
+        self._log("upsert", kind, name, info)
+        self._touched.add(filename)
+        return True
+
+    def upsert_style(self, name: str, info: dict) -> bool:
+        """Add or replace a style; returns False if it was already identical"""
+        self._require_transaction()
+        return self._upsert_named("styles", "style", "styles.json", name, info)
+
+    def upsert_emotion(self, name: str, info: dict) -> bool:
+        """Add or replace an emotion; returns False if it was already identical"""
+        self._require_transaction()
+        return self._upsert_named("emotions", "emotion", "emotions.json", name, info)
+
+    def set_emotion_styles(self, emotion: str, weights: Dict[str, float]) -> int:
+        """Add or update style weights for an emotion; returns rows changed"""
+        self._require_transaction()
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT INTO emotion_styles (emotion, style, weight) VALUES (?, ?, ?) "
+            "ON CONFLICT(emotion, style) DO UPDATE SET weight = excluded.weight "
+            "WHERE weight != excluded.weight",
+            [(emotion, style, float(w)) for style, w in weights.items()],
+        )
+        changed = self.conn.total_changes - before
+        if changed:
+            self._log("upsert", "emotion_styles", emotion, weights)
+            self._touched.add("emotion_to_styles.json")
+        return changed
+
+    def add_references(self, style: str, refs: Iterable[Sequence[str]],
+                       update_notes: bool = False) -> int:
+        """Insert (title, note) pairs for a style; existing titles are kept
+        (or get their note replaced with update_notes). Returns rows changed."""
+        self._require_transaction()
+        rows = [(style, ref[0], ref[1]) for ref in refs]
+        if not rows:
+            return 0
+        conflict = ("DO UPDATE SET note = excluded.note WHERE note != excluded.note"
+                    if update_notes else "DO NOTHING")
+        before = self.conn.total_changes
+        self.conn.executemany(
+            f"INSERT INTO refs (style, title, note) VALUES (?, ?, ?) ON CONFLICT(style, title) {conflict}",
+            rows,
+        )
+        changed = self.conn.total_changes - before
+        if changed:
+            # One log entry per batch keeps bulk imports fast
+            self._log("add", "references", style, [[t, n] for _, t, n in rows])
+            self._touched.add("references.json")
+        return changed
+
+    def remove_references(self, style: str, titles: Iterable[str]) -> int:
+        """Delete references of a style by exact title; returns rows removed"""
+        self._require_transaction()
+        titles = list(titles)
+        before = self.conn.total_changes
+        self.conn.executemany("DELETE FROM refs WHERE style = ? AND title = ?",
+                              [(style, title) for title in titles])
+        removed = self.conn.total_changes - before
+        if removed:
+            self._log("remove", "references", style, titles)
+            self._touched.add("references.json")
+        return removed
+
+    def set_aliases(self, style: str, aliases: Dict[str, str]) -> int:
+        """Record alternative titles of canonical references: {alias: canonical}"""
+        self._require_transaction()
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT INTO aliases (style, alias, canonical) VALUES (?, ?, ?) "
+            "ON CONFLICT(style, alias) DO UPDATE SET canonical = excluded.canonical "
+            "WHERE canonical != excluded.canonical",
+            [(style, alias, canonical) for alias, canonical in aliases.items()],
+        )
+        changed = self.conn.total_changes - before
+        if changed:
+            self._log("upsert", "aliases", style, aliases)
+            self._touched.add("reference_aliases.json")
+        return changed
+
+    def import_document(self, filename: str, data: dict) -> None:
+        """Upsert every entry of a document in the JSON layout (never deletes)"""
+        self._require_transaction()
+        if filename == "styles.json":
+            for name, info in data.items():
+                self.upsert_style(name, info)
+        elif filename == "emotions.json":
+            for name, info in data.items():
+                self.upsert_emotion(name, info)
+        elif filename == "emotion_to_styles.json":
+            for emotion, weights in data.items():
+                self.set_emotion_styles(emotion, weights)
+        elif filename == "references.json":
+            for style, refs in data.items():
+                self.add_references(style, refs, update_notes=True)
+        elif filename == "reference_aliases.json":
+            for style, aliases in data.items():
+                self.set_aliases(style, aliases)
+        else:
+            raise ValueError(f"Unknown knowledge base file: {filename}")
+
+    # -----------------------------
+    # JSON mirror
+    # -----------------------------
+
+    def _replace_from_json(self, filename: str):
+        """Make the tables of one file match the file exactly"""
+        path = self.data_dir / filename
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.conn.execute(f"DELETE FROM {_TABLES[filename]}")
+        self.import_document(filename, data)
+        self._log("reload", "file", filename)
+
+    def _merge_from_json(self, filename: str):
+        path = self.data_dir / filename
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.import_document(filename, json.load(f))
+            self._log("merge", "file", filename)
+
+    def _sync_from_json(self):
+        """Pick up JSON files changed outside the store (hand edits, git pull)"""
+        dirty = set(self.dirty())
+        for filename in KB_FILES:
+            current = _fingerprint(self.data_dir / filename)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (f"fp:{filename}",)).fetchone()
+            if row is None or row[0] != current:
+                if filename in dirty:
+                    # Writes not exported yet: merge the file instead of replacing them
+                    warnings.warn(f"{filename} was edited with unexported changes pending; "
+                                  "merging it (entries removed by hand are kept)")
+                    self._merge_from_json(filename)
+                else:
+                    self._replace_from_json(filename)
+                self._set_fingerprint(filename)
+        # Reloads alone don't need an export
+        self._touched = set()
+
+    def _set_fingerprint(self, filename: str):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (f"fp:{filename}", _fingerprint(self.data_dir / filename)),
+        )
+
+    def document(self, filename: str) -> dict:
+        """The current content of one file in the JSON layout"""
+        if filename == "styles.json":
+            rows = self.conn.execute("SELECT name, data FROM styles ORDER BY rowid")
+            return {name: json.loads(data) for name, data in rows}
+        if filename == "emotions.json":
+            rows = self.conn.execute("SELECT name, data FROM emotions ORDER BY rowid")
+            return {name: json.loads(data) for name, data in rows}
+        if filename == "emotion_to_styles.json":
+            out: Dict[str, Dict[str, float]] = {}
+            for emotion, style, weight in self.conn.execute(
+                    "SELECT emotion, style, weight FROM emotion_styles ORDER BY rowid"):
+                out.setdefault(emotion, {})[style] = weight
+            return out
+        if filename == "references.json":
+            out_refs: Dict[str, List[List[str]]] = {}
+            for style, title, note in self.conn.execute("SELECT style, title, note FROM refs ORDER BY id"):
+                out_refs.setdefault(style, []).append([title, note])
+            return out_refs
+        if filename == "reference_aliases.json":
+            out_aliases: Dict[str, Dict[str, str]] = {}
+            for style, alias, canonical in self.conn.execute(
+                    "SELECT style, alias, canonical FROM aliases ORDER BY rowid"):
+                out_aliases.setdefault(style, {})[alias] = canonical
+            return out_aliases
+        raise ValueError(f"Unknown knowledge base file: {filename}")
+
+    def _export(self, filenames: Iterable[str]):
+        for filename in filenames:
+            atomic_write_json(self.data_dir / filename, self.document(filename), indent=4)
+            self._set_fingerprint(filename)
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (f"dirty:{filename}",))
+
+    def dirty(self) -> List[str]:
+        """JSON files with changes (from any process) not exported yet"""
+        rows = self.conn.execute("SELECT key FROM meta WHERE key LIKE 'dirty:%' ORDER BY key")
+        return [key[len("dirty:"):] for key, in rows]
+
+    def flush(self) -> List[str]:
+        """Re-export the dirty JSON files; returns their names"""
+        with self.transaction("export"):
+            filenames = self.dirty()
+            self._export(filenames)
+        return filenames
+
+    def export_json(self, out_dir=None, filenames: Iterable[str] = KB_FILES):
+        """Write the current content to out_dir (default: the data directory)"""
+        if out_dir is None:
+            with self.transaction("export"):
+                self._export(filenames)
+            return
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for filename in filenames:
+                atomic_write_json(out_dir / filename, self.document(filename), indent=4)
+
+    def changes(self, since_id: int = 0) -> List[Tuple]:
+        """Change log entries after `since_id`: (id, ts, source, op, kind, key)"""
+        return self.conn.execute(
+            "SELECT id, ts, source, op, kind, key FROM changelog WHERE id > ? ORDER BY id", (since_id,)
+        ).fetchall()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or export the SonicPalette knowledge store")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).parent / "data")
+    parser.add_argument("--export", type=Path, metavar="DIR", help="Export the JSON layout to DIR")
+    parser.add_argument("--log", type=int, metavar="N", help="Show the last N change log entries")
+    args = parser.parse_args()
+
+    with KnowledgeStore(args.data_dir) as store:
+        with store.transaction("kb_store"):
+            pass  # syncs the database with the JSON files
+        flushed = store.flush()
+        if flushed:
+            print(f"✓ Exported pending changes to {', '.join(flushed)}")
+        if args.export:
+            store.export_json(args.export)
+            print(f"✓ Exported knowledge base to {args.export}")
+        if args.log:
+            for entry_id, ts, source, op, kind, key in store.changes()[-args.log:]:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+                print(f"{entry_id:6d} {stamp} {source:12s} {op:7s} {kind:15s} {key}")
+
+
+if __name__ == "__main__":
+    main()
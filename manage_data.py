@@ -2,12 +2,19 @@
 """
 Data Management Tool for SonicPalette
 Use this script to easily add, modify, and view data entries
+
+The add_* functions take an optional open KnowledgeStore: pass one when
+adding many entries so the JSON files are re-exported once, when the store
+is closed, instead of after every addition.
 """
 
 import json
 import sys
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from kb_store import KnowledgeStore
 
 DATA_DIR = Path("data")
 
@@ -24,37 +31,42 @@ def load_data(file: str) -> Dict:
         print(f"Error loading {file}: {e}")
         return {}
 
-def save_data(file: str, data: Dict):
-    """Save data to JSON file"""
-    filepath = DATA_DIR / file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-    print(f"✓ Saved to {filepath}")
+@contextmanager
+def _transaction(store: Optional[KnowledgeStore] = None):
+    """A write transaction on `store`, or on a store of DATA_DIR that
+    exports the JSON files when it is closed afterwards"""
+    if store is not None:
+        with store.transaction("manage_data"):
+            yield store
+        return
+    with KnowledgeStore(DATA_DIR) as own, own.transaction("manage_data"):
+        yield own
+
+def save_data(file: str, data: Dict, store: Optional[KnowledgeStore] = None):
+    """Upsert the entries of a JSON document through the knowledge store"""
+    with _transaction(store) as store:
+        store.import_document(file, data)
+    print(f"✓ Saved to {DATA_DIR / file}")
 
-def add_emotion(name: str, keywords: list, description: str):
+def add_emotion(name: str, keywords: list, description: str, store: Optional[KnowledgeStore] = None):
     """Add a new emotion"""
-    data = load_data("emotions.json")
-    data[name] = {
-        "keywords": keywords,
-        "description": description
-    }
-    save_data("emotions.json", data)
+    with _transaction(store) as store:
+        store.upsert_emotion(name, {
+            "keywords": keywords,
+            "description": description
+        })
     print(f"✓ Added emotion: {name}")
 
-def add_style(name: str, config: Dict):
+def add_style(name: str, config: Dict, store: Optional[KnowledgeStore] = None):
     """Add a new musical style"""
-    data = load_data("styles.json")
-    data[name] = config
-    save_data("styles.json", data)
+    with _transaction(store) as store:
+        store.upsert_style(name, config)
     print(f"✓ Added style: {name}")
 
-def add_reference(style: str, artist: str, title: str, note: str):
+def add_reference(style: str, artist: str, title: str, note: str, store: Optional[KnowledgeStore] = None):
     """Add a reference track"""
-    data = load_data("references.json")
-    if style not in data:
-        data[style] = []
-    data[style].append([f"{artist} - {title}", note])
-    save_data("references.json", data)
+    with _transaction(store) as store:
+        store.add_references(style, [(f"{artist} - {title}", note)])
     print(f"✓ Added reference: {artist} - {title}")
 
 def list_emotions():
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Memory report: dict layout vs records (records.py)
+Generates a synthetic catalog (scale_generator.py), loads it the way
+data_loader does - once as the former dicts of dicts of lists, once as
+Style/Chord/Reference records - and reports the memory each keeps alive,
+measured with tracemalloc.
+
+Usage:
+    python memory_report.py
+    python memory_report.py --styles 10000 --references 100000
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from data_loader import _convert_references, _convert_styles
+from records import freeze_references, freeze_styles
+from scale_generator import generate_references, generate_styles
+
+
+def retained(build: Callable[[], object]) -> Tuple[int, object]:
+    """Bytes still allocated after build() returns (temporaries collected)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def measure(n_styles: int, n_references: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    styles = generate_styles(n_styles, rng)
+    # Round-trip through JSON text: loaded strings aren't shared like the generator's
+    styles_text = json.dumps(styles, ensure_ascii=False)
+    references_text = json.dumps(generate_references(n_references, styles, rng), ensure_ascii=False)
+
+    rows = []
+    for layout, load_styles, load_references in [
+        ("dicts", lambda: _convert_styles(json.loads(styles_text)),
+         lambda: _convert_references(json.loads(references_text))),
+        ("records", lambda: freeze_styles(_convert_styles(json.loads(styles_text))),
+         lambda: freeze_references(json.loads(references_text))),
+    ]:
+        style_bytes, style_db = retained(load_styles)
+        reference_bytes, reference_db = retained(load_references)
+        rows.append({
+            "layout": layout,
+            "styles_mb": style_bytes / 2**20,
+            "bytes_per_style": style_bytes / len(style_db),
+            "references_mb": reference_bytes / 2**20,
+            "bytes_per_reference": reference_bytes / sum(len(refs) for refs in reference_db.values()),
+        })
+        del style_db, reference_db
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory of the dict and record layouts")
+    parser.add_argument("--styles", type=int, default=10000)
+    parser.add_argument("--references", type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = measure(args.styles, args.references)
+    print(f"{args.styles} styles, {args.references} references\n")
+    print("| layout | styles MB | bytes/style | references MB | bytes/reference |")
+    print("|---|---|---|---|---|")
+    for row in rows:
+        print(f"| {row['layout']} | {row['styles_mb']:.1f} | {row['bytes_per_style']:.0f} | "
+              f"{row['references_mb']:.1f} | {row['bytes_per_reference']:.0f} |")
+
+
+if __name__ == "__main__":
+    main()
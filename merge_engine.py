@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Set-based merge engine for reference and style imports
+Builds hash indexes on normalized keys so merging a batch of m entries into
+a catalog of n is O(n + m) instead of a list scan per entry, and applies
+each batch to the knowledge store in a single transaction.
+
+References are keyed by style and normalized (artist, title), so
+"Daft Punk - One More Time" and "daft punk – one more time " are the same
+track. Styles are keyed by case-folded name.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from kb_store import KnowledgeStore
+
+_DASHES = re.compile(r"\s+[-–—]\s+")
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+@dataclass
+class MergeResult:
+    added: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def __iadd__(self, other: "MergeResult") -> "MergeResult":
+        self.added += other.added
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+    def __str__(self):
+        return f"{self.added} added, {self.updated} updated, {self.skipped} skipped"
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACES.sub(" ", _PUNCT.sub("", text)).strip()
+
+
+def reference_key(title: str) -> Tuple[str, str]:
+    """Normalized (artist, title) of an "Artist - Title" reference"""
+    parts = _DASHES.split(title.strip(), maxsplit=1)
+    if len(parts) == 1:
+        return "", _normalize(parts[0])
+    return _normalize(parts[0]), _normalize(parts[1])
+
+
+class ReferenceIndex:
+    """style -> {normalized key: [title, note]} over a references document"""
+
+    def __init__(self, data: Dict[str, Sequence[Sequence[str]]]):
+        self.by_style: Dict[str, Dict[Tuple[str, str], list]] = {}
+        for style, refs in data.items():
+            index = self.by_style.setdefault(style, {})
+            for ref in refs:
+                index.setdefault(reference_key(ref[0]), ref)
+
+    def diff(self, incoming: Dict[str, Iterable[Sequence[str]]], update_notes: bool = False):
+        """Split incoming references into new rows and note updates.
+
+        Returns (added, updated, result) with added/updated as
+        {style: [(title, note)]}; the index is updated as it goes, so
+        duplicates inside the batch are only added once.
+        """
+        added: Dict[str, List[Tuple[str, str]]] = {}
+        updated: Dict[str, List[Tuple[str, str]]] = {}
+        result = MergeResult()
+        for style, refs in incoming.items():
+            index = self.by_style.setdefault(style, {})
+            for title, note in refs:
+                key = reference_key(title)
+                existing = index.get(key)
+                if existing is None:
+                    index[key] = [title, note]
+                    added.setdefault(style, []).append((title, note))
+                    result.added += 1
+                elif update_notes and note and existing[1] != note:
+                    existing[1] = note
+                    updated.setdefault(style, []).append((existing[0], note))
+                    result.updated += 1
+                else:
+                    result.skipped += 1
+        return added, updated, result
+
+
+def merge_references(data: Dict[str, list], incoming: Dict[str, Iterable[Sequence[str]]],
+                     update_notes: bool = False) -> MergeResult:
+    """Merge incoming references into a references document in place"""
+    added, updated, result = ReferenceIndex(data).diff(incoming, update_notes)
+    for style, refs in added.items():
+        data.setdefault(style, []).extend([title, note] for title, note in refs)
+    if updated:
+        notes = {(style, title): note for style, refs in updated.items() for title, note in refs}
+        for style in updated:
+            for ref in data[style]:
+                ref[1] = notes.get((style, ref[0]), ref[1])
+    return result
+
+
+def merge_references_into_store(store: KnowledgeStore, incoming: Dict[str, Iterable[Sequence[str]]],
+                                update_notes: bool = False, source: str = "merge") -> MergeResult:
+    """Merge a batch into the knowledge store in one transaction"""
+    with store.transaction(source):
+        index = ReferenceIndex(store.document("references.json"))
+        added, updated, result = index.diff(incoming, update_notes)
+        for style, refs in added.items():
+            store.add_references(style, refs)
+        for style, refs in updated.items():
+            store.add_references(style, refs, update_notes=True)
+    return result
+
+
+def merge_styles_into_store(store: KnowledgeStore, incoming: Dict[str, dict],
+                            update_existing: bool = False, source: str = "merge") -> MergeResult:
+    """Add styles whose case-folded name is new; optionally replace existing ones"""
+    result = MergeResult()
+    with store.transaction(source):
+        existing = {_normalize(name): name for name in store.document("styles.json")}
+        for name, info in incoming.items():
+            key = _normalize(name)
+            if key not in existing:
+                store.upsert_style(name, info)
+                existing[key] = name
+                result.added += 1
+            elif update_existing and store.upsert_style(existing[key], info):
+                result.updated += 1
+            else:
+                result.skipped += 1
+    return result
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+CPU inference runtime settings for the embedding model
+Several app processes on one host each default to one torch thread per
+core and oversubscribe the CPU. RuntimeConfig holds the settings that
+matter - torch intra-/inter-op threads, inference mode, encode batch size
+and maximum sequence length - and is applied once, when the model loads.
+
+Settings come from <data dir>/runtime.json (or the file named by
+SONICPALETTE_RUNTIME_CONFIG), overridden by environment variables:
+
+    SONICPALETTE_TORCH_THREADS          intra-op threads
+    SONICPALETTE_TORCH_INTEROP_THREADS  inter-op threads
+    SONICPALETTE_INFERENCE_MODE         on/off (torch.inference_mode around encode)
+    SONICPALETTE_ENCODE_BATCH_SIZE      texts per forward pass
+    SONICPALETTE_MAX_SEQ_LENGTH         truncate inputs to this many tokens
+
+bench_runtime.py measures throughput and latency for thread/worker combinations.
+"""
+
+import json
+import os
+import sys
+import warnings
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Optional
+
+ENV_VARS = {
+    "intra_op_threads": "SONICPALETTE_TORCH_THREADS",
+    "inter_op_threads": "SONICPALETTE_TORCH_INTEROP_THREADS",
+    "inference_mode": "SONICPALETTE_INFERENCE_MODE",
+    "batch_size": "SONICPALETTE_ENCODE_BATCH_SIZE",
+    "max_seq_length": "SONICPALETTE_MAX_SEQ_LENGTH",
+}
+
+
+@dataclass
+class RuntimeConfig:
+    intra_op_threads: Optional[int] = None  # None = torch default (one per core)
+    inter_op_threads: Optional[int] = None
+    inference_mode: bool = True
+    batch_size: int = 32
+    max_seq_length: Optional[int] = None  # None = the model's own limit
+
+    def apply_to_torch(self):
+        """Set torch's thread pools (no-op when torch isn't imported)"""
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        if self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+        if self.inter_op_threads and torch.get_num_interop_threads() != self.inter_op_threads:
+            try:
+                torch.set_num_interop_threads(self.inter_op_threads)
+            except RuntimeError as e:
+                # Only allowed once, before any inter-op parallel work
+                warnings.warn(f"Could not set inter-op threads ({e})")
+
+    def configure(self, model):
+        """Apply the runtime settings to a freshly loaded model"""
+        self.apply_to_torch()
+        if self.max_seq_length:
+            model.max_seq_length = self.max_seq_length
+        return model
+
+    def inference(self):
+        """Context for encode calls: torch.inference_mode when enabled"""
+        torch = sys.modules.get("torch")
+        if self.inference_mode and torch is not None:
+            return torch.inference_mode()
+        return nullcontext()
+
+    def encode(self, model, texts):
+        with self.inference():
+            return model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+
+
+def _parse(name: str, value):
+    if name == "inference_mode":
+        if isinstance(value, str):
+            return value.strip().lower() not in ("0", "off", "false", "no")
+        return bool(value)
+    if value is None or (isinstance(value, str) and value.strip().lower() in ("", "none", "auto")):
+        return None
+    return int(value)
+
+
+def load_runtime_config(data_dir: Optional[Path] = None) -> RuntimeConfig:
+    """Defaults, then the JSON config file, then environment variables"""
+    path = os.environ.get("SONICPALETTE_RUNTIME_CONFIG")
+    if path is None and data_dir is not None:
+        path = Path(data_dir) / "runtime.json"
+    values = {}
+    if path is not None and Path(path).exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            values.update(json.load(f))
+    for name, var in ENV_VARS.items():
+        if var in os.environ:
+            values[name] = os.environ[var]
+
+    known = {f.name for f in fields(RuntimeConfig)}
+    unknown = set(values) - known
+    if unknown:
+        warnings.warn(f"Ignoring unknown runtime settings: {', '.join(sorted(unknown))}")
+    config = RuntimeConfig(**{k: _parse(k, v) for k, v in values.items() if k in known})
+    if config.batch_size is None or config.batch_size < 1:
+        config.batch_size = RuntimeConfig.batch_size
+    return config
+
+
+if __name__ == "__main__":
+    from data_loader import DATA_DIR
+    print(json.dumps(asdict(load_runtime_config(DATA_DIR)), indent=4))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Lifecycle of the sentence-transformers model
+ModelManager loads the model on first use (synchronously, or in the
+background with load_async), and with an idle timeout releases it after a
+period without ML requests so a mostly idle instance doesn't keep hundreds
+of MB of torch weights resident. The next request reloads it.
+
+The model is never released while an encode is running: callers hold it
+with `with manager.use() as model:`.
+
+Metrics: model_resident (1/0), model_load_seconds, model_reload_seconds,
+model_loads_total{kind=initial|reload} and model_unloads_total.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from tracing import incr, record_cache, set_gauge, span
+
+
+def idle_timeout_from_env() -> Optional[float]:
+    """SONICPALETTE_MODEL_IDLE_TIMEOUT in seconds; unset or 0 keeps the model loaded"""
+    value = os.environ.get("SONICPALETTE_MODEL_IDLE_TIMEOUT", "").strip()
+    return float(value) if value and float(value) > 0 else None
+
+
+def release_memory():
+    """Give freed weights back to the OS where the allocator allows it"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class ModelManager:
+    """Loads a model on demand and unloads it after `idle_timeout` seconds unused"""
+
+    def __init__(self, loader: Callable[[], Any], idle_timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.loader = loader
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._model = None
+        self._loading = False
+        self._active = 0
+        self._last_used = clock()
+        self._loads = 0
+        self._reaper: Optional[threading.Thread] = None
+
+    def is_loaded(self) -> bool:
+        with self._cond:
+            return self._model is not None
+
+    def _load(self):
+        """Run the loader; the caller has set _loading"""
+        model = None
+        start = time.perf_counter()
+        try:
+            with span("model_load"):
+                model = self.loader()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._model = model
+                self._loading = False
+                self._last_used = self.clock()
+                kind = "reload" if self._loads else "initial"
+                if model is not None:
+                    self._loads += 1
+                self._cond.notify_all()
+        if model is not None:
+            set_gauge("model_resident", 1)
+            set_gauge("model_load_seconds", elapsed)
+            if kind == "reload":
+                set_gauge("model_reload_seconds", elapsed)
+            incr("model_loads_total", kind=kind)
+            self._start_reaper()
+
+    def get(self):
+        """The model, loading it first if needed (None if the loader gave up)"""
+        with self._cond:
+            hit = self._model is not None
+            while self._loading:
+                self._cond.wait()
+            must_load = self._model is None
+            if must_load:
+                self._loading = True
+        record_cache("ml_model", hit=hit)
+        if must_load:
+            self._load()
+        with self._cond:
+            self._last_used = self.clock()
+            return self._model
+
+    @contextmanager
+    def use(self):
+        """Hold the model for one request; it is not unloaded meanwhile"""
+        with self._cond:
+            self._active += 1
+        try:
+            yield self.get()
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._last_used = self.clock()
+
+    def load_async(self):
+        """Start loading in the background unless loaded or already loading"""
+        with self._cond:
+            if self._model is not None or self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, name="model-load", daemon=True).start()
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Start loading if needed and wait up to `timeout` seconds for the
+        model; True once it is loaded"""
+        self.load_async()
+        with self._cond:
+            self._cond.wait_for(lambda: not self._loading, timeout)
+            return self._model is not None
+
+    def unload_if_idle(self) -> bool:
+        """Release the model when it has been unused for idle_timeout seconds"""
+        with self._cond:
+            if (self.idle_timeout is None or self._model is None or self._active
+                    or self.clock() - self._last_used < self.idle_timeout):
+                return False
+            self._model = None
+        release_memory()
+        set_gauge("model_resident", 0)
+        incr("model_unloads_total")
+        return True
+
+    def _start_reaper(self):
+        if self.idle_timeout is None:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        interval = min(max(self.idle_timeout / 4, 0.01), 30.0)
+        while True:
+            time.sleep(interval)
+            self.unload_if_idle()
+            with self._cond:
+                if self._model is None:
+                    self._reaper = None  # the next load starts a new one
+                    return
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Multi-vector representations of styles and emotions
+Each style or emotion is embedded as several texts - its name, its
+description and each of its keywords - instead of one string built from
+the first few keywords. All vectors live in one flat matrix; `offsets`
+marks where each entry's rows start, so scoring a query is one matrix
+product followed by a vectorized per-segment max (or mean):
+
+    sims = matrix @ query
+    scores = np.maximum.reduceat(sims, offsets[:-1])
+
+The matrix is built once per knowledge base, so richer representations
+add no encoding cost per request.
+
+SONICPALETTE_SEGMENT_REDUCE=mean switches from max-sim to the mean.
+"""
+
+import os
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+REDUCTIONS = ("max", "mean")
+DEFAULT_REDUCE = os.environ.get("SONICPALETTE_SEGMENT_REDUCE", "max")
+
+
+def style_texts(style: str, meta: Mapping) -> List[str]:
+    """Name, description and every keyword of a style"""
+    return _unique([f"{style} music", meta.get("description", ""), *meta.get("keywords", [])])
+
+
+def emotion_texts(emotion: str, keywords: Sequence[str], description: Optional[str] = None) -> List[str]:
+    """Name, description and every keyword of an emotion"""
+    return _unique([f"{emotion} music", description or "", *keywords])
+
+
+def _unique(texts: Sequence[str]) -> List[str]:
+    return list(dict.fromkeys(t.strip() for t in texts if t and t.strip()))
+
+
+def ranges_to_indices(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + count) for each range, vectorized"""
+    block_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(counts.sum()) - block_starts
+
+
+class SegmentedMatrix:
+    """Unit vectors of several entries stacked in one matrix; rows
+    offsets[i]:offsets[i+1] belong to names[i]"""
+
+    def __init__(self, names: List[str], matrix: np.ndarray, offsets: np.ndarray):
+        self.names = names
+        self.matrix = matrix
+        self.offsets = offsets
+        self.index = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def build(cls, segments: Dict[str, List[str]],
+              encode: Callable[[List[str]], Optional[np.ndarray]]) -> Optional["SegmentedMatrix"]:
+        """Encode every text of every segment in one batch (None if encode gives up)"""
+        names = [name for name, texts in segments.items() if texts]
+        texts = [text for name in names for text in segments[name]]
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(segments[name]) for name in names], out=offsets[1:])
+        if not texts:
+            return cls(names, np.zeros((0, 0), dtype=np.float32), offsets)
+        matrix = encode(texts)
+        if matrix is None:
+            return None
+        return cls(names, np.ascontiguousarray(matrix, dtype=np.float32), offsets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def centroids(self, subset: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unit-length mean vector of each entry (or of the entries in `subset`)"""
+        subset = np.arange(len(self.names)) if subset is None else np.asarray(subset, dtype=np.int64)
+        counts = self.offsets[subset + 1] - self.offsets[subset]
+        rows = self.matrix[ranges_to_indices(self.offsets[subset], counts)]
+        sums = np.add.reduceat(rows, np.cumsum(counts) - counts, axis=0) if len(rows) else rows
+        return sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+    def scores(self, query: np.ndarray, reduce: Optional[str] = None,
+               subset: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-entry similarity to `query` (D,) or to each row of `query` (Q, D)
+        -> (N,) or (Q, N). With `subset` (entry indices) only those entries
+        are scored, in that order."""
+        reduce = reduce or DEFAULT_REDUCE
+        if reduce not in REDUCTIONS:
+            raise ValueError(f"reduce must be one of {REDUCTIONS}, got {reduce!r}")
+        n = len(self.names) if subset is None else len(subset)
+        if n == 0:
+            return np.zeros(query.shape[:-1] + (0,), dtype=np.float32)
+        if subset is None:
+            matrix, counts = self.matrix, np.diff(self.offsets)
+        else:
+            # Gather the rows of the selected segments into a contiguous block
+            subset = np.asarray(subset, dtype=np.int64)
+            counts = self.offsets[subset + 1] - self.offsets[subset]
+            matrix = self.matrix[ranges_to_indices(self.offsets[subset], counts)]
+        sims = matrix @ query.T  # (V,) or (V, Q)
+        starts = np.cumsum(counts) - counts
+        if reduce == "max":
+            reduced = np.maximum.reduceat(sims, starts, axis=0)
+        else:
+            reduced = np.add.reduceat(sims, starts, axis=0) / counts.reshape((-1,) + (1,) * (sims.ndim - 1))
+        return reduced.T
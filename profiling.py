@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+On-demand profiling for SonicPalette
+Wraps N requests in cProfile and tracemalloc and writes, into one directory:
+
+    profile.pstats     - raw cProfile data (python -m pstats, snakeviz, ...)
+    profile.txt        - top functions by cumulative time
+    profile.collapsed  - collapsed stacks for flamegraph.pl / speedscope
+    allocations.txt    - top allocations by source line
+
+Used by `python app.py --profile DIR` / `--batch FILE --profile DIR` and by
+the Gradio server when SONICPALETTE_PROFILE=DIR is set
+(SONICPALETTE_PROFILE_REQUESTS controls how many requests are captured).
+
+cProfile follows one thread. Work a profiled request hands to a worker
+thread with its context (deadline.BoundedExecutor) is wrapped in
+run_profiled(), which profiles it in that thread and adds it to the report.
+"""
+
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_PROFILE_REQUESTS = 20
+
+# (profiler, thread id) of the request being profiled in this context
+_current: "contextvars.ContextVar[Optional[Tuple[RequestProfiler, int]]]" = \
+    contextvars.ContextVar("sonicpalette_profiler", default=None)
+
+# Allocations made by the profiler itself are not interesting
+_ALLOCATION_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def _frame_label(func) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        # Built-ins are reported as ('~', 0, '<built-in method ...>')
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    # ';' separates frames in the collapsed format
+    return label.replace(";", ":")
+
+
+def collapsed_stacks(stats: pstats.Stats, min_us: float = 1.0, max_depth: int = 64) -> List[str]:
+    """Rebuild collapsed stacks ("a;b;c <microseconds>") from cProfile data.
+
+    cProfile only records caller -> callee edges, so time along a path is
+    estimated by splitting each function's time across its callers in
+    proportion to the cumulative time of each edge.
+    """
+    raw = stats.stats
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller in callers:
+            callees[caller].append(func)
+
+    totals: Dict[str, float] = defaultdict(float)
+
+    def walk(func, path, on_stack, fraction):
+        tottime = raw[func][2]
+        path = path + [_frame_label(func)]
+        own_us = tottime * fraction * 1e6
+        if own_us > 0:
+            totals[";".join(path)] += own_us
+        if len(path) >= max_depth:
+            return
+        on_stack.add(func)
+        for child in callees[func]:
+            if child in on_stack:
+                continue
+            child_cum = raw[child][3]
+            edge_cum = raw[child][4][func][3]
+            if child_cum <= 0:
+                continue
+            child_fraction = fraction * edge_cum / child_cum
+            if child_cum * child_fraction * 1e6 < min_us:
+                continue
+            walk(child, path, on_stack, child_fraction)
+        on_stack.discard(func)
+
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(func, [], set(), 1.0)
+
+    return [f"{stack} {int(round(us))}" for stack, us in totals.items() if us >= min_us]
+
+
+class RequestProfiler:
+    """Profile the next `n_requests` requests and write reports to `out_dir`.
+
+    Profiled requests are serialised with a lock: cProfile can only follow
+    one thread at a time.
+    """
+
+    def __init__(self, out_dir, n_requests: Optional[int] = DEFAULT_PROFILE_REQUESTS,
+                 top_allocations: int = 30):
+        self.out_dir = Path(out_dir)
+        self.n_requests = n_requests
+        self.top_allocations = top_allocations
+        self.profiled = 0
+        self.finished = False
+        self._profile = cProfile.Profile()
+        self._worker_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._worker_lock = threading.Lock()
+        self._baseline = None
+        self._started_tracemalloc = False
+
+    @contextmanager
+    def request(self):
+        """Wrap one request; passes through once N requests were captured"""
+        if self.finished:
+            yield
+            return
+        with self._lock:
+            if self.finished:
+                yield
+                return
+            if self._baseline is None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                    self._started_tracemalloc = True
+                self._baseline = tracemalloc.take_snapshot()
+            token = _current.set((self, threading.get_ident()))
+            self._profile.enable()
+            try:
+                yield
+            finally:
+                self._profile.disable()
+                _current.reset(token)
+                self.profiled += 1
+                if self.n_requests is not None and self.profiled >= self.n_requests:
+                    self._write_reports()
+
+    def _profile_worker(self, fn: Callable, args):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread with the request's profiler
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            with self._worker_lock:
+                if not self.finished:
+                    self._worker_profiles.append(profile)
+
+    def _stats(self, stream=None) -> pstats.Stats:
+        stats = pstats.Stats(self._profile, stream=stream)
+        with self._worker_lock:
+            for profile in self._worker_profiles:
+                stats.add(profile)
+        return stats
+
+    def close(self):
+        """Write reports for whatever was captured so far"""
+        with self._lock:
+            if not self.finished and self.profiled:
+                self._write_reports()
+
+    def _write_reports(self):
+        self.finished = True
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        # Snapshot first so building the reports doesn't show up in it
+        snapshot = tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+        baseline = self._baseline.filter_traces(_ALLOCATION_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        stats = self._stats()
+        stats.dump_stats(str(self.out_dir / "profile.pstats"))
+
+        text = io.StringIO()
+        self._stats(stream=text).sort_stats("cumulative").print_stats(40)
+        with open(self.out_dir / "profile.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Requests profiled: {self.profiled}\n")
+            f.write(text.getvalue())
+
+        with open(self.out_dir / "profile.collapsed", 'w', encoding='utf-8') as f:
+            f.write("\n".join(collapsed_stacks(stats)) + "\n")
+
+        diff = snapshot.compare_to(baseline, "lineno")
+        with open(self.out_dir / "allocations.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Requests profiled: {self.profiled}\n")
+            f.write(f"Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top_allocations} allocation sites (growth since first request):\n")
+            for stat in diff[:self.top_allocations]:
+                f.write(f"{stat}\n")
+
+        # stderr, so batch output on stdout stays machine-readable
+        print(f"✓ Profile of {self.profiled} request(s) written to {self.out_dir}", file=sys.stderr, flush=True)
+
+
+def run_profiled(fn: Callable, *args):
+    """fn(*args); in a worker thread running for a profiled request, its
+    calls are added to that request's profile"""
+    current = _current.get()
+    if current is None or current[1] == threading.get_ident():
+        return fn(*args)
+    return current[0]._profile_worker(fn, args)
+
+
+def profiler_from_env() -> Optional[RequestProfiler]:
+    """RequestProfiler configured by SONICPALETTE_PROFILE(_REQUESTS), or None"""
+    out_dir = os.environ.get("SONICPALETTE_PROFILE")
+    if not out_dir:
+        return None
+    n_requests = int(os.environ.get("SONICPALETTE_PROFILE_REQUESTS", DEFAULT_PROFILE_REQUESTS))
+    return RequestProfiler(out_dir, n_requests)
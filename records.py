@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Compact, read-only records for the loaded knowledge base
+The JSON files load as dicts of dicts of lists, which costs several
+hundred bytes per style before counting the strings. Styles, chords and
+references are converted once at load time into frozen __slots__ records
+whose strings are interned, so the same instrument, keyword or chord
+spelled in a thousand styles is stored once:
+
+- Style: keywords, instruments, chords, description, bpm, optional tags;
+  instruments and tags also as integer ids into the shared INSTRUMENTS
+  and TAGS vocabularies
+- Chord: roman numerals and the progression in C; identical chords are
+  shared between styles, and each is rendered in all 24 keys once
+  (chords.py)
+- Reference: (title, note) named tuple; each style's references are a
+  ReferencePool grouped by artist, for sampling in O(k)
+  (app.suggest_references); a tenant overlay adding references to a base
+  style holds a LayeredPool of the base pool and its own additions
+
+Style and Chord are read-only Mappings, so code written against the dict
+layout (meta.get("keywords", []), chord["roman"], {**style, **overrides})
+keeps working. memory_report.py compares both layouts at 10k styles.
+"""
+
+import sys
+import threading
+from array import array
+from collections.abc import Mapping, Sequence as SequenceABC
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from chords import parse_key, table_for
+
+
+class Vocabulary:
+    """Strings <-> dense integer ids, shared by every knowledge base"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def id(self, name: str) -> int:
+        found = self._ids.get(name)
+        if found is not None:
+            return found
+        with self._lock:
+            if name not in self._ids:
+                self._names.append(sys.intern(name))
+                self._ids[name] = len(self._names) - 1
+            return self._ids[name]
+
+    def ids(self, names: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self.id(name) for name in names)
+
+    def names(self, ids: Iterable[int]) -> List[str]:
+        return [self._names[i] for i in ids]
+
+
+INSTRUMENTS = Vocabulary()
+TAGS = Vocabulary()
+
+
+def _interned(values: Iterable) -> Tuple[str, ...]:
+    return tuple(sys.intern(str(value)) for value in values)
+
+
+class _Record(Mapping):
+    """Read-only mapping view over __slots__; fields set to None are absent"""
+
+    __slots__ = ()
+    _FIELDS: Tuple[str, ...] = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getitem__(self, key):
+        if key in self._FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (name for name in self._FIELDS if getattr(self, name) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class Chord(_Record):
+    __slots__ = ("roman", "C", "transposed")
+    _FIELDS = ("roman", "C")
+
+    def __init__(self, roman: str, C: str):
+        object.__setattr__(self, "roman", sys.intern(roman))
+        object.__setattr__(self, "C", sys.intern(C))
+        object.__setattr__(self, "transposed", table_for(self.roman))
+
+    def in_key(self, key: Optional[str]) -> str:
+        """The progression in `key` ("Eb", "F#m", "D minor"); the written C
+        rendering when no key is given or the roman numerals can't be parsed"""
+        if not key or self.transposed is None:
+            return self.C
+        return self.transposed.renderings[parse_key(key)]
+
+    def __reduce__(self):
+        return (Chord, (self.roman, self.C))
+
+
+_chords: Dict[Tuple[str, str], Chord] = {}
+
+
+def chord(info: Mapping) -> Chord:
+    """Shared Chord record for a {"roman": ..., "C": ...} entry"""
+    key = (info["roman"], info["C"])
+    found = _chords.get(key)
+    if found is None:
+        found = _chords.setdefault(key, Chord(*key))
+    return found
+
+
+class Style(_Record):
+    __slots__ = ("keywords", "instruments", "chords", "description", "bpm", "tags", "extra",
+                 "instrument_ids", "tag_ids")
+    _FIELDS = ("keywords", "instruments", "chords", "description", "bpm", "tags")
+
+    def __init__(self, keywords: Sequence[str] = (), instruments: Sequence[str] = (),
+                 chords: Sequence[Mapping] = (), description: Optional[str] = None,
+                 bpm: Optional[Sequence[int]] = None, tags: Optional[Sequence[str]] = None,
+                 extra: Iterable[Tuple[str, object]] = ()):
+        init = object.__setattr__
+        init(self, "keywords", _interned(keywords))
+        init(self, "instruments", _interned(instruments))
+        init(self, "chords", tuple(chord(info) for info in chords))
+        init(self, "description", None if description is None else sys.intern(description))
+        init(self, "bpm", None if bpm is None else tuple(bpm))
+        init(self, "tags", None if tags is None else _interned(tags))
+        init(self, "extra", tuple((sys.intern(key), value) for key, value in extra))
+        init(self, "instrument_ids", INSTRUMENTS.ids(self.instruments))
+        init(self, "tag_ids", TAGS.ids(self.tags or ()))
+
+    @classmethod
+    def from_mapping(cls, info: Mapping) -> "Style":
+        known = {key: info[key] for key in cls._FIELDS if key in info}
+        return cls(**known, extra=[(key, value) for key, value in info.items() if key not in cls._FIELDS])
+
+    def __getitem__(self, key):
+        for name, value in self.extra:
+            if name == key:
+                return value
+        return super().__getitem__(key)
+
+    def __iter__(self):
+        yield from super().__iter__()
+        yield from (name for name, _ in self.extra)
+
+    def __reduce__(self):
+        return (Style.from_mapping, (dict(self),))
+
+
+class Reference(NamedTuple):
+    title: str
+    note: str
+
+
+def reference(entry: Sequence[str]) -> Reference:
+    title, note = entry
+    return Reference(sys.intern(title), sys.intern(note))
+
+
+def freeze_styles(styles: Mapping[str, Mapping]) -> Dict[str, Style]:
+    """{name: Style} for a {name: {field: value}} style database"""
+    return {sys.intern(name): info if isinstance(info, Style) else Style.from_mapping(info)
+            for name, info in styles.items()}
+
+
+def artist_of(title: str) -> str:
+    """Grouping key of a "Artist - Song" title (the whole title without a dash)"""
+    return title.split(" - ", 1)[0].strip().casefold()
+
+
+class ReferencePool(SequenceABC):
+    """A style's references, grouped by artist in order of first appearance:
+    group g is references[offsets[g]:offsets[g + 1]]"""
+
+    __slots__ = ("references", "offsets")
+
+    def __init__(self, references: Iterable[Reference]):
+        groups: Dict[str, List[Reference]] = {}
+        for ref in references:
+            groups.setdefault(artist_of(ref.title), []).append(ref)
+        offsets = array("I", [0])
+        for group in groups.values():
+            offsets.append(offsets[-1] + len(group))
+        object.__setattr__(self, "references", tuple(ref for group in groups.values() for ref in group))
+        object.__setattr__(self, "offsets", offsets)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ReferencePool is read-only")
+
+    @property
+    def groups(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.references[index]
+
+    def __len__(self):
+        return len(self.references)
+
+    def __eq__(self, other):
+        if isinstance(other, ReferencePool):
+            return self.references == other.references
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ReferencePool({list(self.references)!r})"
+
+    def __reduce__(self):
+        return (ReferencePool, (self.references,))
+
+
+class LayeredPool(SequenceABC):
+    """References of a style extended by a tenant overlay: the base pool
+    followed by the overlay's own additions, without copying the base"""
+
+    __slots__ = ("layers",)
+
+    def __init__(self, *pools: SequenceABC):
+        layers = []
+        for pool in pools:
+            layers.extend(pool.layers if isinstance(pool, LayeredPool) else (pool,))
+        object.__setattr__(self, "layers", tuple(layers))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LayeredPool is read-only")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        for pool in self.layers:
+            if 0 <= index < len(pool):
+                return pool[index]
+            index -= len(pool)
+        raise IndexError("LayeredPool index out of range")
+
+    def __len__(self):
+        return sum(len(pool) for pool in self.layers)
+
+    def __iter__(self):
+        for pool in self.layers:
+            yield from pool
+
+    def __repr__(self):
+        return f"LayeredPool{self.layers!r}"
+
+
+def freeze_references(references: Mapping[str, Iterable[Sequence[str]]]) -> Dict[str, ReferencePool]:
+    """{style: ReferencePool} for a {style: [[title, note], ...]} reference database"""
+    return {sys.intern(style): ReferencePool(reference(entry) for entry in entries)
+            for style, entries in references.items()}
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Two-stage style retrieval helpers
+With ML enabled, styles are scored in two stages: the cheap keyword and
+emotion scores of every style pick the top candidates, and only those are
+reranked with embeddings (app.ml_enhanced_style_detection). The candidate
+count comes from SONICPALETTE_STYLE_CANDIDATES (default 300, "all" or 0
+scores every style); catalogs up to that size are scored exhaustively.
+
+retrieval_report.py measures recall of the two-stage top-k against
+exhaustive scoring.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CANDIDATES = 300
+
+
+def candidate_count() -> Optional[int]:
+    """Configured stage-one candidate count (None = score every style)"""
+    value = os.environ.get("SONICPALETTE_STYLE_CANDIDATES", str(DEFAULT_CANDIDATES)).strip().lower()
+    if value in ("", "all", "0", "off"):
+        return None
+    return int(value)
+
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, best first, ties in index order
+    (like a stable sort) - O(n) partition instead of a full sort"""
+    n = len(values)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        idx = np.arange(n)
+    else:
+        kth = np.partition(values, n - k)[n - k]
+        idx = np.flatnonzero(values >= kth)
+    return idx[np.argsort(-values[idx], kind="stable")][:k]
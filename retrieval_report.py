@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Recall report for two-stage style retrieval
+For each candidate count, compares the top-k styles of the two-stage scorer
+(keyword/emotion candidates, then semantic rerank) with exhaustive semantic
+scoring of every style, and reports recall@k and latency per query.
+
+Without sentence-transformers, a character-3-gram hashing encoder stands in
+for the model (dedup.HashingEncoder), which exercises the code path but not
+the real model's recall.
+
+Usage:
+    python retrieval_report.py
+    SONICPALETTE_DATA_DIR=scale_data/s1000_e200_r100000 python retrieval_report.py --candidates 50 100 300
+"""
+
+import argparse
+import statistics
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import app
+from calibrate_cascade import DEFAULT_DESCRIPTIONS
+from dedup import HashingEncoder
+from model_manager import ModelManager
+
+
+class HashingModel:
+    """Stand-in for the sentence-transformers model"""
+
+    def __init__(self):
+        self.encoder = HashingEncoder()
+
+    def encode(self, texts, **kwargs):
+        return self.encoder.encode(texts)
+
+
+def use_hashing_model():
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(HashingModel)
+
+
+def top_styles(scores: Dict[str, float], k: int) -> List[str]:
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def measure(descriptions: Sequence[str], candidate_counts: Sequence[int], ks: Sequence[int]) -> List[Dict]:
+    """recall@k and latency of each candidate count against exhaustive scoring"""
+    kb = app.BASE_KB
+    for description in descriptions[:1]:
+        app.ml_enhanced_style_detection(description, kb, n_candidates=0)  # build the embeddings
+
+    def run(n_candidates):
+        results, latencies = [], []
+        for description in descriptions:
+            start = time.perf_counter()
+            results.append(app.ml_enhanced_style_detection(description, kb, n_candidates=n_candidates))
+            latencies.append(time.perf_counter() - start)
+        return results, latencies
+
+    exhaustive, exhaustive_latencies = run(0)
+    rows = [{"candidates": "all", "p50_ms": statistics.median(exhaustive_latencies) * 1000,
+             **{f"recall@{k}": 1.0 for k in ks}}]
+    for n in candidate_counts:
+        two_stage, latencies = run(n)
+        row = {"candidates": n, "p50_ms": statistics.median(latencies) * 1000}
+        for k in ks:
+            hits = [len(set(top_styles(full, k)) & set(top_styles(staged, k))) / min(k, len(full))
+                    for full, staged in zip(exhaustive, two_stage)]
+            row[f"recall@{k}"] = statistics.mean(hits)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall of two-stage style retrieval vs exhaustive scoring")
+    parser.add_argument("--descriptions", type=Path, default=DEFAULT_DESCRIPTIONS, help="One description per line")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[25, 50, 100, 300], help="Stage-one sizes")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 10], help="Recall cutoffs")
+    args = parser.parse_args()
+
+    if not app.ML_AVAILABLE:
+        warnings.warn("sentence-transformers is not installed: using a hashing encoder instead of the model.")
+        use_hashing_model()
+
+    with open(args.descriptions, 'r', encoding='utf-8') as f:
+        descriptions = [line.strip() for line in f if line.strip()]
+    rows = measure(descriptions, args.candidates, args.k)
+
+    print(f"{len(app.BASE_KB.style_db)} styles, {len(descriptions)} descriptions\n")
+    headers = ["candidates", "p50 ms"] + [f"recall@{k}" for k in args.k]
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    for row in rows:
+        cells = [str(row["candidates"]), f"{row['p50_ms']:.2f}"] + [f"{row[f'recall@{k}']:.1%}" for k in args.k]
+        lines.append("| " + " | ".join(cells) + " |")
+    print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Synthetic Knowledge Base Generator for SonicPalette
+Writes schema-valid styles.json, emotions.json, references.json and
+emotion_to_styles.json at configurable sizes into a separate directory,
+so the pipeline can be exercised against catalogs much larger than data/
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+BASE_DATA_DIR = Path(__file__).parent / "data"
+SCALE_DIR = Path(__file__).parent / "scale_data"
+
+# Word banks used to build plausible synthetic entries
+_GENRE_WORDS = [
+    "wave", "core", "pop", "step", "hop", "gaze", "funk", "soul", "dub", "folk",
+    "jazz", "house", "trap", "drill", "garage", "disco", "rock", "grind", "tronica", "beat",
+]
+_PREFIXES = [
+    "neo", "dark", "lo", "hyper", "vapor", "chill", "acid", "deep", "future", "tropical",
+    "glitch", "dream", "cloud", "space", "math", "post", "proto", "kosmische", "bedroom", "city",
+]
+_MOOD_WORDS = [
+    "wistful", "brooding", "giddy", "serene", "restless", "tender", "fierce", "hazy",
+    "bittersweet", "gloomy", "radiant", "weary", "hopeful", "eerie", "playful", "solemn",
+    "yearning", "smoky", "sunlit", "frosty",
+]
+_INSTRUMENTS = [
+    "Rhodes", "Analog polysynth", "Sub-bass", "Dusty drums", "Acoustic guitar", "Strings",
+    "Brass section", "Choir", "Arp synth", "Vinyl crackle", "Upright bass", "Organ",
+    "Field recordings", "Granular beds", "808 kick", "Hand percussion", "Flute", "Cello",
+    "Lead synth", "Tape delay guitar",
+]
+_CHORDS = [
+    {"roman": "I – V – vi – IV", "C": "C – G – Am – F"},
+    {"roman": "ii7 – V7 – Imaj7", "C": "Dm7 – G7 – Cmaj7"},
+    {"roman": "i – VI – III – VII (aeolian)", "C": "Am – F – C – G"},
+    {"roman": "Imaj7 – vi7 – ii7 – V7", "C": "Cmaj7 – Am7 – Dm7 – G7"},
+    {"roman": "I – IV – V", "C": "C – F – G"},
+    {"roman": "i – iv – v – i (minor)", "C": "Am – Dm – Em – Am"},
+]
+_ARTIST_WORDS = [
+    "Velvet", "Static", "Paper", "Neon", "Silver", "Hollow", "Golden", "Midnight",
+    "Crystal", "Lunar", "Echo", "Amber", "Violet", "Northern", "Quiet", "Electric",
+]
+_ARTIST_NOUNS = [
+    "Harbor", "Lanterns", "Machines", "Gardens", "Parade", "Signals", "Tides", "Ghosts",
+    "Motel", "Orchestra", "Collective", "Club", "Atlas", "Foxes", "Rooms", "Satellites",
+]
+_TITLE_WORDS = [
+    "Night", "Drive", "Summer", "Rain", "Glass", "Heart", "City", "Ocean", "Fever",
+    "Signal", "Window", "Dream", "River", "Static", "Letters", "Morning", "Shadow", "Light",
+]
+
+
+def load_base(filename: str) -> dict:
+    """Load a seed file from the real data directory (empty dict if missing)"""
+    filepath = BASE_DATA_DIR / filename
+    if not filepath.exists():
+        return {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _synthetic_name(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(_PREFIXES).capitalize()}{rng.choice(_GENRE_WORDS)} {index:05d}"
+
+
+def generate_styles(n_styles: int, rng: random.Random) -> Dict[str, dict]:
+    """Real styles first, then synthetic ones until n_styles is reached"""
+    styles = load_base("styles.json")
+    styles = dict(list(styles.items())[:n_styles])
+    index = 0
+    while len(styles) < n_styles:
+        name = _synthetic_name(rng, index)
+        index += 1
+        low = rng.randrange(50, 150)
+        keywords = [name.split()[0].lower()] + rng.sample(_PREFIXES + _GENRE_WORDS + _MOOD_WORDS, 5)
+        styles[name] = {
+            "keywords": keywords,
+            "bpm_min": low,
+            "bpm_max": low + rng.randrange(10, 40),
+            "instruments": rng.sample(_INSTRUMENTS, 5),
+            "chords": rng.sample(_CHORDS, 2),
+            "description": f"Synthetic {' '.join(keywords[1:3])} style",
+        }
+    return styles
+
+
+def generate_emotions(n_emotions: int, rng: random.Random) -> Dict[str, dict]:
+    """Real emotions first, then synthetic ones until n_emotions is reached"""
+    emotions = load_base("emotions.json")
+    emotions = dict(list(emotions.items())[:n_emotions])
+    index = 0
+    while len(emotions) < n_emotions:
+        word = rng.choice(_MOOD_WORDS)
+        name = f"{word}-{index:04d}"
+        index += 1
+        keywords = [name] + rng.sample(_MOOD_WORDS, 4)
+        emotions[name] = {
+            "keywords": keywords,
+            "description": f"{word} and {keywords[1]} feeling",
+        }
+    return emotions
+
+
+def generate_emotion_to_styles(emotions: Dict[str, dict], styles: Dict[str, dict],
+                               rng: random.Random) -> Dict[str, Dict[str, float]]:
+    """Keep real mappings whose targets exist, map every other emotion to 3-4 styles"""
+    mapping = {}
+    base = load_base("emotion_to_styles.json")
+    style_names = list(styles.keys())
+    for emotion in emotions:
+        known = {st: w for st, w in base.get(emotion, {}).items() if st in styles}
+        if known:
+            mapping[emotion] = known
+            continue
+        targets = rng.sample(style_names, min(len(style_names), rng.randrange(3, 5)))
+        weights = [0.5, 0.3, 0.2, 0.1]
+        mapping[emotion] = {st: weights[i] for i, st in enumerate(targets)}
+    return mapping
+
+
+def generate_references(n_references: int, styles: Dict[str, dict],
+                        rng: random.Random) -> Dict[str, List[List[str]]]:
+    """Spread n_references across all styles (plus "Indie refs"), real ones first"""
+    base = load_base("references.json")
+    references = {st: list(base.get(st, [])) for st in styles}
+    if "Indie refs" in base:
+        references["Indie refs"] = list(base["Indie refs"])
+    total = sum(len(refs) for refs in references.values())
+    style_names = list(styles.keys())
+    index = 0
+    while total < n_references:
+        style = style_names[index % len(style_names)]
+        artist = f"{rng.choice(_ARTIST_WORDS)} {rng.choice(_ARTIST_NOUNS)}"
+        title = f"{rng.choice(_TITLE_WORDS)} {rng.choice(_TITLE_WORDS)} {index}"
+        references[style].append([f"{artist} - {title}", f"synthetic {style.lower()} reference"])
+        index += 1
+        total += 1
+    return references
+
+
+def generate_knowledge_base(out_dir: Path, n_styles: int, n_emotions: int,
+                            n_references: int, seed: int = 0) -> Path:
+    """Write a complete synthetic knowledge base into out_dir"""
+    rng = random.Random(seed)
+    styles = generate_styles(n_styles, rng)
+    emotions = generate_emotions(n_emotions, rng)
+    files = {
+        "styles.json": styles,
+        "emotions.json": emotions,
+        "emotion_to_styles.json": generate_emotion_to_styles(emotions, styles, rng),
+        "references.json": generate_references(n_references, styles, rng),
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for filename, data in files.items():
+        # Compact output: these files are for load tests, not for humans
+        with open(out_dir / filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    return out_dir
+
+
+def size_tag(n_styles: int, n_emotions: int, n_references: int) -> str:
+    return f"s{n_styles}_e{n_emotions}_r{n_references}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SonicPalette knowledge base")
+    parser.add_argument("--styles", type=int, default=1000)
+    parser.add_argument("--emotions", type=int, default=200)
+    parser.add_argument("--references", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=None,
+                        help="Output directory (default: scale_data/<size tag>)")
+    args = parser.parse_args()
+
+    out_dir = args.out or SCALE_DIR / size_tag(args.styles, args.emotions, args.references)
+    generate_knowledge_base(out_dir, args.styles, args.emotions, args.references, args.seed)
+    print(f"✓ Wrote synthetic knowledge base to {out_dir}")
+    print(f"Use it with: SONICPALETTE_DATA_DIR={out_dir} python app.py")
+
+
+if __name__ == "__main__":
+    main()
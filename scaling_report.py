@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Scaling Report for SonicPalette
+Generates synthetic knowledge bases at several sizes and measures load time,
+memory and per-request latency of the pipeline against each of them.
+
+Each size runs in its own interpreter (SONICPALETTE_DATA_DIR points
+data_loader at the synthetic catalog), so load time and memory are measured
+from a cold start. Load time covers importing app: reading the catalog and
+building its indexes. Requests go through app.generate_prompt and stage
+latencies come from its per-request trace.
+
+Usage:
+    python scaling_report.py
+    python scaling_report.py --sizes 100:20:10000 1000:200:500000 --requests 50
+    python scaling_report.py --ml --json report.json --plot report.png
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from scale_generator import SCALE_DIR, generate_knowledge_base, size_tag
+
+DEFAULT_SIZES = ["25:22:100", "100:50:10000", "1000:200:100000", "1000:200:500000"]
+
+SAMPLE_DESCRIPTIONS = [
+    "Neon city at night, slightly melancholic yet hopeful, dreamy glitchy electronic",
+    "Warm cozy jazz lounge atmosphere with smooth vocals",
+    "lofi study beat for a rainy evening",
+    "reggae island vibe, sunny and laid-back",
+    "Triumphant post-rock with epic build-up",
+    "dark moody trip-hop noir with vinyl crackle",
+    "温暖 复古 城市 夜色",
+]
+
+# Optional plotting support
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    PLOT_AVAILABLE = True
+except ImportError:
+    PLOT_AVAILABLE = False
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(n_requests: int, use_ml: bool) -> dict:
+    """Measure the pipeline in this process; SONICPALETTE_DATA_DIR is already set"""
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    # Importing app loads the knowledge base and builds its indexes
+    import app
+    load_s = time.perf_counter() - start
+    if not use_ml:
+        app.ML_AVAILABLE = False
+
+    stage_times = defaultdict(list)
+    for i in range(n_requests):
+        desc = SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)]
+        result = app.generate_prompt(app.UserIntent(desc), trace=True, endpoint="batch")
+        for stage, seconds in result.timings:
+            stage_times["request" if stage == "total" else stage].append(seconds)
+
+    kb = app.get_knowledge_base()
+    result = {
+        "styles": len(kb.style_db),
+        "emotions": len(kb.emotion_keywords),
+        "references": sum(len(v) for v in kb.reference_db.values()),
+        "load_s": load_s,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": _peak_rss_mb(),
+        "ml": app.ML_AVAILABLE,
+    }
+    for stage, values in stage_times.items():
+        result[f"{stage}_p50_ms"] = statistics.median(values) * 1000
+        result[f"{stage}_p95_ms"] = _percentile(values, 95) * 1000
+    return result
+
+
+def measure_size(spec: str, n_requests: int, use_ml: bool, regenerate: bool) -> dict:
+    """Generate (if needed) one synthetic catalog and measure it in a subprocess"""
+    n_styles, n_emotions, n_references = (int(x) for x in spec.split(":"))
+    out_dir = SCALE_DIR / size_tag(n_styles, n_emotions, n_references)
+    if regenerate or not (out_dir / "references.json").exists():
+        print(f"Generating {out_dir.name}...", flush=True)
+        generate_knowledge_base(out_dir, n_styles, n_emotions, n_references)
+
+    # The sample descriptions repeat: without the near-duplicate cache every
+    # request runs the analysis
+    env = dict(os.environ, SONICPALETTE_DATA_DIR=str(out_dir), SONICPALETTE_NEAR_CACHE="off")
+    cmd = [sys.executable, __file__, "--worker", "--requests", str(n_requests)]
+    if use_ml:
+        cmd.append("--ml")
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+    # The worker prints its JSON result as the last line of stdout
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["size"] = spec
+    result["data_size_mb"] = sum(p.stat().st_size for p in out_dir.glob("*.json")) / (1024 * 1024)
+    return result
+
+
+def format_table(results) -> str:
+    headers = ["styles", "emotions", "refs", "json MB", "load s", "peak RSS MB",
+               "scores p50 ms", "refs p50 ms", "request p50 ms", "request p95 ms"]
+    rows = []
+    for r in results:
+        rows.append([
+            str(r["styles"]), str(r["emotions"]), str(r["references"]),
+            f"{r['data_size_mb']:.1f}", f"{r['load_s']:.3f}",
+            "n/a" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f}",
+            f"{r.get('ml_style_detection_p50_ms', r.get('keyword_scoring_p50_ms', 0.0)):.3f}",
+            f"{r.get('references_p50_ms', 0.0):.3f}",
+            f"{r['request_p50_ms']:.3f}", f"{r['request_p95_ms']:.3f}",
+        ])
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def plot_results(results, path: Path):
+    refs = [r["references"] for r in results]
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    axes[0].plot(refs, [r["load_s"] for r in results], marker="o")
+    axes[0].set_title("Load time (s)")
+    axes[1].plot(refs, [r["peak_rss_mb"] or 0 for r in results], marker="o")
+    axes[1].set_title("Peak RSS (MB)")
+    axes[2].plot(refs, [r["request_p50_ms"] for r in results], marker="o", label="p50")
+    axes[2].plot(refs, [r["request_p95_ms"] for r in results], marker="o", label="p95")
+    axes[2].set_title("Request latency (ms)")
+    axes[2].legend()
+    for ax in axes:
+        ax.set_xscale("log")
+        ax.set_xlabel("references")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure SonicPalette against synthetic catalogs")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES,
+                        help="Sizes as STYLES:EMOTIONS:REFERENCES")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per size")
+    parser.add_argument("--ml", action="store_true", help="Use the ML path when available")
+    parser.add_argument("--regenerate", action="store_true", help="Rewrite cached catalogs")
+    parser.add_argument("--json", type=Path, help="Also write raw results as JSON")
+    parser.add_argument("--plot", type=Path, help="Also plot results (requires matplotlib)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.requests, args.ml)))
+        return
+
+    results = []
+    for spec in args.sizes:
+        results.append(measure_size(spec, args.requests, args.ml, args.regenerate))
+        print(f"✓ Measured {spec}", flush=True)
+
+    print("\n=== Scaling Report ===\n")
+    print(format_table(results))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"\n✓ Saved {args.json}")
+    if args.plot:
+        if PLOT_AVAILABLE:
+            plot_results(results, args.plot)
+            print(f"✓ Saved {args.plot}")
+        else:
+            print("Warning: matplotlib not installed, skipping plot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Record/replay HTTP stub for testing the importers offline
+ResponseRecorder captures real API responses (HttpClient(recorder=...));
+ReplayServer serves them back on localhost so the import engine can be run
+against recorded Last.fm / MusicBrainz data without network access.
+
+Recording format (JSON list):
+    {"path": "/ws/2/release-group", "params": {...}, "status": 200,
+     "headers": {...}, "body": {...}}
+Entries with the same path and params are replayed in order (the last one
+repeats), which lets a recording include e.g. a 503 followed by a 200.
+A request whose If-None-Match matches the entry's ETag gets a 304.
+
+Usage:
+    python stub_server.py fixtures/import_responses.json --port 8765
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+# Never written to recordings, never used for matching
+_SECRET_PARAMS = {"api_key"}
+
+
+def _request_key(path: str, params: Dict[str, str]) -> Tuple:
+    items = ((k, str(v)) for k, v in params.items() if k not in _SECRET_PARAMS)
+    return path, tuple(sorted(items))
+
+
+class ResponseRecorder:
+    """Collects responses seen by an HttpClient; save() writes a recording file"""
+
+    def __init__(self):
+        self.entries: List[dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, url: str, params, response):
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        entry = {
+            "path": urlsplit(url).path,
+            "params": {k: str(v) for k, v in (params or {}).items() if k not in _SECRET_PARAMS},
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k in ("ETag", "Last-Modified")},
+            "body": body,
+        }
+        with self._lock:
+            self.entries.append(entry)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=4, ensure_ascii=False)
+
+
+class ReplayServer:
+    """Serves recorded responses; use as a context manager or start()/stop()"""
+
+    def __init__(self, recordings: List[dict], host: str = "127.0.0.1", port: int = 0):
+        self._responses: Dict[Tuple, List[dict]] = {}
+        for entry in recordings:
+            key = _request_key(entry["path"], entry.get("params", {}))
+            self._responses.setdefault(key, []).append(entry)
+        self._served: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+        self.requests_seen: List[Tuple] = []
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path, **kwargs) -> "ReplayServer":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _next_response(self, path: str, params: Dict[str, str]):
+        key = _request_key(path, params)
+        with self._lock:
+            self.requests_seen.append(key)
+            entries = self._responses.get(key)
+            if not entries:
+                return None
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def _handler_class(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                entry = replay._next_response(parts.path, dict(parse_qsl(parts.query)))
+                if entry is None:
+                    status, headers, body = 404, {}, {"error": f"no recording for {self.path}"}
+                else:
+                    status, headers, body = entry["status"], entry.get("headers", {}), entry["body"]
+                    etag = headers.get("ETag")
+                    if etag is not None and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, ""
+                payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded API responses on localhost")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ReplayServer.from_file(args.recording, port=args.port)
+    print(f"Replaying {args.recording} on {server.url} (Ctrl+C to stop)")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
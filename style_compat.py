@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Style compatibility matrix
+How well two styles blend, from three signals:
+  - BPM overlap: shared part of the two BPM ranges relative to the narrower one
+  - instruments: Jaccard similarity of the words of the instrument names
+    ("Airy pad" and "Evolving pads" share "pad")
+  - semantics: cosine similarity of the styles' embedding centroids (or of
+    their keyword and description words when no embeddings are available)
+
+The style x style matrix is computed once per knowledge base with a few
+matrix products and used by app.pick_style_blend to choose the partner of
+the top style among the next candidates, and by app.similar_styles.
+`python style_compat.py` writes it to <data dir>/style_compat.npz next to
+the JSON files; it is loaded from there while the styles are unchanged.
+
+Usage:
+    python style_compat.py                # compute and save
+    python style_compat.py --similar "Dream pop"
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from bm25 import normalize_terms
+
+WEIGHTS = {"bpm": 0.4, "instruments": 0.3, "semantic": 0.3}
+COMPAT_FILENAME = "style_compat.npz"
+
+
+def _words(texts: Sequence[str]) -> List[str]:
+    return normalize_terms(re.findall(r"\w+", " ".join(texts).casefold()))
+
+
+def _binary_rows(entries: Sequence[Sequence[str]]) -> np.ndarray:
+    """One row per entry, one column per distinct word of the entries' texts"""
+    vocab: Dict[str, int] = {}
+    coords = [(i, vocab.setdefault(word, len(vocab))) for i, texts in enumerate(entries)
+              for word in set(_words(texts))]
+    matrix = np.zeros((len(entries), max(len(vocab), 1)), dtype=np.float32)
+    if coords:
+        rows, cols = zip(*coords)
+        matrix[list(rows), list(cols)] = 1.0
+    return matrix
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class StyleFeatures:
+    """BPM ranges, instrument sets and semantic vectors of some styles"""
+
+    def __init__(self, names: List[str], style_db: Mapping[str, Mapping],
+                 vectors: Optional[np.ndarray] = None):
+        self.names = names
+        bpm = np.array([style_db[name].get("bpm", (0, 0)) for name in names], dtype=np.float32).reshape(-1, 2)
+        self.lo, self.hi = bpm[:, 0], bpm[:, 1]
+        self.instruments = _binary_rows([style_db[name].get("instruments", []) for name in names])
+        if vectors is not None:
+            self.semantic, self.mode = _unit_rows(np.asarray(vectors, dtype=np.float32)), "embeddings"
+        else:
+            keywords = _binary_rows([[*style_db[name].get("keywords", []), style_db[name].get("description", "")]
+                                     for name in names])
+            self.semantic, self.mode = _unit_rows(keywords), "keywords"
+
+
+def compatibility_matrix(features: StyleFeatures, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """(S, S) blend scores in [0, 1], or only the given `rows` (R, S); a
+    style's score with itself is 0"""
+    rows = np.arange(len(features.names)) if rows is None else np.asarray(rows, dtype=np.int64)
+    lo, hi = features.lo, features.hi
+    width = hi - lo
+    overlap = np.minimum(hi[rows, None], hi[None, :]) - np.maximum(lo[rows, None], lo[None, :])
+    narrower = np.maximum(np.minimum(width[rows, None], width[None, :]), 1.0)
+    bpm = np.clip(overlap / narrower, 0.0, 1.0)
+
+    inst = features.instruments
+    shared = inst[rows] @ inst.T
+    sizes = inst.sum(axis=1)
+    union = sizes[rows, None] + sizes[None, :] - shared
+    instruments = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+    semantic = np.clip(features.semantic[rows] @ features.semantic.T, 0.0, 1.0)
+
+    matrix = WEIGHTS["bpm"] * bpm + WEIGHTS["instruments"] * instruments + WEIGHTS["semantic"] * semantic
+    matrix[np.arange(len(rows)), rows] = 0.0
+    return matrix.astype(np.float32)
+
+
+def styles_fingerprint(style_db: Mapping[str, Mapping], names: Sequence[str]) -> str:
+    """Changes whenever a field the matrix depends on changes"""
+    digest = hashlib.sha1()
+    for name in names:
+        meta = style_db[name]
+        fields = [name, list(meta.get("bpm", ())), meta.get("instruments", []),
+                  meta.get("keywords", []), meta.get("description", "")]
+        digest.update(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CompatIndex:
+    """Precomputed compatibility of a fixed list of styles"""
+
+    def __init__(self, names: List[str], matrix: np.ndarray, mode: str, fingerprint: str):
+        self.names = names
+        self.matrix = matrix
+        self.mode = mode
+        self.fingerprint = fingerprint
+        self.index = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def build(cls, style_db: Mapping[str, Mapping], names: List[str],
+              vectors: Optional[np.ndarray] = None) -> "CompatIndex":
+        features = StyleFeatures(names, style_db, vectors)
+        return cls(names, compatibility_matrix(features), features.mode, styles_fingerprint(style_db, names))
+
+    def save(self, path: Path):
+        tmp = Path(path).with_suffix(".tmp.npz")
+        # Plain unicode arrays: the file loads without allow_pickle
+        np.savez_compressed(tmp, names=np.array(self.names, dtype=str), matrix=self.matrix.astype(np.float16),
+                            mode=self.mode, fingerprint=self.fingerprint)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CompatIndex":
+        """Read a saved index; ValueError for files that would need unpickling"""
+        with np.load(path) as data:
+            return cls(data["names"].tolist(), data["matrix"].astype(np.float32), str(data["mode"]),
+                       str(data["fingerprint"]))
+
+    def lookup(self, names: Sequence[str]) -> np.ndarray:
+        """(N, N) block for the given styles, one fancy-indexing lookup"""
+        idx = np.array([self.index[name] for name in names], dtype=np.int64)
+        return self.matrix[np.ix_(idx, idx)]
+
+
+def main():
+    import app
+    from data_loader import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Build the style compatibility matrix")
+    parser.add_argument("--similar", metavar="STYLE", help="List the styles that blend best with STYLE")
+    parser.add_argument("-k", type=int, default=8, help="How many similar styles to list")
+    args = parser.parse_args()
+
+    if args.similar:
+        for name, score in app.similar_styles(args.similar, k=args.k):
+            print(f"{score:.3f}  {name}")
+        return
+
+    kb = app.BASE_KB
+    if app.ML_AVAILABLE:
+        app.layered_semantic_scores(kb, "styles", "warm up")  # embed the styles
+    index = app.compat_index(kb, use_saved=False)
+    path = DATA_DIR / COMPAT_FILENAME
+    index.save(path)
+    print(f"✓ Saved {path} ({len(index.names)} styles, {index.mode})")
+
+
+if __name__ == "__main__":
+    main()
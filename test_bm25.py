@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 lexical scorer (bm25.py)
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+import app
+from bm25 import FIELD_WEIGHTS, BM25Index, normalize_terms
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Keyword-only top picks that differ from fixtures/keyword_baseline.json
+# (the picks before BM25) on purpose: the description names the style
+DELIBERATE_CHANGES = {
+    "lonely blues guitar at midnight": "Blues",
+    "sunny country song about a pickup truck": "Country",
+}
+
+DOCS = {
+    "Jazz": [("name", "Jazz"), ("description", "smoky club with brushed drums"), ("keywords", "swing")],
+    "Folk": [("name", "Folk"), ("description", "intimate acoustic guitar songs"), ("keywords", "acoustic")],
+    "Techno": [("name", "Techno"), ("description", "driving club kicks"), ("notes", "warehouse rave")],
+}
+
+
+def naive_bm25(query, k1=1.2, b=0.75):
+    """Reference implementation over the same weighted term frequencies"""
+    weights = FIELD_WEIGHTS
+    tfs = {}
+    for name, fields in DOCS.items():
+        tf = {}
+        for field, text in fields:
+            for term in normalize_terms(app.tokenize(text)):
+                tf[term] = tf.get(term, 0.0) + weights[field]
+        tfs[name] = tf
+    avg = sum(sum(tf.values()) for tf in tfs.values()) / len(tfs)
+    scores = []
+    for name, tf in tfs.items():
+        length = sum(tf.values())
+        score = 0.0
+        for term in normalize_terms(app.tokenize(query)):
+            if term in tf:
+                df = sum(term in other for other in tfs.values())
+                idf = math.log1p((len(tfs) - df + 0.5) / (df + 0.5))
+                score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * length / avg))
+        scores.append(score)
+    return np.array(scores)
+
+
+def test_scores_match_the_formula_and_batches():
+    index = BM25Index.build(DOCS, app.tokenize)
+    queries = ["late night club with drums", "acoustic guitars", "rave", "nothing matches here"]
+    batch = index.batch_scores([app.tokenize(q) for q in queries])
+    for q, row in zip(queries, batch):
+        assert np.allclose(row, naive_bm25(q), atol=1e-5)
+        assert np.allclose(index.scores(app.tokenize(q)), row)
+    assert set(index.matches(app.tokenize("club"))) == {"Jazz", "Techno"}
+    assert index.matches(app.tokenize("nothing matches here")) == {}
+
+
+def test_relative_scores_have_a_fixed_scale():
+    index = BM25Index.build(DOCS, app.tokenize)
+    # One incidental word of a longer query is a small fraction, even as the best match
+    assert 0 < index.relative_matches(app.tokenize("a rave for a road trip at sunrise"))["Techno"] < 0.4
+    assert all(0 < score <= 1 for score in index.relative_matches(app.tokenize("jazz club swing")).values())
+    assert index.relative_matches(app.tokenize("jazz"))["Jazz"] > 0.5
+    assert index.relative_matches(app.tokenize("nothing here")) == {}
+    assert normalize_terms(app.tokenize("hard 808s")) == ["hard"]
+
+
+def test_keyword_picks_match_the_baseline():
+    with open(os.path.join(FIXTURES, "keyword_baseline.json"), encoding="utf-8") as f:
+        baseline = json.load(f)
+    changed = {}
+    for description, expected in baseline.items():
+        top = app.pick_top_styles(app.keyword_analysis(description)[1], k=1)[0]
+        if top != DELIBERATE_CHANGES.get(description, expected):
+            changed[description] = (expected, top)
+    assert changed == {}, changed
+
+
+def test_keyword_fallback_handles_paraphrases():
+    # No exact style keyword, but the words appear in descriptions
+    emotions, scores = app.keyword_analysis("orchestral strings and a choir")
+    assert app.pick_top_styles(scores)[0] in ("Classical", "Gospel")
+    # Emotion picked from names/descriptions instead of the "chill" default
+    assert app.keyword_analysis("a song about subtle heartbreak")[0] == ["melancholic"]
+    assert app.keyword_analysis("reflective piano at dawn")[0] == ["contemplative"]
+    assert app.keyword_analysis("some mood and atmosphere")[0] == ["chill"]
+
+
+if __name__ == "__main__":
+    test_scores_match_the_formula_and_batches()
+    test_relative_scores_have_a_fixed_scale()
+    test_keyword_picks_match_the_baseline()
+    test_keyword_fallback_handles_paraphrases()
+    print("✓ All BM25 tests passed")
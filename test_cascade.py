@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the keyword-first early-exit cascade and its calibration
+"""
+
+import app
+import tracing
+from data_loader import BASE_KB
+from calibrate_cascade import collect, recommend, sweep
+
+
+class CountingML:
+    """ML 'installed', counting how often the full analysis runs"""
+
+    def __init__(self):
+        self.calls = []
+
+    def analyze(self, description, kb=None):
+        self.calls.append(description)
+        return ["warm"], {style: 0.0 for style in app.STYLE_DB}
+
+    def __enter__(self):
+        self.saved = (app.ML_AVAILABLE, app.analyze_description)
+        app.ML_AVAILABLE = True
+        app.analyze_description = self.analyze
+        return self
+
+    def __exit__(self, *exc):
+        app.ML_AVAILABLE, app.analyze_description = self.saved
+        return False
+
+
+def test_keyword_evidence():
+    emotions, scores = app.keyword_analysis("reggae island vibe, sunny and laid-back")
+    margin, matched = app.keyword_evidence("reggae island vibe, sunny and laid-back", emotions, scores)
+    assert margin > 3 and matched == 1
+
+    # "chill" is only the fallback here: no emotion keyword in the text
+    emotions, scores = app.keyword_analysis("heavy metal riffs with aggressive drums")
+    assert app.keyword_evidence("heavy metal riffs with aggressive drums", emotions, scores)[1] == 0
+
+
+def test_margin_leaves_out_bm25_credit():
+    description = "smooth vocals on a rainy evening, lofi study beat"
+    emotions, scores = app.keyword_analysis(description)
+    saved = app.LEXICAL_WEIGHT
+    app.LEXICAL_WEIGHT = 0.0
+    try:
+        _, exact_scores = app.keyword_analysis(description)
+        expected = app.keyword_evidence(description, emotions, exact_scores)
+    finally:
+        app.LEXICAL_WEIGHT = saved
+    assert exact_scores != scores
+    assert abs(app.keyword_evidence(description, emotions, scores)[0] - expected[0]) < 1e-9
+
+
+def test_indexes_are_built_with_the_knowledge_base():
+    BASE_KB.cache.clear()
+    kb = app.get_knowledge_base(None)
+    assert ("bm25", "styles") in kb.cache and ("bm25", "emotions") in kb.cache
+
+
+def test_decisive_keywords_skip_the_model():
+    with CountingML() as ml:
+        emotions, scores, degraded = app.analyze_within_budget("reggae island vibe", endpoint="test_cascade")
+        assert ml.calls == []
+        assert app.pick_top_styles(scores, k=1) == ["Reggae"] and degraded is None
+
+        # Ambiguous keywords escalate to the semantic scorer
+        emotions, _, _ = app.analyze_within_budget("Warm cozy jazz lounge atmosphere", endpoint="test_cascade")
+        assert ml.calls == ["Warm cozy jazz lounge atmosphere"] and emotions == ["warm"]
+
+    assert tracing.counter_value("cascade_requests_total", endpoint="test_cascade") == 2
+    assert tracing.counter_value("cascade_early_exits_total", endpoint="test_cascade") == 1
+
+
+def test_calibration_picks_threshold_that_keeps_agreement():
+    descriptions = ["reggae island vibe", "lofi study beat", "dark moody trip-hop noir",
+                    "Warm cozy jazz lounge", "sad piano ballad"]
+
+    def full(description):
+        # Agrees with the keyword pass only where the genre is named
+        emotions, scores = app.keyword_analysis(description)
+        if description in ("Warm cozy jazz lounge", "sad piano ballad"):
+            scores = {style: 0.0 for style in scores}
+            scores["Ambient"] = 1.0
+        return emotions, scores
+
+    rows = collect(descriptions, full)
+    best = recommend(sweep(rows), target=1.0)
+
+    assert best["agreement"] == 1.0
+    assert best["early_share"] == 3 / 5
+    assert all(app.is_decisive(r["margin"], r["matched_emotions"], best) == r["primary_agrees"] for r in rows)
+
+
+if __name__ == "__main__":
+    test_keyword_evidence()
+    test_margin_leaves_out_bm25_credit()
+    test_indexes_are_built_with_the_knowledge_base()
+    test_decisive_keywords_skip_the_model()
+    test_calibration_picks_threshold_that_keeps_agreement()
+    print("✓ All cascade tests passed")
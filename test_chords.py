@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the chord transposition table (chords.py) and key-aware output
+"""
+
+import app
+from chords import KEY_NAMES, compile_progression, in_key, key_label, key_name, parse_key, table_for
+from data_loader import BASE_KB
+
+
+def test_compile_and_transpose():
+    assert compile_progression("ii7 – V7 – Imaj7") == (0, ((2, "m7"), (7, "7"), (0, "maj7")))
+    assert in_key("ii7 – V7 – Imaj7", "Eb") == "Fm7 – Bb7 – Ebmaj7"
+    assert in_key("ii7 – V7 – Imaj7", "F#") == "G#m7 – C#7 – F#maj7"
+    # Secondary dominants and minor progressions (kept in the relative key)
+    assert in_key("Imaj7 – V/vi – vi – ii7 – V7", "Eb") == "Ebmaj7 – G – Cm – Fm7 – Bb7"
+    assert in_key("i – VI – III – VII", "D minor") == "Dm – Bb – F – C"
+    assert in_key("i – VI – III – VII", "C") == "Am – F – C – G"
+    assert in_key("I – IV – V", None) is None and table_for("not a progression") is None
+
+    assert len(KEY_NAMES) == 24 and len(set(KEY_NAMES)) == 24
+    assert all(parse_key(name) == i for i, name in enumerate(KEY_NAMES))
+    assert parse_key("F#m") == parse_key("f# minor") == parse_key("Gbm") == parse_key("F♯ min")
+    assert key_name(parse_key("bb")) == "Bb major"
+    try:
+        parse_key("H major")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_catalog_progressions_compile():
+    progressions = {ch["roman"]: ch for meta in BASE_KB.style_db.values() for ch in meta["chords"]}
+    for roman, ch in progressions.items():
+        assert ch.transposed is not None, roman
+        assert ch.in_key(None) == ch["C"]
+        assert ch.in_key("C major") == in_key(roman, "C")
+
+
+def test_pick_chords_and_prompt_in_a_key():
+    styles = ["Jazz", "Lo-fi hiphop"]
+    plain = app.pick_chords(styles, rng=app.random.Random(3))
+    keyed = app.pick_chords(styles, rng=app.random.Random(3), key="Eb")
+    # Without a key the output is unchanged
+    assert all(set(ch) == {"roman", "C"} for ch in plain)
+    assert [ch["roman"] for ch in keyed] == [ch["roman"] for ch in plain]
+    assert all(ch["key"] == "Eb major" and ch["chords"] == in_key(ch["roman"], "Eb") for ch in keyed)
+
+    prompt = app.format_suno_prompt(styles, ["chill"], (80, 90), ["Piano"], plain, key="Eb")
+    assert f"key: Eb major, chords: {plain[0]['roman']} ({in_key(plain[0]['roman'], 'Eb')})" in prompt
+    assert "key:" not in app.format_suno_prompt(styles, ["chill"], (80, 90), ["Piano"], plain)
+
+    result = app.generate_prompt(app.UserIntent("late night jazz lounge", seed=1, key="Am"))
+    assert all(ch["key"] == "C major (relative of A minor)" for ch in result.chords)
+    assert "key: C major (relative of A minor)" in result.prompt
+
+
+def test_label_names_the_key_the_chords_are_in():
+    major, minor = {"roman": "ii – V – I", "C": "Dm – G – C"}, {"roman": "i – VI – III – VII", "C": "Am – F – C – G"}
+    sections = app.build_prompt_sections(["Jazz"], ["sad"], (80, 90), ["Piano"], [major], key="D minor")
+    chords = next(section for section in sections if section["name"] == "chords")
+    # Gm – C – F is in F major, not D minor
+    assert chords["hard"] == "key: F major (relative of D minor), chords: ii – V – I (Gm – C – F)"
+    assert key_label("ii – V – I", "D minor") == "F major (relative of D minor)"
+    assert key_label("i – VI – III – VII", "D minor") == "D minor"
+    assert key_label("i – VI – III – VII", "Eb") == "C minor (relative of Eb major)"
+
+    sections = app.build_prompt_sections(["Jazz"], ["sad"], (80, 90), ["Piano"], [major, minor], key="D minor")
+    chords = next(section for section in sections if section["name"] == "chords")
+    assert chords["hard"] == ("chords: ii – V – I (Gm – C – F) in F major (relative of D minor), "
+                              "i – VI – III – VII (Dm – Bb – F – C) in D minor")
+    # Every catalog progression: the rendering's tonic chord is the labelled key's tonic
+    for meta in BASE_KB.style_db.values():
+        for ch in meta["chords"]:
+            table = ch.transposed
+            for index in range(24):
+                tonic = table.label(index).split()[0]
+                rendered = table.renderings[index].split(" – ")
+                tonic_chords = [name for name, roman in zip(rendered, ch["roman"].split(" – "))
+                                if roman.rstrip("maj7°ø+sus24").lower() == "i" and "/" not in roman]
+                assert all(name.startswith(tonic) and not name[len(tonic):].startswith(("#", "b"))
+                           for name in tonic_chords), (ch["roman"], table.label(index), rendered)
+
+
+if __name__ == "__main__":
+    test_compile_and_transpose()
+    test_catalog_progressions_compile()
+    test_pick_chords_and_prompt_in_a_key()
+    test_label_names_the_key_the_chords_are_in()
+    print("✓ All chord tests passed")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight request coalescing (coalesce.py)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+import tracing
+from app import UserIntent, generate_prompt, generate_prompt_async
+from coalesce import SingleFlight, coalesce_key
+
+
+def slow_analysis(calls):
+    def analyze(description, kb=None):
+        calls.append(description)
+        time.sleep(0.2)
+        return ["dreamy"], {"Dream pop": 3.0, "City pop": 2.0, "R&B": 1.0}
+    return analyze
+
+
+def test_threads_share_one_computation():
+    flight = SingleFlight("test_threads")
+    calls = []
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: flight.do("key", slow_analysis(calls), "x"), range(8)))
+
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert flight.coalesced == 7
+    assert tracing.counter_value("coalesced_requests_total", flight="test_threads") == 7
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test_errors")
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("model crashed")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ["model crashed", "model crashed"]
+    assert flight.in_flight() == 0
+
+
+def test_asyncio_and_threads_share_the_flight():
+    flight = SingleFlight("test_async")
+    calls = []
+    analyze = slow_analysis(calls)
+
+    async def main():
+        thread_result = asyncio.get_running_loop().run_in_executor(None, flight.do, "key", analyze, "x")
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(*(flight.do_async("key", analyze, "x") for _ in range(5)))
+        return results + [await thread_result]
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test_cancel")
+    calls = []
+    analyze = slow_analysis(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", analyze, "x"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.do_async("key", analyze, "x"))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # the first client disconnects
+        try:
+            await leader
+            raise AssertionError("expected CancelledError")
+        except asyncio.CancelledError:
+            pass
+        return await follower
+
+    result = asyncio.run(main())
+    assert result == (["dreamy"], {"Dream pop": 3.0, "City pop": 2.0, "R&B": 1.0})
+    assert len(calls) == 1 and flight.coalesced == 1
+    assert flight.in_flight() == 0 and not flight._futures
+
+
+def test_coalesced_requests_keep_their_own_seed():
+    calls = []
+    original = app.analyze_description
+    app.analyze_description = slow_analysis(calls)
+    # Without the near-duplicate cache the later request analyzes again
+    os.environ["SONICPALETTE_NEAR_CACHE"] = "off"
+    try:
+        intents = [UserIntent(description="  Neon City NIGHT ", seed=seed) for seed in (1, 2, 1)]
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(generate_prompt, intents))
+        async_result = asyncio.run(generate_prompt_async(UserIntent(description="neon city night", seed=1)))
+    finally:
+        app.analyze_description = original
+        del os.environ["SONICPALETTE_NEAR_CACHE"]
+
+    assert coalesce_key("  Neon City NIGHT ") == "neon city night"
+    assert len(calls) == 2  # one for the three threads, one for the later async request
+    assert all(r.styles == ["Dream pop", "City pop"] for r in results)
+    # Same seed, same sampled chords and references
+    assert results[0].chords == results[2].chords == async_result.chords
+    assert results[0].references == results[2].references == async_result.references
+
+
+if __name__ == "__main__":
+    test_threads_share_one_computation()
+    test_errors_reach_every_waiter()
+    test_asyncio_and_threads_share_the_flight()
+    test_cancelled_leader_does_not_cancel_followers()
+    test_coalesced_requests_keep_their_own_seed()
+    print("✓ All coalescing tests passed")
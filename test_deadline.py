@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for latency-budget degradation of the ML stage (deadline.py)
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import app
+import deadline
+import tracing
+from app import UserIntent, generate_prompt
+from deadline import BoundedExecutor, Deadline, DeadlineExceeded, budget_for
+from model_manager import ModelManager
+from profiling import RequestProfiler
+
+
+class FakeML:
+    """Pretend sentence-transformers is installed, with a slow analysis"""
+
+    def __init__(self, delay, loaded=True, load_delay=0.0):
+        self.delay = delay
+        self.loaded = loaded
+        self.load_delay = load_delay
+        self.saved = {}
+
+    def slow_analysis(self, description, kb=None):
+        with tracing.span("fake_encode"):
+            time.sleep(self.delay)
+        return ["dreamy"], {style: 0.0 for style in app.STYLE_DB}
+
+    def load(self):
+        time.sleep(self.load_delay)
+        return object()
+
+    def __enter__(self):
+        for name in ("ML_AVAILABLE", "_model_manager", "analyze_description"):
+            self.saved[name] = getattr(app, name)
+        # Exercise the ML path itself, not the keyword cascade in front of it
+        self.saved_cascade = os.environ.get("SONICPALETTE_CASCADE")
+        os.environ["SONICPALETTE_CASCADE"] = "off"
+        app.ML_AVAILABLE = True
+        app._model_manager = ModelManager(self.load)
+        if self.loaded:
+            app._model_manager.get()
+        app.analyze_description = self.slow_analysis
+        self.saved_executor = deadline._executor
+        deadline._executor = BoundedExecutor(max_workers=1, max_pending=2)
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(app, name, value)
+        deadline._executor = self.saved_executor
+        if self.saved_cascade is None:
+            del os.environ["SONICPALETTE_CASCADE"]
+        else:
+            os.environ["SONICPALETTE_CASCADE"] = self.saved_cascade
+        return False
+
+
+def test_slow_encode_falls_back_to_keywords():
+    with FakeML(delay=0.5):
+        start = time.perf_counter()
+        emotions, scores, degraded = app.analyze_within_budget(
+            "lofi study beat for a rainy evening", Deadline(0.05), endpoint="test_slow")
+        elapsed = time.perf_counter() - start
+
+    assert degraded == "timeout"
+    assert elapsed < 0.3, elapsed
+    # Keyword scoring still answers the request
+    assert (emotions, scores) == app.keyword_analysis("lofi study beat for a rainy evening")
+    assert tracing.counter_value("ml_fallbacks_total", endpoint="test_slow", reason="timeout") == 1
+    assert tracing.gauge_value("ml_fallback_ratio", endpoint="test_slow") == 1.0
+
+
+def test_fast_encode_is_not_degraded():
+    with FakeML(delay=0.0):
+        _, scores, degraded = app.analyze_within_budget("anything", Deadline(1.0), endpoint="test_fast")
+    assert degraded is None
+    assert tracing.gauge_value("ml_fallback_ratio", endpoint="test_fast") == 0.0
+
+
+def test_full_queue_degrades_immediately():
+    with FakeML(delay=0.3):
+        busy = [threading.Thread(target=app.analyze_within_budget, args=(f"busy {i}", Deadline(1.0)))
+                for i in range(2)]
+        for t in busy:
+            t.start()
+        time.sleep(0.05)
+        _, _, degraded = app.analyze_within_budget("one more", Deadline(1.0), endpoint="test_queue")
+        for t in busy:
+            t.join()
+    assert degraded == "queue_full"
+
+
+def test_cold_start_waits_for_the_model_within_the_budget():
+    # Loads in time: the request isn't degraded
+    with FakeML(delay=0.0, loaded=False, load_delay=0.1):
+        emotions, _, degraded = app.analyze_within_budget("cold start", Deadline(1.0), endpoint="test_cold")
+    assert degraded is None and emotions == ["dreamy"]
+
+    # Too slow for the budget: degraded, and loading goes on in the background
+    with FakeML(delay=0.0, loaded=False, load_delay=0.4):
+        start = time.perf_counter()
+        _, _, degraded = app.analyze_within_budget("cold start", Deadline(0.1), endpoint="test_cold")
+        elapsed = time.perf_counter() - start
+        manager = app._model_manager
+    assert degraded == "model_not_loaded" and elapsed < 0.3, elapsed
+    assert manager.wait_loaded(2.0)
+
+
+def test_worker_stages_are_traced_and_profiled():
+    with FakeML(delay=0.05), tempfile.TemporaryDirectory() as tmp:
+        profiler = RequestProfiler(tmp, n_requests=1)
+        with profiler.request(), tracing.request_trace() as stages:
+            _, _, degraded = app.analyze_within_budget("traced", Deadline(1.0), endpoint="test_trace")
+        assert degraded is None
+        # The encode ran on the ML executor's thread
+        assert [name for name, _ in stages] == ["fake_encode"] and stages[0][1] >= 0.05
+        with open(os.path.join(tmp, "profile.txt"), encoding="utf-8") as f:
+            assert "slow_analysis" in f.read()
+
+
+def test_budgets_per_endpoint():
+    os.environ["SONICPALETTE_ML_BUDGET_UI"] = "0.05"
+    os.environ["SONICPALETTE_ML_BUDGET_BATCH"] = "off"
+    try:
+        assert budget_for("ui") == 0.05
+        assert budget_for("batch") is None
+        assert budget_for("api") == deadline.DEFAULT_BUDGETS["api"]
+        with FakeML(delay=0.3):
+            ui = generate_prompt(UserIntent("warm jazz lounge"), endpoint="ui")
+            batch = generate_prompt(UserIntent("warm jazz lounge"), endpoint="batch")
+    finally:
+        del os.environ["SONICPALETTE_ML_BUDGET_UI"]
+        del os.environ["SONICPALETTE_ML_BUDGET_BATCH"]
+
+    assert ui.degraded == "timeout" and ui.prompt
+    assert batch.degraded is None and batch.emotions == ["dreamy"]
+
+
+def test_expired_deadline():
+    executor = BoundedExecutor()
+    try:
+        executor.run(lambda: None, deadline=Deadline(-1))
+    except DeadlineExceeded as e:
+        assert e.reason == "expired"
+    else:
+        raise AssertionError("expected DeadlineExceeded")
+
+
+if __name__ == "__main__":
+    test_slow_encode_falls_back_to_keywords()
+    test_fast_encode_is_not_degraded()
+    test_full_queue_degrades_immediately()
+    test_cold_start_waits_for_the_model_within_the_budget()
+    test_worker_stages_are_traced_and_profiled()
+    test_budgets_per_endpoint()
+    test_expired_deadline()
+    print("✓ All deadline tests passed")
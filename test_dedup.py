@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for near-duplicate reference detection (dedup.py)
+"""
+
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from dedup import canonical_text, dedup_catalog, dedup_into_store, dedup_references
+from kb_store import KnowledgeStore
+
+
+def test_canonical_text_strips_credits_and_versions():
+    assert canonical_text("Bob Marley & The Wailers - No Woman, No Cry (Live)") == ("bob marley", "no woman no cry")
+    assert canonical_text("The Beatles - Let It Be - Remastered 2009") == ("beatles", "let it be")
+    assert canonical_text("Nujabes feat. Cise Starr - Feather") == ("nujabes", "feather")
+
+
+def test_groups_near_duplicates_only():
+    refs = {
+        "Reggae": [["Bob Marley - No Woman, No Cry", "classic"],
+                   ["Bob Marley & The Wailers - No Woman No Cry (Live)", "live"],
+                   ["Bob Marley - Is This Love", "love song"]],
+        "Gospel": [["Mahalia Jackson - Amazing Grace", "classic"],
+                   ["Aretha Franklin - Amazing Grace", "soulful"]],
+        "House": [["Daft Punk - One More Time", "filter house"],
+                  ["Daft Punk - One More Chance", "b-side"]],
+    }
+    result = dedup_references(refs)
+
+    assert result.aliases == {"Reggae": {
+        "Bob Marley & The Wailers - No Woman No Cry (Live)": "Bob Marley - No Woman, No Cry"}}
+    assert [t for t, _ in result.kept["Reggae"]] == ["Bob Marley - No Woman, No Cry", "Bob Marley - Is This Love"]
+    assert len(result.kept["Gospel"]) == 2 and len(result.kept["House"]) == 2
+
+
+def test_import_keeps_canonical_entry_and_stores_aliases():
+    with tempfile.TemporaryDirectory() as tmp:
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("test"):
+                store.add_references("Reggae", [("Bob Marley - No Woman, No Cry", "classic")])
+            merged, duplicates = dedup_into_store(store, {"Reggae": [
+                ("Bob Marley & The Wailers - No Woman No Cry (Live)", "live"),
+                ("Bob Marley - Redemption Song", "acoustic"),
+            ]})
+            # Existing duplicates are folded by the catalog pass
+            with store.transaction("test"):
+                store.add_references("Reggae", [("Bob Marley - Redemption Song (Acoustic)", "bonus")])
+            catalog = dedup_catalog(store)
+        refs = json.loads((Path(tmp) / "references.json").read_text(encoding="utf-8"))
+        aliases = json.loads((Path(tmp) / "reference_aliases.json").read_text(encoding="utf-8"))
+
+    assert (merged.added, duplicates, catalog.duplicates) == (1, 1, 1)
+    assert [t for t, _ in refs["Reggae"]] == ["Bob Marley - No Woman, No Cry", "Bob Marley - Redemption Song"]
+    assert aliases["Reggae"] == {
+        "Bob Marley & The Wailers - No Woman No Cry (Live)": "Bob Marley - No Woman, No Cry",
+        "Bob Marley - Redemption Song (Acoustic)": "Bob Marley - Redemption Song",
+    }
+
+
+def test_dedup_100k_references():
+    rng = random.Random(0)
+    words = "love night city dream blue fire rain heart star summer river moon gold light road home".split()
+    refs, truth = {}, {}
+    for i in range(90_000):
+        title = f"Artist {rng.randrange(8000)} - {' '.join(rng.sample(words, 3)).title()} {i}"
+        refs.setdefault(f"Style {i % 20}", []).append([title, "catalog"])
+    originals = [(style, ref[0]) for style, style_refs in refs.items() for ref in style_refs]
+    for _ in range(10_000):
+        style, title = rng.choice(originals)
+        artist, song = title.split(" - ", 1)
+        alias = f"{artist} feat. Guest - {song.lower()} (Live)"
+        refs[style].append([alias, "import"])
+        truth[(style, alias)] = title
+
+    start = time.perf_counter()
+    result = dedup_references(refs)
+    elapsed = time.perf_counter() - start
+
+    found = {(style, alias): canonical for style, a in result.aliases.items() for alias, canonical in a.items()}
+    print(f"Deduplicated 100k references in {elapsed:.1f}s: {len(found)} aliases")
+    assert found == truth
+    assert elapsed < 60, elapsed
+
+
+if __name__ == "__main__":
+    test_canonical_text_strips_credits_and_versions()
+    test_groups_near_duplicates_only()
+    test_import_keeps_canonical_entry_and_stores_aliases()
+    test_dedup_100k_references()
+    print("✓ All dedup tests passed")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the tempo/era/texture facet index (facets.py)
+"""
+
+import numpy as np
+
+import app
+from app import UserIntent
+from data_loader import BASE_KB
+from facets import BPMIntervalIndex, FacetIndex, style_facets
+
+
+def test_interval_index_matches_a_scan():
+    rng = np.random.default_rng(0)
+    lo = rng.integers(40, 180, size=500).astype(np.float32)
+    hi = lo + rng.integers(0, 60, size=500)
+    index = BPMIntervalIndex(lo, hi)
+    for low, high in [(0, 50), (90, 120), (100, 100), (175, 400), (300, 400)]:
+        expected = (lo <= high) & (hi >= low)
+        assert np.array_equal(index.overlapping(low, high), expected)
+
+
+def test_facets_come_from_tags_keywords_and_instruments():
+    styles = {
+        "Old": {"bpm": (60, 80), "keywords": ["vinyl", "80s"], "instruments": ["Upright bass", "Piano"]},
+        "New": {"bpm": (125, 140), "keywords": ["hyperpop"], "instruments": ["Lead synth", "808 kick"]},
+        "Tagged": {"bpm": (95, 105), "tags": ["modern", "acoustic"], "keywords": ["retro"], "instruments": []},
+    }
+    assert style_facets(styles["Old"]) == {"era": ["retro"], "texture": ["acoustic"]}
+    assert style_facets(styles["New"]) == {"era": ["modern"], "texture": ["electronic"]}
+    assert style_facets(styles["Tagged"]) == {"era": ["modern", "retro"], "texture": ["acoustic"]}
+
+    index = FacetIndex.build(styles, list(styles))
+    assert index.matching("tempo", "slow") == {"Old"}
+    assert index.matching("tempo", "fast") == {"New"}
+    assert index.matching("era", "modern") == {"New", "Tagged"}
+    assert index.matching("era", "auto") is None
+    assert index.in_bpm_range(100, 130) == ["New", "Tagged"]
+
+
+def test_preferences_steer_style_selection():
+    BASE_KB.cache.clear()
+    saved_mode = app.FACET_MODE
+    try:
+        scores = {"Ambient": 3.0, "Punk Rock": 2.7, "Folk": 0.5}
+        plain = UserIntent(description="x")
+        fast = UserIntent(description="x", tempo_pref="fast")
+        assert app.apply_facets(scores, plain) == scores
+        boosted = app.apply_facets(scores, fast)
+        assert boosted["Punk Rock"] > boosted["Ambient"] == scores["Ambient"]
+        assert scores["Punk Rock"] == 2.7  # not modified in place
+
+        app.FACET_MODE = "filter"
+        assert app.apply_facets(scores, fast) == {"Punk Rock": 2.7}
+        # No positive match: preferences don't empty the candidates
+        assert app.apply_facets({"Ambient": 1.0}, fast) == {"Ambient": 1.0}
+    finally:
+        app.FACET_MODE = saved_mode
+        BASE_KB.cache.clear()
+
+
+def test_preferences_do_not_override_a_strong_description_match():
+    fast_modern_electronic = UserIntent(description="x", tempo_pref="fast", era_pref="modern",
+                                        texture_pref="electronic")
+    # EDM matches all three preferences, Reggae none: 1.1 * 1.25**3 would beat 2.0
+    boosted = app.apply_facets({"Reggae": 2.0, "EDM": 1.1}, fast_modern_electronic)
+    assert boosted == {"Reggae": 2.0, "EDM": 1.1}
+
+    description = "reggae island vibe, sunny and laid-back"
+    _, scores = app.keyword_analysis(description)
+    boosted = app.apply_facets(scores, fast_modern_electronic)
+    assert app.pick_top_styles(boosted, k=1) == ["Reggae"]
+
+
+def test_facet_index_is_built_with_the_knowledge_base():
+    BASE_KB.cache.clear()
+    assert ("facets", "styles") in app.get_knowledge_base(None).cache
+
+
+if __name__ == "__main__":
+    test_interval_index_matches_a_scan()
+    test_facets_come_from_tags_keywords_and_instruments()
+    test_preferences_steer_style_selection()
+    test_preferences_do_not_override_a_strong_description_match()
+    test_facet_index_is_built_with_the_knowledge_base()
+    print("✓ All facet tests passed")
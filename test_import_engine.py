@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the concurrent import engine
+Runs against stub_server.ReplayServer serving fixtures/import_responses.json
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import data_importer
+from http_client import HttpClient, ResponseCache, TokenBucket
+from import_engine import ImportCheckpoint, ImportEngine
+from stub_server import ReplayServer
+
+FIXTURE = Path(__file__).parent / "fixtures" / "import_responses.json"
+
+JOBS = [
+    ("Nujabes", "Lo-fi hiphop"),
+    ("Massive Attack", "Trip-hop"),
+    ("Beach House", "Dream pop"),
+    ("Unrecorded Artist", "Ambient"),
+]
+
+
+def make_engine(server: ReplayServer, cache: ResponseCache = None) -> ImportEngine:
+    host = urlsplit(server.url).netloc
+    client = HttpClient(pool_size=4, rates={host: 200.0}, backoff=0.01, cache=cache)
+    return ImportEngine(client=client, max_workers=4, lastfm_api_key="test-key",
+                        lastfm_url=server.url + "/2.0/",
+                        musicbrainz_url=server.url + "/ws/2/release-group")
+
+
+def test_engine_fetches_concurrently_and_retries():
+    with ReplayServer.from_file(FIXTURE) as server:
+        results = {r.artist: r for r in make_engine(server).run(JOBS)}
+
+    assert set(results) == {artist for artist, _ in JOBS}
+    nujabes = [title for title, _ in results["Nujabes"].references]
+    print(f"Nujabes: {nujabes}")
+    assert "Nujabes - Feather" in nujabes
+    assert "Nujabes - Modal Soul" in nujabes
+    # The recording answers 503 first, the client retries and gets the albums
+    assert "Beach House - Bloom" in [t for t, _ in results["Beach House"].references]
+    assert results["Beach House"].error is None
+    # Unrecorded requests come back 404 and are reported, not raised
+    assert "HTTP 404" in results["Unrecorded Artist"].error
+    assert "test-key" not in results["Unrecorded Artist"].error
+
+
+def test_import_streams_into_knowledge_base():
+    original_dir = data_importer.DATA_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        data_importer.DATA_DIR = Path(tmp)
+        try:
+            with open(Path(tmp) / "references.json", 'w', encoding='utf-8') as f:
+                json.dump({"Trip-hop": [["Massive Attack - Teardrop", "moody, iconic trip-hop"]]}, f)
+            with ReplayServer.from_file(FIXTURE) as server:
+                summary = make_engine(server).import_into_knowledge_base(JOBS, batch_size=2)
+            with open(Path(tmp) / "references.json", 'r', encoding='utf-8') as f:
+                refs = json.load(f)
+        finally:
+            data_importer.DATA_DIR = original_dir
+
+    print(f"Summary: {summary}")
+    assert summary == {"artists": 4, "added": 14, "failed": 1, "skipped": 0}
+    trip_hop = [title for title, _ in refs["Trip-hop"]]
+    # Existing entry kept once, new ones appended
+    assert trip_hop.count("Massive Attack - Teardrop") == 1
+    assert "Massive Attack - Mezzanine" in trip_hop
+
+
+def test_rerun_resumes_from_checkpoint():
+    original_dir = data_importer.DATA_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        data_importer.DATA_DIR = Path(tmp)
+        try:
+            checkpoint_path = Path(tmp) / "checkpoint.json"
+            with ReplayServer.from_file(FIXTURE) as server:
+                first = make_engine(server).import_into_knowledge_base(
+                    JOBS, batch_size=1, checkpoint=ImportCheckpoint(checkpoint_path))
+            # A new process: fresh engine, checkpoint reloaded from disk
+            with ReplayServer.from_file(FIXTURE) as server:
+                second = make_engine(server).import_into_knowledge_base(
+                    JOBS, batch_size=1, checkpoint=ImportCheckpoint(checkpoint_path))
+                artists_fetched = {dict(params)["artist"] for _, params in server.requests_seen}
+        finally:
+            data_importer.DATA_DIR = original_dir
+
+    print(f"First run: {first}, second run: {second}")
+    assert first["added"] == 15 and first["skipped"] == 0
+    # Only the failed artist is retried
+    assert second["skipped"] == 3 and second["added"] == 0
+    assert artists_fetched == {"Unrecorded Artist"}
+
+
+def test_response_cache_revalidates_with_etag():
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = [("Nujabes", "Lo-fi hiphop")]
+        with ReplayServer.from_file(FIXTURE) as server:
+            next(make_engine(server, ResponseCache(tmp, max_age=None)).run(jobs))
+            engine = make_engine(server, ResponseCache(tmp, max_age=None))
+            result = next(engine.run(jobs))
+        cached_files = list(Path(tmp).glob("*.json"))
+        # api_key never reaches the cache
+        assert all("test-key" not in p.read_text(encoding="utf-8") for p in cached_files)
+
+    print(f"HTTP stats on rerun: {engine.client.stats}")
+    assert engine.client.stats["not_modified"] == 1  # MusicBrainz sent an ETag
+    assert "Nujabes - Modal Soul" in [t for t, _ in result.references]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50.0)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    # First token is free, the other 5 need 1/50 s each
+    assert elapsed >= 5 / 50 * 0.9, elapsed
+
+
+if __name__ == "__main__":
+    test_engine_fetches_concurrently_and_retries()
+    test_import_streams_into_knowledge_base()
+    test_rerun_resumes_from_checkpoint()
+    test_response_cache_revalidates_with_etag()
+    test_token_bucket_limits_rate()
+    print("✓ All import engine tests passed")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Import-time budget test: keyword-only startup must not touch torch
+Runs `python -X importtime -c "import app"` in a fresh interpreter and
+checks which modules were imported and how long `app` took in total.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "scipy", "sklearn")
+# Cumulative import time budget for `app` (microseconds); generous enough for
+# cold caches on slow CI machines, far below the seconds torch takes
+APP_IMPORT_BUDGET_US = 1_500_000
+
+
+def import_times(module: str):
+    """{module name: cumulative microseconds} from python -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_keyword_only_startup_skips_heavy_imports():
+    times = import_times("app")
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+    print(f"app imported in {times['app'] / 1000:.1f} ms ({len(times)} modules)")
+    assert not heavy, f"heavy modules imported at startup: {heavy[:10]}"
+    assert times["app"] < APP_IMPORT_BUDGET_US, f"app import took {times['app'] / 1000:.1f} ms"
+
+
+def test_import_has_no_print_side_effects():
+    proc = subprocess.run(
+        [sys.executable, "-c", "import app, data_loader, tracing, profiling"],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+    )
+    assert proc.stdout == "", proc.stdout
+
+
+if __name__ == "__main__":
+    test_keyword_only_startup_skips_heavy_imports()
+    test_import_has_no_print_side_effects()
+    print("✓ Import-time budget respected")
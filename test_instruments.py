@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for semantic instrument ranking (app.rank_instruments)
+"""
+
+import numpy as np
+
+import app
+from data_loader import BASE_KB
+from facets import instrument_textures
+from model_manager import ModelManager
+
+WORDS = ["cello", "synth", "piano", "guitar", "drum"]
+
+
+class WordModel:
+    """One axis per word of WORDS (plus a constant axis), so similarities are predictable"""
+
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return np.array([[0.1] + [float(word in text.lower()) for word in WORDS] for text in texts],
+                        dtype=np.float32)
+
+
+def test_style_order_without_a_query_embedding():
+    styles = ["R&B", "Dream pop"]
+    assert app.rank_instruments(styles, "never embedded") == app.collect_instruments(styles)
+    assert len(app.collect_instruments(styles, limit=None)) > len(app.collect_instruments(styles))
+
+
+def test_description_reorders_and_adds_instruments():
+    saved = (app.ML_AVAILABLE, app._model_manager, app.INSTRUMENT_RANKING)
+    model = WordModel()
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(lambda: model)
+    BASE_KB.cache.clear()
+    description = "a sad cello ballad"
+    styles = ["R&B", "Dream pop"]
+    try:
+        app.analyze_description(description)
+        ranked = app.rank_instruments(styles, description)
+        # Named in the description, Cello comes in from another style; the
+        # styles' instruments fill the rest
+        assert ranked[0] == "Cello" and len(ranked) == app.MAX_INSTRUMENTS
+        assert set(ranked[1:]) <= set(app.collect_instruments(styles, limit=None))
+        # The description was embedded once, by the analysis
+        assert model.texts.count(description) == 1
+
+        app.INSTRUMENT_RANKING = "restrict"
+        app.analyze_description("cello and soft guitar")
+        restricted = app.rank_instruments(styles, "cello and soft guitar")
+        assert restricted[:2] == ["Shimmer guitar (reverb/delay)", "Rhodes"] and "Cello" not in restricted
+        assert set(restricted) <= set(app.collect_instruments(styles, limit=None))
+    finally:
+        app.ML_AVAILABLE, app._model_manager, app.INSTRUMENT_RANKING = saved
+        BASE_KB.cache.clear()
+
+
+def test_texture_preference_boosts_instead_of_pasting():
+    styles = ["Folk", "Synthwave"]
+    plain = app.rank_instruments(styles, "never embedded")
+    electronic = app.rank_instruments(styles, "never embedded", texture="electronic")
+    in_styles = app.collect_instruments(styles, limit=None)
+    # Only the styles' own instruments, the electronic ones first in style order
+    assert set(electronic) <= set(in_styles)
+    matching = [it for it in in_styles if "electronic" in instrument_textures(it)]
+    assert electronic[:len(matching)] == matching[:app.MAX_INSTRUMENTS] and electronic != plain
+    # apply_prefs no longer touches the instruments
+    intent = app.UserIntent(description="x", texture_pref="acoustic")
+    assert app.apply_prefs((80, 100), plain, intent)[1] == plain
+
+    saved = (app.ML_AVAILABLE, app._model_manager)
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(WordModel)
+    BASE_KB.cache.clear()
+    description = "with a sad cello"
+    styles = ["R&B", "Dream pop"]
+    try:
+        app.analyze_description(description)
+        # The semantic match stays first; acoustic instruments only rise among the rest
+        ranked = app.rank_instruments(styles, description)
+        for texture in ("acoustic", "electronic"):
+            preferred = app.rank_instruments(styles, description, texture=texture)
+            assert preferred[0] == ranked[0] == "Cello"
+            assert all(texture in instrument_textures(it) for it in preferred[1:3])
+            assert not all(texture in instrument_textures(it) for it in ranked[1:3])
+    finally:
+        app.ML_AVAILABLE, app._model_manager = saved
+        BASE_KB.cache.clear()
+
+
+if __name__ == "__main__":
+    test_style_order_without_a_query_embedding()
+    test_description_reorders_and_adds_instruments()
+    test_texture_preference_boosts_instead_of_pasting()
+    print("✓ All instrument ranking tests passed")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for the transactional knowledge store (kb_store.py)
+"""
+
+import json
+import tempfile
+import threading
+import time
+import warnings
+from pathlib import Path
+
+import kb_store
+import manage_data
+from kb_store import KnowledgeStore
+
+
+def read(tmp, filename):
+    with open(Path(tmp) / filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_writes_export_json_layout_and_log_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(Path(tmp) / "references.json", 'w', encoding='utf-8') as f:
+            json.dump({"Trip-hop": [["Massive Attack - Teardrop", "moody"]]}, f)
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("test"):
+                store.upsert_style("Shoegaze", {"keywords": ["fuzz"], "bpm_min": 80, "bpm_max": 120})
+                added = store.add_references("Trip-hop", [
+                    ("Massive Attack - Teardrop", "moody"),  # already there
+                    ("Portishead - Roads", "melancholic"),
+                ])
+            log = [(source, op, kind, key) for _, _, source, op, kind, key in store.changes()]
+
+        assert added == 1
+        assert read(tmp, "references.json") == {"Trip-hop": [
+            ["Massive Attack - Teardrop", "moody"], ["Portishead - Roads", "melancholic"]]}
+        assert read(tmp, "styles.json")["Shoegaze"]["bpm_max"] == 120
+        assert ("test", "upsert", "style", "Shoegaze") in log
+        assert ("test", "add", "references", "Trip-hop") in log
+
+
+def test_hand_edited_json_is_not_clobbered():
+    with tempfile.TemporaryDirectory() as tmp:
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("test"):
+                store.add_references("Ambient", [("Brian Eno - An Ending", "weightless")])
+        # Someone edits the file directly between two tool runs
+        refs = read(tmp, "references.json")
+        refs["Ambient"].append(["Stars of the Lid - Requiem", "slow drones"])
+        time.sleep(0.01)
+        with open(Path(tmp) / "references.json", 'w', encoding='utf-8') as f:
+            json.dump(refs, f)
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("test"):
+                store.add_references("Ambient", [("Aphex Twin - Rhubarb", "glassy")])
+
+        titles = [t for t, _ in read(tmp, "references.json")["Ambient"]]
+        assert titles == ["Brian Eno - An Ending", "Stars of the Lid - Requiem", "Aphex Twin - Rhubarb"]
+
+
+def test_additions_export_once_when_the_store_is_closed():
+    writes = []
+    original = kb_store.atomic_write_json
+
+    def counting_write(path, data, indent=None):
+        writes.append(Path(path).name)
+        original(path, data, indent)
+
+    kb_store.atomic_write_json = counting_write
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            saved_dir, manage_data.DATA_DIR = manage_data.DATA_DIR, Path(tmp)
+            try:
+                with KnowledgeStore(tmp) as store:
+                    for i in range(20):
+                        manage_data.add_reference("Ambient", "Artist", f"Track {i}", "drone", store=store)
+                    manage_data.add_style("Shoegaze", {"keywords": ["fuzz"]}, store=store)
+                    assert writes == [] and store.dirty() == ["references.json", "styles.json"]
+                assert sorted(writes) == ["references.json", "styles.json"]
+                assert len(read(tmp, "references.json")["Ambient"]) == 20
+
+                # Without a store, each call is its own tool run
+                manage_data.add_reference("Ambient", "Artist", "Track 20", "drone")
+                assert writes[2:] == ["references.json"]
+            finally:
+                manage_data.DATA_DIR = saved_dir
+    finally:
+        kb_store.atomic_write_json = original
+
+
+def test_pending_changes_survive_an_unflushed_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KnowledgeStore(tmp)
+        with store.transaction("test"):
+            store.add_references("Ambient", [("Brian Eno - An Ending", "weightless")])
+        store.conn.close()  # e.g. killed before closing: nothing exported
+        assert not (Path(tmp) / "references.json").exists()
+
+        # A hand edit made meanwhile is merged with the pending changes
+        with open(Path(tmp) / "references.json", 'w', encoding='utf-8') as f:
+            json.dump({"Ambient": [["Stars of the Lid - Requiem", "slow drones"]]}, f)
+        with KnowledgeStore(tmp) as other:
+            assert other.dirty() == ["references.json"]
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                assert other.flush() == ["references.json"]
+            assert any("unexported" in str(w.message) for w in caught)
+            assert other.dirty() == []
+        titles = sorted(t for t, _ in read(tmp, "references.json")["Ambient"])
+        assert titles == ["Brian Eno - An Ending", "Stars of the Lid - Requiem"]
+
+
+def test_concurrent_writers_do_not_lose_updates():
+    with tempfile.TemporaryDirectory() as tmp:
+        def writer(worker):
+            with KnowledgeStore(tmp) as store:
+                for i in range(20):
+                    with store.transaction(f"worker{worker}"):
+                        store.add_references("Lo-fi", [(f"Artist {worker} - Track {i}", "dusty")])
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(read(tmp, "references.json")["Lo-fi"]) == 80
+
+
+def test_bulk_insert_100k_references():
+    refs = [(f"Artist {i % 5000} - Track {i}", "synthetic") for i in range(100_000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("bulk"):
+                for style in range(10):
+                    store.add_references(f"Style {style}", refs[style::10])
+        elapsed = time.perf_counter() - start
+        exported = read(tmp, "references.json")
+
+    print(f"100k references inserted and exported in {elapsed:.2f}s")
+    assert sum(len(v) for v in exported.values()) == 100_000
+    assert elapsed < 10, elapsed
+
+
+if __name__ == "__main__":
+    test_writes_export_json_layout_and_log_changes()
+    test_hand_edited_json_is_not_clobbered()
+    test_additions_export_once_when_the_store_is_closed()
+    test_pending_changes_survive_an_unflushed_store()
+    test_concurrent_writers_do_not_lose_updates()
+    test_bulk_insert_100k_references()
+    print("✓ All knowledge store tests passed")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the set-based merge engine (merge_engine.py)
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from bench_merge import make_catalog, make_incoming
+from kb_store import KnowledgeStore
+from merge_engine import (merge_references, merge_references_into_store,
+                          merge_styles_into_store, reference_key)
+
+
+def test_reference_key_normalizes_spelling():
+    assert reference_key("Daft Punk - One More Time") == reference_key("daft punk – One More Time! ")
+    assert reference_key("Daft Punk - One More Time") != reference_key("Daft Punk - Digital Love")
+
+
+def test_merge_counts_added_updated_skipped():
+    data = {"House": [["Daft Punk - One More Time", "filter house"]]}
+    result = merge_references(data, {
+        "House": [
+            ["DAFT PUNK - one more time", "french house"],  # same track, new note
+            ["Daft Punk - One More Time", "french house"],  # now identical
+            ["Frankie Knuckles - The Whistle Song", "classic"],
+            ["Frankie Knuckles - The Whistle Song", "classic"],  # duplicate inside the batch
+        ],
+        "EDM": [["Avicii - Wake Me Up", "folktronica"]],
+    }, update_notes=True)
+
+    assert (result.added, result.updated, result.skipped) == (2, 1, 2)
+    assert data["House"] == [["Daft Punk - One More Time", "french house"],
+                             ["Frankie Knuckles - The Whistle Song", "classic"]]
+    assert data["EDM"] == [["Avicii - Wake Me Up", "folktronica"]]
+
+
+def test_store_merge_is_one_write():
+    with tempfile.TemporaryDirectory() as tmp:
+        with KnowledgeStore(tmp) as store:
+            with store.transaction("test"):
+                store.add_references("Jazz", [("Miles Davis - So What", "modal")])
+                store.upsert_style("Jazz", {"keywords": ["swing"]})
+            first = len(store.changes())
+            result = merge_references_into_store(store, {
+                "Jazz": [("miles davis – so what", "modal"), ("John Coltrane - Blue Train", "hard bop")],
+                "Folk": [("Nick Drake - River Man", "melancholic")],
+            })
+            styles = merge_styles_into_store(store, {"jazz": {"keywords": []}, "Ska": {"keywords": ["skank"]}})
+            logged = [op for _, _, _, op, _, _ in store.changes(first)]
+        with open(Path(tmp) / "references.json", 'r', encoding='utf-8') as f:
+            refs = json.load(f)
+
+    assert (result.added, result.skipped) == (2, 1)
+    assert [t for t, _ in refs["Jazz"]] == ["Miles Davis - So What", "John Coltrane - Blue Train"]
+    # One entry per style of the batch, plus the one new style
+    assert logged == ["add", "add", "upsert"]
+    assert (styles.added, styles.skipped) == (1, 1)
+
+
+def test_merge_100k_is_linear():
+    catalog = make_catalog(100_000, 50)
+    incoming = make_incoming(catalog, 100_000)
+    start = time.perf_counter()
+    result = merge_references(catalog, incoming, update_notes=True)
+    elapsed = time.perf_counter() - start
+
+    print(f"Merged 100k into 100k in {elapsed:.2f}s: {result}")
+    assert result.added + result.updated + result.skipped == 100_000
+    assert result.skipped + result.updated > 20_000  # respelled copies were recognised
+    assert elapsed < 5, elapsed
+
+
+if __name__ == "__main__":
+    test_reference_key_normalizes_spelling()
+    test_merge_counts_added_updated_skipped()
+    test_store_merge_is_one_write()
+    test_merge_100k_is_linear()
+    print("✓ All merge engine tests passed")
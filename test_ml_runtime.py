@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the ML runtime configuration (ml_runtime.py)
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from ml_runtime import ENV_VARS, RuntimeConfig, load_runtime_config
+
+
+class FakeModel:
+    max_seq_length = 256
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append((texts, kwargs))
+        return [[1.0]] * len(texts)
+
+
+def clear_env():
+    """Remove the runtime variables from the environment, returning their values"""
+    names = list(ENV_VARS.values()) + ["SONICPALETTE_RUNTIME_CONFIG"]
+    return {name: os.environ.pop(name) for name in names if name in os.environ}
+
+
+def test_file_then_environment():
+    saved = clear_env()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            assert load_runtime_config(Path(tmp)) == RuntimeConfig()
+
+            with open(Path(tmp) / "runtime.json", 'w', encoding='utf-8') as f:
+                json.dump({"intra_op_threads": 2, "batch_size": 8, "inference_mode": False}, f)
+            config = load_runtime_config(Path(tmp))
+            assert (config.intra_op_threads, config.batch_size, config.inference_mode) == (2, 8, False)
+
+            os.environ["SONICPALETTE_TORCH_THREADS"] = "1"
+            os.environ["SONICPALETTE_INFERENCE_MODE"] = "on"
+            os.environ["SONICPALETTE_MAX_SEQ_LENGTH"] = "128"
+            config = load_runtime_config(Path(tmp))
+            assert config == RuntimeConfig(intra_op_threads=1, inter_op_threads=None,
+                                           inference_mode=True, batch_size=8, max_seq_length=128)
+    finally:
+        clear_env()
+        os.environ.update(saved)
+
+
+def test_configure_and_encode_use_the_settings():
+    model = FakeModel()
+    config = RuntimeConfig(batch_size=4, max_seq_length=64)
+    assert config.configure(model) is model
+    assert model.max_seq_length == 64
+
+    config.encode(model, ["a", "b"])
+    assert model.calls == [(["a", "b"], {"batch_size": 4, "show_progress_bar": False})]
+
+    # Without a limit the model keeps its own
+    assert RuntimeConfig().configure(FakeModel()).max_seq_length == 256
+
+
+if __name__ == "__main__":
+    test_file_then_environment()
+    test_configure_and_encode_use_the_settings()
+    print("✓ All runtime config tests passed")
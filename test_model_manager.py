@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for idle unloading and on-demand reload of the ML model (model_manager.py)
+"""
+
+import threading
+import time
+
+import tracing
+from model_manager import ModelManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Loader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return object()
+
+
+def test_idle_model_is_unloaded_and_reloaded():
+    clock, loader = FakeClock(), Loader()
+    manager = ModelManager(loader, idle_timeout=600, clock=clock)
+    first = manager.get()
+    assert manager.get() is first and loader.calls == 1
+
+    clock.now = 599
+    assert not manager.unload_if_idle()
+    clock.now = 1200
+    assert manager.unload_if_idle()
+    assert not manager.is_loaded()
+    assert tracing.gauge_value("model_resident") == 0
+
+    # The next request reloads it
+    assert manager.get() is not first and loader.calls == 2
+    assert tracing.gauge_value("model_resident") == 1
+    assert tracing.gauge_value("model_reload_seconds") is not None
+    assert tracing.counter_value("model_loads_total", kind="reload") >= 1
+
+
+def test_model_in_use_is_never_unloaded():
+    clock = FakeClock()
+    manager = ModelManager(Loader(), idle_timeout=10, clock=clock)
+    with manager.use() as model:
+        assert model is not None
+        clock.now = 100
+        assert not manager.unload_if_idle()
+    # Releasing it counts as a use: the idle period starts now
+    assert not manager.unload_if_idle()
+    clock.now = 111
+    assert manager.unload_if_idle()
+
+
+def test_background_reload_and_concurrent_gets_load_once():
+    loader = Loader(delay=0.1)
+    manager = ModelManager(loader)
+    manager.load_async()
+    manager.load_async()
+    assert not manager.is_loaded()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get())) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loader.calls == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_reaper_unloads_without_requests():
+    manager = ModelManager(Loader(), idle_timeout=0.05)
+    manager.get()
+    deadline = time.monotonic() + 2.0
+    while manager.is_loaded() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not manager.is_loaded()
+    # ...and starts again after the next load
+    manager.get()
+    time.sleep(0.3)
+    assert not manager.is_loaded()
+
+
+if __name__ == "__main__":
+    test_idle_model_is_unloaded_and_reloaded()
+    test_model_in_use_is_never_unloaded()
+    test_background_reload_and_concurrent_gets_load_once()
+    test_reaper_unloads_without_requests()
+    print("✓ All model manager tests passed")
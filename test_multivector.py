@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-vector style/emotion representations (multivector.py)
+"""
+
+import numpy as np
+
+import app
+from data_loader import BASE_KB, EMOTION_DESCRIPTIONS, STYLE_DB
+from dedup import HashingEncoder
+from model_manager import ModelManager
+from multivector import SegmentedMatrix, emotion_texts, style_texts
+
+
+def test_segment_max_and_mean_match_a_loop():
+    rng = np.random.default_rng(0)
+    segments = {f"s{i}": [f"t{i}-{j}" for j in range(rng.integers(1, 6))] for i in range(40)}
+    vectors = {}
+
+    def encode(texts):
+        rows = [vectors.setdefault(t, rng.normal(size=16).astype(np.float32)) for t in texts]
+        return np.stack(rows)
+
+    index = SegmentedMatrix.build(segments, encode)
+    assert index.matrix.shape[0] == sum(len(t) for t in segments.values())
+    query = rng.normal(size=(3, 16)).astype(np.float32)
+
+    for reduce, fn in (("max", np.max), ("mean", np.mean)):
+        expected = np.array([[fn([vectors[t] @ q for t in segments[name]]) for name in index.names]
+                             for q in query])
+        assert np.allclose(index.scores(query, reduce), expected, atol=1e-5)
+        assert np.allclose(index.scores(query[0], reduce), expected[0], atol=1e-5)
+
+
+def test_representations_use_descriptions_and_all_keywords():
+    texts = style_texts("R&B", STYLE_DB["R&B"])
+    assert texts[0] == "R&B music"
+    assert STYLE_DB["R&B"]["description"] in texts
+    assert set(STYLE_DB["R&B"]["keywords"]) <= set(texts)
+    assert EMOTION_DESCRIPTIONS["warm"] == "warm and cozy feeling"
+    assert emotion_texts("warm", ["warm", "cozy"], "warm and cozy feeling") == \
+        ["warm music", "warm and cozy feeling", "warm", "cozy"]
+
+
+def test_candidates_are_encoded_once():
+    class CountingModel:
+        calls = 0
+
+        def encode(self, texts, **kwargs):
+            CountingModel.calls += 1
+            return HashingEncoder(dim=128).encode(texts)
+
+    saved = (app.ML_AVAILABLE, app._model_manager)
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(CountingModel)
+    BASE_KB.cache.clear()
+    try:
+        app.analyze_description("warm late night soul")
+        first = CountingModel.calls
+        emotions, scores = app.analyze_description("hazy shimmer dreamy guitars")
+        # One query encode shared by the emotion and style stages; the
+        # style/emotion matrices are reused
+        assert CountingModel.calls - first == 1
+        assert set(scores) == set(STYLE_DB)
+        assert "dreamy" in emotions
+    finally:
+        app.ML_AVAILABLE, app._model_manager = saved
+        BASE_KB.cache.clear()
+
+
+if __name__ == "__main__":
+    test_segment_max_and_mean_match_a_loop()
+    test_representations_use_descriptions_and_all_keywords()
+    test_candidates_are_encoded_once()
+    print("✓ All multi-vector tests passed")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the near-duplicate query cache (near_cache.py, app.analyze_cached)
+"""
+
+import os
+import random
+
+import numpy as np
+
+import app
+import tracing
+from app import UserIntent, generate_prompt
+from data_loader import BASE_KB
+from near_cache import NearDuplicateCache, jaccard, terms
+
+
+def test_variants_of_a_description_hit():
+    cache = NearDuplicateCache(threshold=0.8, size=3)
+    cache.put("Neon city at night, dreamy and melancholic", "neon")
+    assert terms("Dreamy neon city night - melancholic!") == terms("neon city at night, dreamy and melancholic")
+    assert cache.get("Dreamy neon city night - melancholic!") == ("exact", "neon")
+    assert cache.get("neon city at night, dreamy, hazy and melancholic") == ("near", "neon")
+    assert cache.get("neon city night") == (None, None)  # Jaccard 0.6
+    assert NearDuplicateCache(threshold=0.6).get("x") == (None, None)
+    assert jaccard(terms("neon city night"), terms("night in a neon city")) == 1.0
+
+    # LRU: the least recently used entry is dropped from the band tables too
+    for text in ("sunny reggae beach", "dark trip-hop noir", "lofi study beat"):
+        cache.put(text, text)
+    assert len(cache) == 3 and cache.get("neon city at night dreamy melancholic") == (None, None)
+    assert all(all(cache._entries.keys() >= members for members in bucket.values()) for bucket in cache._buckets)
+
+
+def test_generation_reuses_near_duplicate_analyses():
+    calls = []
+
+    def analyze(description, kb=None):
+        calls.append(description)
+        return ["dreamy"], {"Dream pop": 2.0, "City pop": 1.0}
+
+    original = app.analyze_description
+    app.analyze_description = analyze
+    BASE_KB.cache.clear()
+    tracing.reset()
+    try:
+        first = generate_prompt(UserIntent("Neon city at night, dreamy and melancholic", seed=1))
+        again = generate_prompt(UserIntent("neon city at night, dreamy, hazy and melancholic", seed=1))
+        assert len(calls) == 1 and again.styles == first.styles and again.emotions == ["dreamy"]
+        assert tracing.counter_value("near_cache_lookups_total", result="near") == 1
+
+        os.environ["SONICPALETTE_NEAR_CACHE_AUDIT"] = "1"
+        generate_prompt(UserIntent("dreamy melancholic neon city at night, slow"))
+        assert len(calls) == 2
+        assert tracing.counter_value("near_cache_audits_total", result="agree") == 1
+
+        os.environ["SONICPALETTE_NEAR_CACHE"] = "off"
+        generate_prompt(UserIntent("Neon city at night, dreamy and melancholic"))
+        assert len(calls) == 3
+    finally:
+        app.analyze_description = original
+        os.environ.pop("SONICPALETTE_NEAR_CACHE_AUDIT", None)
+        os.environ.pop("SONICPALETTE_NEAR_CACHE", None)
+        BASE_KB.cache.clear()
+
+
+def test_near_hits_carry_the_description_embedding():
+    vector = np.ones(4, dtype=np.float32) / 2
+
+    def analyze(description, kb=None):
+        # What the ML analysis leaves behind for rank_instruments
+        app.remember_query_embedding(description, vector)
+        return ["dreamy"], {"Dream pop": 2.0, "City pop": 1.0}
+
+    original = app.analyze_description
+    app.analyze_description = analyze
+    BASE_KB.cache.clear()
+    os.environ["SONICPALETTE_NEAR_CACHE_AUDIT"] = "0"
+    try:
+        app.analyze_cached("hazy shoegaze guitars in a rainy city at dusk")
+        variant = "hazy shoegaze guitars in a rainy city at dusk, slow"
+        assert app.query_embedding(variant, encode=False) is None
+        assert app.analyze_cached(variant)[:2] == (["dreamy"], {"Dream pop": 2.0, "City pop": 1.0})
+        assert app.query_embedding(variant, encode=False) is vector
+    finally:
+        app.analyze_description = original
+        os.environ.pop("SONICPALETTE_NEAR_CACHE_AUDIT", None)
+        BASE_KB.cache.clear()
+
+
+def test_audits_use_their_own_generator():
+    os.environ["SONICPALETTE_NEAR_CACHE_AUDIT"] = "0.5"
+    try:
+        state = random.getstate()
+        a, b = NearDuplicateCache(seed=3), NearDuplicateCache(seed=3)
+        audits = [a.should_audit() for _ in range(200)]
+        assert audits == [b.should_audit() for _ in range(200)] and 0 < sum(audits) < 200
+        assert random.getstate() == state
+    finally:
+        os.environ.pop("SONICPALETTE_NEAR_CACHE_AUDIT", None)
+
+
+if __name__ == "__main__":
+    test_variants_of_a_description_hit()
+    test_generation_reuses_near_duplicate_analyses()
+    test_near_hits_carry_the_description_embedding()
+    test_audits_use_their_own_generator()
+    print("✓ All near-duplicate cache tests passed")
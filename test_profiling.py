@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for on-demand request profiling (profiling.py)
+"""
+
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+
+import profiling
+from app import generate_prompt, UserIntent
+from profiling import RequestProfiler, collapsed_stacks, profiler_from_env
+
+REPORTS = ["profile.pstats", "profile.txt", "profile.collapsed", "allocations.txt"]
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def leaf():
+    _spin(0.002)
+
+
+def branch():
+    leaf()
+
+
+def root():
+    branch()
+    leaf()
+
+
+def outside_request():
+    _spin(0.001)
+
+
+def _functions(path):
+    return {name for _, _, name in pstats.Stats(path).stats}
+
+
+def test_reports_are_written_after_n_requests():
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "profile")
+        tracing_before = tracemalloc.is_tracing()
+        profiler = RequestProfiler(out, n_requests=2)
+
+        with profiler.request():
+            generate_prompt(UserIntent("lofi study beat, warm and cozy"))
+        assert profiler.profiled == 1 and not os.path.exists(out)
+
+        # Only calls made inside a request are recorded
+        outside_request()
+        with profiler.request():
+            generate_prompt(UserIntent("dark moody trip-hop noir"))
+        assert profiler.finished
+        assert sorted(os.listdir(out)) == sorted(REPORTS)
+        assert tracemalloc.is_tracing() == tracing_before
+
+        functions = _functions(os.path.join(out, "profile.pstats"))
+        assert "generate_prompt" in functions and "outside_request" not in functions
+        for name in ("profile.txt", "allocations.txt"):
+            with open(os.path.join(out, name), encoding="utf-8") as f:
+                assert f.readline() == "Requests profiled: 2\n"
+
+        # Once N requests were captured, requests pass through unprofiled
+        with profiler.request():
+            root()
+        assert profiler.profiled == 2
+        assert "root" not in _functions(os.path.join(out, "profile.pstats"))
+
+
+def test_close_writes_what_was_captured():
+    with tempfile.TemporaryDirectory() as tmp:
+        profiler = RequestProfiler(tmp, n_requests=None)
+        profiler.close()
+        assert os.listdir(tmp) == []  # nothing captured, nothing written
+
+        with profiler.request():
+            root()
+        profiler.close()
+        assert sorted(os.listdir(tmp)) == sorted(REPORTS)
+        with open(os.path.join(tmp, "profile.txt"), encoding="utf-8") as f:
+            assert f.readline() == "Requests profiled: 1\n"
+
+
+def test_collapsed_stacks_format():
+    profile = cProfile.Profile()
+    profile.enable()
+    root()
+    profile.disable()
+    lines = collapsed_stacks(pstats.Stats(profile))
+
+    stacks = {}
+    for line in lines:
+        stack, _, micros = line.rpartition(" ")
+        assert stack and micros.isdigit() and int(micros) >= 1
+        stacks[stack] = int(micros)
+    here = os.path.basename(__file__)
+    leaf_frame = f"leaf ({here}:{leaf.__code__.co_firstlineno})"
+    branch_frame = f"branch ({here}:{branch.__code__.co_firstlineno})"
+    root_frame = f"root ({here}:{root.__code__.co_firstlineno})"
+
+    via_branch = [s for s in stacks if f"{root_frame};{branch_frame};{leaf_frame}" in s]
+    direct = [s for s in stacks if f"{root_frame};{leaf_frame}" in s]
+    assert via_branch and direct
+    # Both calls of leaf spin for the same time
+    def time_under(prefix):
+        return sum(us for stack, us in stacks.items() if prefix in stack)
+
+    ratio = time_under(f"{branch_frame};{leaf_frame}") / time_under(f"{root_frame};{leaf_frame}")
+    assert 0.5 < ratio < 2
+
+    # ';' separates frames, so it can't appear inside a label
+    assert profiling._frame_label(("~", 0, "<built-in method a;b>")) == "<built-in method a:b>"
+
+
+def test_profiler_from_env():
+    saved = {k: os.environ.pop(k, None) for k in ("SONICPALETTE_PROFILE", "SONICPALETTE_PROFILE_REQUESTS")}
+    try:
+        assert profiler_from_env() is None
+        os.environ["SONICPALETTE_PROFILE"] = "/tmp/sonicpalette-profile"
+        os.environ["SONICPALETTE_PROFILE_REQUESTS"] = "5"
+        profiler = profiler_from_env()
+        assert str(profiler.out_dir) == "/tmp/sonicpalette-profile" and profiler.n_requests == 5
+    finally:
+        for key, value in saved.items():
+            os.environ.pop(key, None)
+            if value is not None:
+                os.environ[key] = value
+
+
+if __name__ == "__main__":
+    test_reports_are_written_after_n_requests()
+    test_close_writes_what_was_captured()
+    test_collapsed_stacks_format()
+    test_profiler_from_env()
+    print("✓ All profiling tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for the knowledge-base records (records.py)
+"""
+
+import copy
+import json
+import pickle
+
+import app
+from data_loader import BASE_KB
+from records import INSTRUMENTS, Reference, Style, freeze_references, freeze_styles
+
+RAW = {
+    "Alpha": {"keywords": ["dusty", "warm"], "bpm": (70, 90), "instruments": ["Rhodes", "Warm bass"],
+              "chords": [{"roman": "ii7 – V7 – Imaj7", "C": "Dm7 – G7 – Cmaj7"}], "description": "Alpha style"},
+    "Beta": {"keywords": ["warm"], "bpm": (80, 100), "instruments": ["Warm bass", "Lead synth"],
+             "chords": [{"roman": "ii7 – V7 – Imaj7", "C": "Dm7 – G7 – Cmaj7"}], "tags": ["retro"], "origin": "JP"},
+}
+
+
+def test_styles_read_like_the_dict_layout():
+    styles = freeze_styles(json.loads(json.dumps(RAW)))
+    alpha, beta = styles["Alpha"], styles["Beta"]
+    assert isinstance(alpha, Style) and not hasattr(alpha, "__dict__")
+    assert alpha["bpm"] == (70, 90) and alpha.get("tags") is None and "tags" not in alpha
+    assert beta["origin"] == "JP" and set(beta) == {"keywords", "instruments", "chords", "bpm", "tags", "origin"}
+    assert dict(alpha["chords"][0]) == RAW["Alpha"]["chords"][0]
+    assert {**beta, "bpm": (60, 70)}["instruments"] == ("Warm bass", "Lead synth")
+
+    # Shared strings and chords, one id per instrument
+    assert alpha["keywords"][1] is beta["keywords"][0]
+    assert alpha["chords"][0] is beta["chords"][0]
+    assert alpha.instrument_ids[1] == beta.instrument_ids[0]
+    assert INSTRUMENTS.names(beta.instrument_ids) == ["Warm bass", "Lead synth"]
+
+    try:
+        alpha.bpm = (1, 2)
+        assert False, "expected AttributeError"
+    except AttributeError:
+        pass
+    assert pickle.loads(pickle.dumps(beta)) == beta == copy.deepcopy(beta)
+
+
+def test_references_are_named_tuples():
+    references = freeze_references({"Alpha": [["Artist - Song", "note"]]})
+    ref = references["Alpha"][0]
+    assert isinstance(ref, Reference) and ref == ("Artist - Song", "note")
+    title, note = ref
+    assert (ref.title, ref.note) == (title, note)
+
+
+def test_collect_instruments_keeps_order_and_cap():
+    styles = ["R&B", "Lo-fi hiphop", "Trip-hop"]
+    expected = list(dict.fromkeys(it for st in styles for it in BASE_KB.style_db[st]["instruments"]))[:8]
+    assert app.collect_instruments(styles) == expected
+    assert app.collect_instruments(["Ambient"]) == list(BASE_KB.style_db["Ambient"]["instruments"])
+
+
+if __name__ == "__main__":
+    test_styles_read_like_the_dict_layout()
+    test_references_are_named_tuples()
+    test_collect_instruments_keeps_order_and_cap()
+    print("✓ All record tests passed")
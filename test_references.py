@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for grouped reference pools (records.ReferencePool) and sampling
+(app.suggest_references)
+"""
+
+import pickle
+import random
+from collections import Counter
+
+import app
+from data_loader import KnowledgeBase
+from records import ReferencePool, artist_of, freeze_references
+
+RAW = {
+    "Alpha": [["Artist A - One", "a1"], ["Artist B - Two", "b1"], ["artist a - Three", "a2"], ["Solo", "no dash"]],
+    "Beta": [["Artist B - Four", "b2"], ["Artist C - Five", "c1"]],
+    "Indie refs": [["Indie - Six", "i1"]],
+}
+
+
+def kb_for(raw) -> KnowledgeBase:
+    return KnowledgeBase(name="refs", emotion_keywords={}, style_db={},
+                         reference_db=freeze_references(raw), emotion_to_styles={})
+
+
+def test_pools_are_grouped_by_artist():
+    pool = freeze_references(RAW)["Alpha"]
+    assert isinstance(pool, ReferencePool) and len(pool) == 4 and pool.groups == 3
+    assert [ref.title for ref in pool] == ["Artist A - One", "artist a - Three", "Artist B - Two", "Solo"]
+    assert list(pool.offsets) == [0, 2, 3, 4]
+    assert artist_of("Solo") == "solo" and artist_of("FKJ - Tadow") == "fkj"
+    assert pickle.loads(pickle.dumps(pool)) == pool
+
+
+def test_sampling_is_diverse_reproducible_and_complete():
+    kb = kb_for(RAW)
+    refs = app.suggest_references(["Alpha", "Beta"], [], n=100, kb=kb)
+    # One reference per artist across all pools, "Indie refs" included
+    assert sorted(artist_of(ref.title) for ref in refs) == ["artist a", "artist b", "artist c", "indie", "solo"]
+    assert app.suggest_references(["Alpha", "Beta"], [], n=3, rng=random.Random(7), kb=kb) == \
+        app.suggest_references(["Alpha", "Beta"], [], n=3, rng=random.Random(7), kb=kb)
+    assert app.suggest_references(["Missing"], [], kb=kb_for({})) == []
+
+    # Large pools: every artist group is equally likely to be drawn
+    big = kb_for({"Big": [[f"Artist {i} - Track", "x"] for i in range(1000)]})
+    counts = Counter()
+    for seed in range(400):
+        refs = app.suggest_references(["Big"], [], n=5, rng=random.Random(seed), kb=big)
+        assert len({ref.title for ref in refs}) == 5
+        counts.update(int(ref.title.split()[1]) // 100 for ref in refs)
+    assert min(counts.values()) > 120 and max(counts.values()) < 280
+
+
+if __name__ == "__main__":
+    test_pools_are_grouped_by_artist()
+    test_sampling_is_diverse_reproducible_and_complete()
+    print("✓ All reference sampling tests passed")
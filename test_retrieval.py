@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for two-stage style retrieval (retrieval.py)
+"""
+
+import numpy as np
+
+import app
+from data_loader import BASE_KB
+from model_manager import ModelManager
+from retrieval import top_k_indices
+from retrieval_report import HashingModel
+
+
+def test_top_k_matches_a_stable_sort():
+    rng = np.random.default_rng(1)
+    for n in (0, 1, 5, 200):
+        values = rng.integers(0, 4, size=n).astype(float)  # many ties
+        for k in (1, 2, 10, 300):
+            expected = sorted(range(n), key=lambda i: values[i], reverse=True)[:k]
+            assert top_k_indices(values, k).tolist() == expected
+
+
+def test_pick_top_styles_is_unchanged():
+    scores = {"A": 0.5, "B": 2.0, "C": 2.0, "D": 0.0}
+    assert app.pick_top_styles(scores) == ["B", "C"]
+    assert app.pick_top_styles(scores, k=4) == ["B", "C", "A"]
+    assert app.pick_top_styles({"A": 0.0}) == ["R&B", "Dream pop"]
+
+
+def test_candidates_are_reranked_with_the_exhaustive_scores():
+    saved = (app.ML_AVAILABLE, app._model_manager)
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(HashingModel)
+    BASE_KB.cache.clear()
+    try:
+        description = "warm smooth late night soul with silky vocals"
+        full = app.ml_enhanced_style_detection(description, n_candidates=0)
+        assert app.ml_enhanced_style_detection(description, n_candidates=len(BASE_KB.style_db)) == full
+
+        staged = app.ml_enhanced_style_detection(description, n_candidates=5)
+        assert len(staged) == 5
+        # Catalog order, same scores as exhaustive scoring
+        assert list(staged) == [style for style in full if style in staged]
+        assert all(abs(staged[s] - full[s]) < 1e-6 for s in staged)
+        assert "R&B" in staged
+        assert app.pick_top_styles(staged) == app.pick_top_styles(full)
+    finally:
+        app.ML_AVAILABLE, app._model_manager = saved
+        BASE_KB.cache.clear()
+
+
+if __name__ == "__main__":
+    test_top_k_matches_a_stable_sort()
+    test_pick_top_styles_is_unchanged()
+    test_candidates_are_reranked_with_the_exhaustive_scores()
+    print("✓ All retrieval tests passed")
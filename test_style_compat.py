@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the style compatibility matrix (style_compat.py)
+"""
+
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+import app
+from data_loader import BASE_KB
+from style_compat import COMPAT_FILENAME, CompatIndex, StyleFeatures, compatibility_matrix
+
+STYLES = {
+    "Slow A": {"bpm": (60, 80), "instruments": ["Airy pad", "Soft piano"], "keywords": ["calm", "dreamy"]},
+    "Slow B": {"bpm": (70, 90), "instruments": ["Evolving pads", "Piano"], "keywords": ["dreamy", "hazy"]},
+    "Fast C": {"bpm": (150, 170), "instruments": ["Breakbeat drums"], "keywords": ["rave"]},
+}
+
+
+def test_matrix_combines_bpm_instruments_and_keywords():
+    names = list(STYLES)
+    matrix = compatibility_matrix(StyleFeatures(names, STYLES))
+    assert matrix.shape == (3, 3)
+    assert np.allclose(matrix, matrix.T) and np.all(np.diag(matrix) == 0)
+    assert matrix.min() >= 0 and matrix.max() <= 1
+    # Half of the narrower BPM range overlaps, "pad" and "piano" are shared:
+    # 0.4 * 1/2 + 0.3 * 2/5 + 0.3 * 1/2
+    assert np.isclose(matrix[0, 1], 0.47)
+    assert matrix[0, 2] == matrix[1, 2] == 0.0
+    # Single rows match the full matrix
+    assert np.allclose(compatibility_matrix(StyleFeatures(names, STYLES), rows=np.array([1])), matrix[1])
+
+    index = CompatIndex.build(STYLES, names)
+    assert np.allclose(index.lookup(["Fast C", "Slow A"]), matrix[np.ix_([2, 0], [2, 0])])
+
+
+def test_blend_prefers_a_compatible_partner():
+    BASE_KB.cache.clear()
+    try:
+        leader = "Lo-fi hiphop"
+        ranked = [name for name, _ in app.similar_styles(leader, k=len(BASE_KB.style_db))]
+        compatible, clashing = ranked[0], ranked[-1]
+        compat = app.style_compatibility([leader, compatible, clashing])
+        assert compat[0, 1] > compat[0, 2]
+        # The clashing style scores slightly higher, the compatible one wins
+        scores = {leader: 3.0, clashing: 2.9, compatible: 2.8}
+        assert app.pick_style_blend(scores) == [leader, compatible]
+        # Not enough candidates to choose from: plain top-k
+        assert app.pick_style_blend({leader: 1.0, clashing: 0.5}) == [leader, clashing]
+        assert app.pick_style_blend({}) == app.pick_top_styles({})
+    finally:
+        BASE_KB.cache.clear()
+
+
+def test_saved_matrix_is_used_while_styles_are_unchanged():
+    saved_dir = app.DATA_DIR
+    BASE_KB.cache.clear()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            app.DATA_DIR = Path(tmp)
+            built = app.compat_index(BASE_KB, use_saved=False)
+            built.save(Path(tmp) / COMPAT_FILENAME)
+
+            BASE_KB.cache.clear()
+            loaded = app.compat_index(BASE_KB)
+            assert loaded is not built and loaded.names == built.names
+            assert np.allclose(loaded.matrix, built.matrix, atol=1e-3)
+
+            # A different catalog invalidates the file
+            stale = CompatIndex(built.names, built.matrix + 1, built.mode, "0" * 40)
+            stale.save(Path(tmp) / COMPAT_FILENAME)
+            BASE_KB.cache.clear()
+            assert np.allclose(app.compat_index(BASE_KB).matrix, built.matrix)
+
+            # Names are stored as plain strings; a pickled snapshot is never loaded
+            with np.load(Path(tmp) / COMPAT_FILENAME) as data:
+                assert data["names"].dtype.kind == "U"
+            np.savez_compressed(Path(tmp) / COMPAT_FILENAME, names=np.array(built.names, dtype=object),
+                                matrix=built.matrix + 1, mode=built.mode, fingerprint=built.fingerprint)
+            BASE_KB.cache.clear()
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                assert np.allclose(app.compat_index(BASE_KB).matrix, built.matrix)
+            assert any("Ignoring" in str(w.message) for w in caught)
+    finally:
+        app.DATA_DIR = saved_dir
+        BASE_KB.cache.clear()
+
+
+if __name__ == "__main__":
+    test_matrix_combines_bpm_instruments_and_keywords()
+    test_blend_prefers_a_compatible_partner()
+    test_saved_matrix_is_used_while_styles_are_unchanged()
+    print("✓ All style compatibility tests passed")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for per-tenant knowledge-base overlays (data_loader.py)
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+import app
+import data_loader
+from app import UserIntent, generate_prompt
+from data_loader import BASE_KB, get_knowledge_base
+from dedup import HashingEncoder
+from model_manager import ModelManager
+from multivector import emotion_texts, style_texts
+from records import LayeredPool
+
+OVERLAY = {
+    "styles.json": {
+        "Label Glitch": {"keywords": ["glitch", "stutter", "bitcrush"], "bpm_min": 120, "bpm_max": 130,
+                         "instruments": ["Glitch drums", "FM bass"],
+                         "chords": [{"roman": "i–VII", "C": "Cm–Bb"}]},
+        "Reggae": {"bpm_min": 70, "bpm_max": 80},
+    },
+    "emotions.json": {"warm": {"keywords": ["toasty"]}},
+    "references.json": {"Label Glitch": [["Label Artist - Signature", "house sound"]],
+                        "Reggae": [["Bob Marley - No Woman, No Cry", "classic roots reggae"],
+                                   ["Label Artist - Skank", "label reggae"]]},
+    "emotion_to_styles.json": {"energetic": {"Label Glitch": 2.0}},
+}
+
+
+class TenantDir:
+    """A temporary TENANTS_DIR with one overlay named "label" """
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        overlay = Path(self.tmp.name) / "label"
+        overlay.mkdir()
+        for filename, data in OVERLAY.items():
+            with open(overlay / filename, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        self.saved = data_loader.TENANTS_DIR
+        data_loader.TENANTS_DIR = Path(self.tmp.name)
+        data_loader._tenants.clear()
+        return self
+
+    def __exit__(self, *exc):
+        data_loader.TENANTS_DIR = self.saved
+        data_loader._tenants.clear()
+        self.tmp.cleanup()
+        return False
+
+
+class RecordingModel:
+    def __init__(self):
+        self.encoder = HashingEncoder(dim=256)
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return self.encoder.encode(texts)
+
+
+def test_overlay_shares_the_base():
+    with TenantDir():
+        kb = get_knowledge_base("label")
+        assert get_knowledge_base("label") is kb
+        assert get_knowledge_base(None) is BASE_KB
+
+        # Base dicts are shared, not copied; the overlay only holds its own entries
+        assert kb.style_db.maps[1] is BASE_KB.style_db
+        assert kb.own_styles == {"Label Glitch", "Reggae"}
+        assert "Label Glitch" not in BASE_KB.style_db
+        assert kb.style_db["Reggae"]["bpm"] == (70, 80)
+        assert kb.style_db["Reggae"]["instruments"] == BASE_KB.style_db["Reggae"]["instruments"]
+        assert kb.emotion_keywords["warm"][-1] == "toasty"
+        # References added to a base style: the base pool is shared, the
+        # overlay holds its new reference only (the duplicate is dropped)
+        reggae = kb.reference_db["Reggae"]
+        assert isinstance(reggae, LayeredPool) and reggae.layers[0] is BASE_KB.reference_db["Reggae"]
+        assert list(reggae.layers[1]) == [("Label Artist - Skank", "label reggae")]
+        assert list(reggae) == list(BASE_KB.reference_db["Reggae"]) + [("Label Artist - Skank", "label reggae")]
+        assert reggae[-1] == ("Label Artist - Skank", "label reggae") and len(reggae) == len(list(reggae))
+        assert "toasty" not in BASE_KB.emotion_keywords["warm"]
+        assert kb.emotion_to_styles["energetic"]["Label Glitch"] == 2.0
+
+        try:
+            get_knowledge_base("../data")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+
+def test_requests_choose_their_tenant():
+    with TenantDir():
+        intent = dict(description="energetic glitch stutter bitcrush", seed=3)
+        tenant = generate_prompt(UserIntent(**intent, tenant="label"))
+        base = generate_prompt(UserIntent(**intent))
+        refs = app.suggest_references(["Label Glitch"], [], n=100, kb=get_knowledge_base("label"))
+    assert tenant.styles[0] == "Label Glitch"
+    assert "Label Glitch" not in base.styles
+    assert ("Label Artist - Signature", "house sound") in refs
+
+
+def test_only_overlay_entries_get_new_embeddings():
+    saved = (app.ML_AVAILABLE, app._model_manager)
+    model = RecordingModel()
+    app.ML_AVAILABLE = True
+    app._model_manager = ModelManager(lambda: model)
+    BASE_KB.cache.clear()
+    try:
+        with TenantDir():
+            app.ml_enhanced_style_detection("glitchy neon night")
+            base_texts = len(model.texts)
+            kb = get_knowledge_base("label")
+            scores = app.ml_enhanced_style_detection("glitchy neon night", kb)
+            # The texts of the overlay's two styles and one emotion; the query
+            # embedding is reused from the base request
+            overlay_texts = (sum(len(style_texts(name, kb.style_db[name])) for name in kb.own_styles) +
+                             len(emotion_texts("warm", kb.emotion_keywords["warm"], kb.emotion_descriptions["warm"])))
+            assert len(model.texts) - base_texts == overlay_texts
+            assert list(scores)[:len(BASE_KB.style_db)] == list(BASE_KB.style_db)
+            assert "Label Glitch" in scores
+    finally:
+        app.ML_AVAILABLE, app._model_manager = saved
+        BASE_KB.cache.clear()
+
+
+if __name__ == "__main__":
+    test_overlay_shares_the_base()
+    test_requests_choose_their_tenant()
+    test_only_overlay_entries_get_new_embeddings()
+    print("✓ All tenant tests passed")
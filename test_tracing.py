@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for per-stage tracing and the metrics export surface
+"""
+
+import json
+
+import tracing
+from app import generate_prompt, UserIntent
+
+
+def test_request_trace_without_global_tracing():
+    """Per-request timings are collected even when tracing is disabled"""
+    tracing.disable()
+    tracing.reset()
+    result = generate_prompt(UserIntent("lofi study beat, warm and cozy"), trace=True)
+    stages = [name for name, _ in result.timings]
+    print(f"Stages: {', '.join(stages)}")
+    assert "keyword_scoring" in stages or "ml_style_detection" in stages
+    assert "prompt_compression" in stages
+    assert stages[-1] == "total"
+    # Nothing leaks into the global aggregates while disabled
+    assert tracing.snapshot()["spans"] == {}
+
+
+def test_untraced_request_has_no_timings():
+    tracing.disable()
+    result = generate_prompt(UserIntent("reggae island vibe"))
+    assert result.timings == []
+
+
+def test_prometheus_and_json_export():
+    tracing.reset()
+    tracing.enable()
+    try:
+        generate_prompt(UserIntent("dark moody trip-hop noir"))
+        tracing.record_cache("ml_model", hit=False)
+        tracing.set_gauge("model_load_seconds", 1.25)
+    finally:
+        tracing.disable()
+
+    text = tracing.prometheus_text()
+    print(text)
+    assert "# TYPE sonicpalette_stage_seconds summary" in text
+    assert 'sonicpalette_stage_seconds_count{stage="references"} 1' in text
+    assert 'sonicpalette_cache_requests_total{cache="ml_model",result="miss"} 1' in text
+    assert "sonicpalette_model_load_seconds 1.25" in text
+
+    snap = json.loads(json.dumps(tracing.snapshot()))
+    assert snap["spans"]["references"]["count"] == 1
+    assert snap["gauges"]["model_load_seconds"] == 1.25
+
+
+if __name__ == "__main__":
+    test_request_trace_without_global_tracing()
+    test_untraced_request_has_no_timings()
+    test_prometheus_and_json_export()
+    print("✓ All tracing tests passed")
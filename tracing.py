@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing and metrics for SonicPalette
+Times each stage of the generation path and keeps counters/gauges that can
+be exported in Prometheus text format or as a JSON snapshot.
+
+Spans are off by default and cost one flag check when disabled. Enable them
+with SONICPALETTE_TRACING=1 or tracing.enable(). A request_trace() block
+collects the stage timings of a single request even while global tracing is
+off (used by the Gradio "Show stage timings" option); it is held in a
+context variable, so work the request hands to another thread with
+contextvars.copy_context() (deadline.BoundedExecutor) is timed too.
+Counters and gauges are always recorded.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+METRIC_PREFIX = "sonicpalette"
+
+_enabled = os.environ.get("SONICPALETTE_TRACING", "").lower() in ("1", "true", "yes", "on")
+_lock = threading.Lock()
+# (stage, seconds) list of the current request_trace(), if any
+_stages: "contextvars.ContextVar[Optional[List[Tuple[str, float]]]]" = \
+    contextvars.ContextVar("sonicpalette_stages", default=None)
+
+# stage name -> [count, total seconds, max seconds]
+_span_stats: Dict[str, List[float]] = {}
+# (metric name, sorted label items) -> value
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Drop all recorded spans, counters and gauges"""
+    with _lock:
+        _span_stats.clear()
+        _counters.clear()
+        _gauges.clear()
+
+# -----------------------------
+# Spans
+# -----------------------------
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _active() -> bool:
+    return _enabled or _stages.get() is not None
+
+
+def _record_span(name: str, elapsed: float):
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((name, elapsed))
+    if not _enabled:
+        return
+    with _lock:
+        stat = _span_stats.get(name)
+        if stat is None:
+            _span_stats[name] = [1, elapsed, elapsed]
+        else:
+            stat[0] += 1
+            stat[1] += elapsed
+            if elapsed > stat[2]:
+                stat[2] = elapsed
+
+
+def span(name: str):
+    """Context manager timing one stage: `with span("keyword_scoring"): ...`"""
+    if not _active():
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def request_trace():
+    """Collect (stage, seconds) pairs for the current request, including
+    stages run in worker threads that were given this context"""
+    stages: List[Tuple[str, float]] = []
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+# -----------------------------
+# Counters and gauges
+# -----------------------------
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def incr(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup as hit or miss"""
+    incr("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def counter_value(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def gauge_value(name: str, **labels) -> Optional[float]:
+    with _lock:
+        return _gauges.get(_key(name, labels))
+
+# -----------------------------
+# Export
+# -----------------------------
+
+def snapshot() -> Dict:
+    """JSON-serialisable view of all metrics"""
+    def flatten(store):
+        out = {}
+        for (name, labels), value in store.items():
+            if labels:
+                name = name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+            out[name] = value
+        return out
+
+    with _lock:
+        spans = {
+            name: {
+                "count": int(count),
+                "total_s": total,
+                "mean_ms": total / count * 1000,
+                "max_ms": peak * 1000,
+            }
+            for name, (count, total, peak) in _span_stats.items()
+        }
+        return {
+            "tracing_enabled": _enabled,
+            "spans": spans,
+            "counters": flatten(_counters),
+            "gauges": flatten(_gauges),
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def prometheus_text() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        if _span_stats:
+            metric = f"{METRIC_PREFIX}_stage_seconds"
+            lines.append(f"# HELP {metric} Time spent per generation stage.")
+            lines.append(f"# TYPE {metric} summary")
+            for name, (count, total, _) in sorted(_span_stats.items()):
+                lines.append(f'{metric}_sum{{stage="{_escape(name)}"}} {total:.9f}')
+                lines.append(f'{metric}_count{{stage="{_escape(name)}"}} {int(count)}')
+            metric = f"{METRIC_PREFIX}_stage_max_seconds"
+            lines.append(f"# TYPE {metric} gauge")
+            for name, (_, _, peak) in sorted(_span_stats.items()):
+                lines.append(f'{metric}{{stage="{_escape(name)}"}} {peak:.9f}')
+        for store, kind in ((_counters, "counter"), (_gauges, "gauge")):
+            seen = set()
+            for (name, labels), value in sorted(store.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    seen.add(metric)
+                lines.append(f"{metric}{_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=4)
+
+
+def format_timings(stages: List[Tuple[str, float]]) -> str:
+    """Human-readable per-stage timings for one request"""
+    return "\n".join(f"  {name}: {seconds * 1000:.2f} ms" for name, seconds in stages)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread"""
+    # Imported here: http.server is only needed when metrics are served
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body = json.dumps(snapshot()).encode("utf-8")
+                content_type = "application/json"
+            elif self.path.startswith("/metrics"):
+                body = prometheus_text().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    # Quick self-check of the export formats
+    enable()
+    with span("demo_stage"):
+        time.sleep(0.01)
+    record_cache("demo", hit=False)
+    set_gauge("model_load_seconds", 1.5)
+    print(prometheus_text())
+    print(json.dumps(snapshot(), indent=2))